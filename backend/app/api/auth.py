@@ -2,8 +2,7 @@
 Authentication API endpoints
 """
 from fastapi import APIRouter, HTTPException, Depends, Request
-from typing import Dict, Any
-import httpx
+from typing import Dict, Any, Optional
 import logging
 import hashlib
 import hmac
@@ -11,6 +10,8 @@ from datetime import datetime
 
 from app.core.config import settings
 from app.db.mongodb import get_database
+from app.services.clerk_tokens import InvalidTokenError, jwks_url, token_verifier
+from app.services.user_cache import user_cache
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -64,28 +65,13 @@ async def get_current_user(request: Request):
 
         token = auth_header.split(" ")[1]
 
-        # Verify the token with Clerk
+        # Verify the token against Clerk's signing keys (cached; no call to Clerk per request)
         user_data = await verify_clerk_token(token)
         if not user_data:
             raise HTTPException(status_code=401, detail="Invalid token")
 
-        # Get user from database
-        db = get_database()
-        user = await db.users.find_one({"clerk_id": user_data.get("sub")})
-
-        if not user:
-            # Create user if doesn't exist
-            user = {
-                "clerk_id": user_data.get("sub"),
-                "email": user_data.get("email"),
-                "name": user_data.get("name"),
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
-            await db.users.insert_one(user)
-
-        # Remove MongoDB _id from response
-        user.pop("_id", None)
+        # Resolve the user from the per-process cache (created on first sight)
+        user = await user_cache.resolve(get_database(), user_data)
 
         return user
 
@@ -95,30 +81,21 @@ async def get_current_user(request: Request):
         logger.error(f"Error getting current user: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def verify_clerk_token(token: str) -> Dict[str, Any]:
+async def verify_clerk_token(token: str) -> Optional[Dict[str, Any]]:
     """
-    Verify a Clerk session token
+    Verify a Clerk session token locally against Clerk's published signing keys
+    Returns the token's claims, or None if it is invalid
     """
     try:
-        # Use Clerk's backend API to verify the token
-        if not settings.clerk_backend_api_key:
-            logger.warning("Clerk backend API key not configured")
+        if not jwks_url():
+            logger.warning("Clerk JWKS not configured (set CLERK_FRONTEND_API_URL or CLERK_JWKS_URL)")
             return None
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://api.clerk.com/v1/sessions/{token}/verify",
-                headers={
-                    "Authorization": f"Bearer {settings.clerk_backend_api_key}"
-                }
-            )
-
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"Failed to verify token: {response.status_code}")
-                return None
+        return await token_verifier.verify(token)
 
+    except InvalidTokenError as e:
+        logger.warning(f"Rejected Clerk token: {e}")
+        return None
     except Exception as e:
         logger.error(f"Error verifying Clerk token: {e}")
         return None
@@ -169,6 +146,7 @@ async def sync_user(user_data: Dict[str, Any]):
             upsert=True
         )
 
+        await user_cache.invalidate(user["clerk_id"])
         logger.info(f"Synced user: {user['clerk_id']}")
 
     except Exception as e:
@@ -182,6 +160,7 @@ async def delete_user(clerk_id: str):
     try:
         db = get_database()
         await db.users.delete_one({"clerk_id": clerk_id})
+        await user_cache.invalidate(clerk_id)
         logger.info(f"Deleted user: {clerk_id}")
     except Exception as e:
         logger.error(f"Error deleting user: {e}")
@@ -1,132 +1,95 @@
 """
 Traces API endpoints
 """
-from fastapi import APIRouter, HTTPException, UploadFile, File, Query, Depends
+from fastapi import APIRouter, HTTPException, UploadFile, File, Query, Depends, Response
 from typing import List, Optional, Dict, Any
-import pandas as pd
-import io
+import asyncio
 import logging
-import math
-from datetime import datetime
 
 from app.core.config import settings
+from app.core.responses import MongoJSONResponse
 from app.db.mongodb import get_database
 from app.models.trace import TraceModel
 from app.api.auth import get_current_user
+from app.schemas.trace import AdjacentBatchRequest
+from app.services.adjacency import KEY_PROJECTION, find_adjacent, find_adjacent_batch
+from app.services.csv_import import CSVImportError, get_file_size, validate_csv_header
+from app.services.import_jobs import (
+    create_import_job, import_file, job_store, new_import_job, remove_upload, spool_upload
+)
+from app.services.known_traces import known_traces
+from app.services.session_cache import session_transcripts
+from app.services.trace_order import (
+    TRACE_SORT, InvalidCursorError, after_key, decode_cursor, encode_cursor, trace_key
+)
+from app.services.trace_ordinals import find_position, ordinal_total
+from app.services.trace_totals import trace_totals
+from app.services.trace_views import InvalidProjectionError, load_trace, trace_projection
+from app.services.unannotated import find_next_unannotated
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-def clean_nan_values(data: Dict[str, Any]) -> Dict[str, Any]:
-    """Replace NaN values with None for JSON compatibility"""
-    return {
-        k: (None if isinstance(v, float) and math.isnan(v) else
-            clean_nan_values(v) if isinstance(v, dict) else v)
-        for k, v in data.items()
-    }
-
-# Required CSV columns
-REQUIRED_COLUMNS = [
-    "trace_id", "flow_session", "turn_number", "total_turns",
-    "user_message", "ai_response"
-]
-
 @router.post("/import-csv")
 async def import_csv(
+    response: Response,
     file: UploadFile = File(...),
+    background: bool = Query(True, description="Run as a background job and return its id immediately"),
     current_user: Optional[Dict] = Depends(lambda: {"user_id": "demo-user"})  # Temporary: skip auth for testing
 ):
     """
     Import traces from CSV file
+
+    By default the header is validated, the import is queued as a background
+    job and a job id is returned (202); poll GET /import-jobs/{job_id} for
+    progress. With background=false the request waits and returns the counts.
+    Either way the file is parsed in chunks of `settings.import_chunk_size`
+    rows in the import process pool, off the event loop.
     """
     try:
         # Check file extension
         if not file.filename.endswith('.csv'):
             raise HTTPException(status_code=400, detail="File must be a CSV")
 
-        # Check file size
-        contents = await file.read()
-        if len(contents) > settings.max_upload_size:
+        # Check file size without reading the upload into memory
+        file_size = file.size if file.size is not None else get_file_size(file.file)
+        if file_size > settings.max_upload_size:
             raise HTTPException(status_code=400, detail=f"File too large. Max size: {settings.max_upload_size} bytes")
 
-        # Parse CSV
+        # Header check and spooling run in a thread; parsing runs in the import process pool
         try:
-            df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid CSV format: {str(e)}")
-
-        # Log available columns for debugging
-        logger.info(f"CSV columns: {list(df.columns)}")
-
-        # Column mapping for flexibility
-        column_mappings = {
-            'Turn_Number': 'turn_number',
-            'Total_Turns_in_Session': 'total_turns',
-            'Flow Session': 'flow_session',
-            'body.user_message': 'user_message',
-            'response.text_output': 'ai_response',
-            'id': 'trace_id'
-        }
-
-        # Apply column mappings
-        df = df.rename(columns=column_mappings)
-        logger.info(f"After mapping, columns: {list(df.columns)}")
-
-        # Validate required columns
-        missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
-        if missing_columns:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Missing required columns after mapping: {', '.join(missing_columns)}. Available: {list(df.columns)}"
-            )
-
-        # Relaxed: Accept any number of columns (not just 28)
-        logger.info(f"CSV has {len(df.columns)} columns, importing {len(df)} rows")
-
-        # Process and store traces
-        db = get_database()
-        traces_collection = db.traces
-        imported_count = 0
-        skipped_count = 0
+            await asyncio.to_thread(validate_csv_header, file.file)
+        except CSVImportError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-        for _, row in df.iterrows():
-            trace_data = row.to_dict()
+        path = await spool_upload(file.file)
+        imported_by = current_user.get("clerk_id")
 
-            # Replace NaN values with None for JSON compatibility
-            trace_data = {
-                k: (None if isinstance(v, float) and math.isnan(v) else v)
-                for k, v in trace_data.items()
-            }
+        if background:
+            job = await create_import_job(path, file.filename, imported_by)
 
-            # Create trace document
-            trace = {
-                "trace_id": str(trace_data.get("trace_id")),
-                "flow_session": str(trace_data.get("flow_session")),
-                "turn_number": int(trace_data.get("turn_number", 0)),
-                "total_turns": int(trace_data.get("total_turns", 0)),
-                "user_message": str(trace_data.get("user_message", "")),
-                "ai_response": str(trace_data.get("ai_response", "")),
-                "metadata": trace_data,  # Store all columns as metadata
-                "imported_at": datetime.utcnow(),
-                "imported_by": current_user.get("clerk_id")
+            response.status_code = 202
+            return {
+                "message": "Import started",
+                "job_id": job["job_id"],
+                "status": job["status"]
             }
 
-            # Check if trace already exists
-            existing = await traces_collection.find_one({"trace_id": trace["trace_id"]})
-            if existing:
-                skipped_count += 1
-                logger.info(f"Skipping duplicate trace: {trace['trace_id']}")
-                continue
-
-            # Insert trace
-            await traces_collection.insert_one(trace)
-            imported_count += 1
+        # Inline import: same pipeline, but wait for it and return the counts
+        job = new_import_job(file.filename)
+        try:
+            await import_file(job, path, imported_by)
+        except CSVImportError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        finally:
+            remove_upload(path)
 
         return {
-            "message": f"Successfully imported {imported_count} traces",
-            "imported": imported_count,
-            "skipped": skipped_count,
-            "total": len(df)
+            "message": f"Successfully imported {job['inserted']} traces",
+            "imported": job["inserted"],
+            "skipped": job["skipped"],
+            "failed": job["failed"],
+            "total": job["rows_parsed"]
         }
 
     except HTTPException:
@@ -135,90 +98,139 @@ async def import_csv(
         logger.error(f"Error importing CSV: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/import-jobs/{job_id}")
+async def get_import_job(
+    job_id: str,
+    current_user: Optional[Dict] = Depends(lambda: {"user_id": "demo-user"})  # Temporary: skip auth for testing
+):
+    """
+    Get progress of a background CSV import job
+    Returns: status (queued/running/completed/failed) and rows parsed, inserted, skipped and failed
+    """
+    job = await job_store.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
 @router.get("")
 async def list_traces(
     page: int = Query(1, ge=1),
     page_size: int = Query(50, ge=1, le=settings.max_page_size),
+    cursor: Optional[str] = Query(None, description="next_cursor from a previous page; takes precedence over page"),
+    estimated: bool = Query(False, description="Use the collection's metadata count for total (may lag slightly)"),
+    view: str = Query("list", description="Field profile: list, detail or full"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of a view profile"),
     current_user: Optional[Dict] = Depends(lambda: {"user_id": "demo-user"})  # Temporary: skip auth for testing
 ):
     """
     List traces with pagination
+
+    Pass the returned `next_cursor` back as `cursor` to seek straight to the
+    next page, which costs the same at any depth. `page` is a range scan on
+    trace ordinals, or a skip over earlier rows while ordinals are being
+    rebalanced after an import. `total` comes from the totals cache rather
+    than a count on every request. Rows carry only the fields of the `view`
+    profile (or `fields`), not the raw CSV row.
     """
+    try:
+        projection = trace_projection(view, fields)
+    except InvalidProjectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         db = get_database()
         traces_collection = db.traces
 
-        # Calculate pagination
-        skip = (page - 1) * page_size
-
-        # Get total count
-        total = await traces_collection.count_documents({})
+        # Get total count - cached, or from collection metadata when estimated=true
+        if estimated:
+            total = await traces_collection.estimated_document_count()
+        else:
+            total = await trace_totals.get(traces_collection)
 
         # Get traces - sort by flow_session desc, then turn_number asc
         # This groups sessions together and shows turns in chronological order
-        cursor = traces_collection.find({}).skip(skip).limit(page_size).sort([
-            ("flow_session", -1),  # Newest sessions first
-            ("turn_number", 1)     # But turns within session in order (1, 2, 3...)
-        ])
-        traces = []
-        async for trace in cursor:
-            # Convert ObjectId to string
-            trace["_id"] = str(trace["_id"])
-            # Clean NaN values for JSON compatibility
-            trace = clean_nan_values(trace)
-            traces.append(trace)
+        numbered = await ordinal_total(db) if page > 1 and not cursor else None
+        if cursor:
+            try:
+                query = after_key(decode_cursor(cursor))
+            except InvalidCursorError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            cursor_query = traces_collection.find(query, projection).sort(TRACE_SORT)
+        elif numbered is not None:
+            # Jump straight to the page down the ordinal index; ordinals count from the end of the list
+            cursor_query = traces_collection.find(
+                {"ordinal": {"$lte": numbered - (page - 1) * page_size}}, projection
+            ).sort("ordinal", -1)
+        else:
+            cursor_query = traces_collection.find({}, projection).sort(TRACE_SORT).skip((page - 1) * page_size)
 
-        return {
+        # Fetch one extra row to know whether there is a next page
+        cursor_query = cursor_query.limit(page_size + 1)
+        traces = await cursor_query.to_list(length=page_size + 1)
+        for trace in traces:
+            known_traces.add(trace["trace_id"])
+
+        next_cursor = None
+        if len(traces) > page_size:
+            traces = traces[:page_size]
+            next_cursor = encode_cursor(trace_key(traces[-1]))
+
+        # Documents are serialized as stored; NaN is normalized at import time
+        return MongoJSONResponse({
             "traces": traces,
-            "page": page,
+            "page": None if cursor else page,
             "page_size": page_size,
             "total": total,
-            "total_pages": (total + page_size - 1) // page_size
-        }
+            "total_pages": (total + page_size - 1) // page_size,
+            "next_cursor": next_cursor
+        })
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error listing traces: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/session-cache/stats")
+async def get_session_cache_stats():
+    """
+    Hit/miss counters for the session transcript cache in this process
+    """
+    return session_transcripts.stats()
+
 @router.get("/{trace_id}")
 async def get_trace(
     trace_id: str,
+    view: str = Query("full", description="Field profile: list, detail or full"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of a view profile"),
     current_user: Optional[Dict] = Depends(lambda: {"user_id": "demo-user"})  # Temporary: skip auth for testing
 ):
     """
     Get a single trace by ID
+
+    The document and its session transcript are served from the read-through cache.
     """
+    try:
+        projection = trace_projection(view, fields)
+    except InvalidProjectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         db = get_database()
-        trace = await db.traces.find_one({"trace_id": trace_id})
+        trace = await load_trace(db, trace_id, projection)
 
         if not trace:
             raise HTTPException(status_code=404, detail="Trace not found")
+        known_traces.add(trace_id)
 
-        # Convert ObjectId to string
-        trace["_id"] = str(trace["_id"])
-
-        # Get context (previous turns in conversation)
+        # Get context (previous turns in conversation) from the cached session transcript
         context = []
         if trace.get("flow_session"):
-            cursor = db.traces.find({
-                "flow_session": trace["flow_session"],
-                "turn_number": {"$lt": trace.get("turn_number", 0)}
-            }).sort("turn_number", 1)
-
-            async for ctx_trace in cursor:
-                context.append({
-                    "turn_number": ctx_trace.get("turn_number"),
-                    "user_message": ctx_trace.get("user_message"),
-                    "ai_response": ctx_trace.get("ai_response")
-                })
+            context = await session_transcripts.context(db, trace["flow_session"], trace.get("turn_number", 0))
 
         trace["context"] = context
 
-        # Clean NaN values for JSON compatibility
-        trace = clean_nan_values(trace)
-
-        return trace
+        return MongoJSONResponse(trace)
 
     except HTTPException:
         raise
@@ -237,64 +249,62 @@ async def get_adjacent_traces(
     """
     try:
         db = get_database()
-        traces_collection = db.traces
-
-        # Get current trace to determine sort position
-        current_trace = await traces_collection.find_one({"trace_id": trace_id})
-        if not current_trace:
+        adjacent = await find_adjacent(db, trace_id)
+        if adjacent is None:
             raise HTTPException(status_code=404, detail="Trace not found")
 
-        logger.info(f"Current trace: session={current_trace.get('flow_session')}, turn={current_trace.get('turn_number')}")
-
-        # Get previous trace (same sort order as list view)
-        # Sort order is: flow_session DESC, turn_number ASC
-        # So "previous" means: same session with turn_number-1, or last turn of next higher session
+        return adjacent
 
-        # Try same session, previous turn first
-        previous_same_session = await traces_collection.find({
-            "flow_session": current_trace["flow_session"],
-            "turn_number": {"$lt": current_trace["turn_number"]}
-        }).sort([("turn_number", -1)]).limit(1).to_list(length=1)
-
-        logger.info(f"Previous same session query found {len(previous_same_session)} results")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting adjacent traces: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        if previous_same_session:
-            previous_id = previous_same_session[0]["trace_id"]
-            logger.info(f"Found previous in same session: {previous_id}")
-        else:
-            # No previous turn in same session, get last turn of next higher session
-            previous_other_session = await traces_collection.find({
-                "flow_session": {"$gt": current_trace["flow_session"]}
-            }).sort([("flow_session", 1), ("turn_number", -1)]).limit(1).to_list(length=1)
-
-            logger.info(f"Previous other session query found {len(previous_other_session)} results")
-            previous_id = previous_other_session[0]["trace_id"] if previous_other_session else None
-            if previous_id:
-                logger.info(f"Found previous in other session: {previous_id}")
-            else:
-                logger.info("No previous trace found")
-
-        # Get next trace
-        next_cursor = traces_collection.find({
-            "$or": [
-                {"flow_session": {"$lt": current_trace["flow_session"]}},
-                {
-                    "flow_session": current_trace["flow_session"],
-                    "turn_number": {"$gt": current_trace["turn_number"]}
-                }
-            ]
-        }).sort([("flow_session", -1), ("turn_number", 1)]).limit(1)
-
-        next_trace = await next_cursor.to_list(length=1)
-        next_id = next_trace[0]["trace_id"] if next_trace else None
+@router.get("/{trace_id}/position")
+async def get_trace_position(
+    trace_id: str,
+    current_user: Optional[Dict] = Depends(lambda: {"user_id": "demo-user"})
+):
+    """
+    Get a trace's 1-based position in the list order, for "trace N of M"
+    Returns: {"trace_id": ..., "position": N, "total": M}
+    """
+    try:
+        db = get_database()
+        trace = await db.traces.find_one({"trace_id": trace_id}, KEY_PROJECTION)
+        if not trace:
+            raise HTTPException(status_code=404, detail="Trace not found")
 
-        return {
-            "prev": previous_id,
-            "next": next_id
-        }
+        # With current ordinals the total is the numbering's, so N never exceeds M
+        position, total = await find_position(db, trace)
+        if total is None:
+            total = await trace_totals.get(db.traces)
+        return {"trace_id": trace_id, "position": position, "total": total}
 
     except HTTPException:
         raise
+    except Exception as e:
+        logger.error(f"Error getting trace position: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/adjacent")
+async def get_adjacent_traces_batch(
+    request: AdjacentBatchRequest,
+    current_user: Optional[Dict] = Depends(lambda: {"user_id": "demo-user"})
+):
+    """
+    Get previous and next trace IDs for a page of traces, so the list view can prefetch navigation
+    Returns: {"adjacent": {"trace_id": {"prev": ..., "next": ...}}}; unknown IDs are omitted
+    """
+    if len(request.trace_ids) > settings.max_page_size:
+        raise HTTPException(status_code=400, detail=f"At most {settings.max_page_size} trace ids per request")
+
+    try:
+        db = get_database()
+        adjacent = await find_adjacent_batch(db, request.trace_ids)
+        return {"adjacent": adjacent}
+
     except Exception as e:
         logger.error(f"Error getting adjacent traces: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -309,21 +319,9 @@ async def get_next_unannotated_trace(
     """
     try:
         db = get_database()
-        traces_collection = db.traces
-        annotations_collection = db.annotations
-
-        # Get all annotated trace IDs for this user
-        annotated_cursor = annotations_collection.find(
-            {"user_id": current_user.get("user_id")},
-            {"trace_id": 1}
-        )
-        annotated_ids = [doc["trace_id"] async for doc in annotated_cursor]
-
-        # Find first trace not in annotated list
-        unannotated_trace = await traces_collection.find_one(
-            {"trace_id": {"$nin": annotated_ids}},
-            sort=[("flow_session", -1), ("turn_number", 1)]
-        )
+
+        # Anti-join runs in MongoDB and stops at the first unannotated trace
+        unannotated_trace = await find_next_unannotated(db, current_user.get("user_id"))
 
         if unannotated_trace:
             return {"trace_id": unannotated_trace["trace_id"]}
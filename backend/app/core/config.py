@@ -21,15 +21,39 @@ class Settings(BaseSettings):
     # MongoDB
     mongodb_url: str = "mongodb://localhost:27017"
     mongodb_db_name: str = "eval_platform"
+    mongodb_max_pool_size: int = 100  # Connections per server, shared by all requests in a process
+    mongodb_min_pool_size: int = 10  # Kept open so bursts do not pay for new connections
+    mongodb_max_idle_time_ms: int = 60_000  # Idle connections above the minimum are closed after this
+    mongodb_wait_queue_timeout_ms: Optional[int] = None  # Fail checkouts that wait longer (None waits)
 
     # Redis
     redis_url: str = "redis://localhost:6379"
     redis_db: int = 0
+    redis_max_connections: int = 50  # Per process; commands wait for a free connection beyond this
+    redis_pool_timeout_seconds: float = 5.0  # How long a command waits for a connection
 
     # Clerk Authentication
     clerk_frontend_api_url: Optional[str] = None
     clerk_backend_api_key: Optional[str] = None
     clerk_webhook_secret: Optional[str] = None
+    clerk_jwks_url: Optional[str] = None  # Defaults to {clerk_frontend_api_url}/.well-known/jwks.json
+    clerk_jwks_ttl_seconds: int = 3600  # Signing keys are refetched this often
+    clerk_jwks_min_refresh_seconds: int = 30  # Unknown key ids refetch at most this often
+    clerk_authorized_parties: list[str] = []  # Accepted `azp` origins; empty accepts any
+    token_cache_size: int = 10_000  # Verified session tokens remembered per process
+    token_cache_ttl_seconds: int = 300  # Upper bound on reusing a verification (tokens also expire)
+    token_leeway_seconds: int = 5  # Clock skew allowed on exp/nbf
+
+    # Users resolved from tokens, cached per process
+    user_cache_size: int = 10_000
+    user_cache_ttl_seconds: int = 60  # Bounds staleness when cross-worker invalidation is unavailable
+    user_cache_resubscribe_seconds: float = 5.0  # Retry delay after losing the invalidation subscription
+
+    # Outbound HTTP (shared client)
+    http_timeout_seconds: float = 5.0
+    http_max_connections: int = 20
+    http_max_keepalive_connections: int = 10
+    http_keepalive_expiry_seconds: float = 30.0
 
     # Security
     secret_key: str = "your-secret-key-here-change-in-production"
@@ -39,11 +63,45 @@ class Settings(BaseSettings):
     # Pagination
     default_page_size: int = 50
     max_page_size: int = 100
+    totals_cache_ttl_seconds: int = 300  # Cached trace total for the paginator
 
     # File Upload
-    max_upload_size: int = 10 * 1024 * 1024  # 10MB
+    max_upload_size: int = 500 * 1024 * 1024  # 500MB
     allowed_upload_extensions: list[str] = [".csv"]
 
+    # CSV Import
+    import_chunk_size: int = 5000  # Rows parsed and stored per batch
+    import_job_ttl_seconds: int = 24 * 60 * 60  # How long job progress is kept
+    import_max_workers: int = 2  # Processes in the CSV parser pool
+    import_max_concurrent: int = 2  # Imports running at once; others wait as queued
+
+    # Read-through cache (app/services/cache.py)
+    cache_redis_retry_seconds: int = 5  # After a Redis error, serve from process memory this long
+    cache_local_max_entries: int = 10_000  # Process-memory fallback size
+    trace_cache_ttl_seconds: int = 600  # Trace detail documents
+    stats_cache_ttl_seconds: int = 60  # Per-user annotation stats
+
+    # Session transcript cache (conversation context for trace detail)
+    session_cache_size: int = 512  # Sessions held in each process
+    session_cache_local_ttl_seconds: int = 30  # Bounds staleness of other workers' copies after an import
+    session_cache_ttl_seconds: int = 600  # Shared (Redis) tier
+
+    # Trace ordinals (app/services/trace_ordinals.py)
+    ordinal_rebalance_lease_seconds: int = 15 * 60  # Longest one worker renumbers before others may take over
+
+    # Trace ids each process remembers as existing, to skip the check when annotating
+    known_traces_cache_size: int = 200_000
+    known_traces_recheck_seconds: int = 5  # How often each process checks whether traces were cleared
+
+    # Annotations accepted by POST /api/annotations/batch
+    annotation_batch_max_size: int = 100
+
+    # Request profiling (app/core/profiling.py)
+    profiling_token: Optional[str] = None  # Requests sending it as X-Profile-Token or ?profile= are profiled
+    profiling_sample_rate: int = 0  # Also profile 1 in N requests; 0 disables sampling
+    profiling_report_ttl_seconds: int = 24 * 60 * 60  # How long reports can be fetched
+    profiling_top_functions: int = 40  # Functions listed in a report
+
     model_config = SettingsConfigDict(
         env_file=".env",
         case_sensitive=False,
@@ -0,0 +1,118 @@
+"""
+Shared outbound HTTP client
+
+One pooled httpx.AsyncClient for calls to other services (such as Clerk's
+JWKS), so they reuse connections instead of opening a client per call.
+It is opened at startup and closed at shutdown; code running outside the
+app (scripts, tests) gets one created on first use.
+
+Pool limits and keepalive come from settings. The transport reports to
+pool metrics: a request waits until its connection starts sending (which
+includes connecting, for a new connection) and holds the connection until
+its response is closed.
+"""
+from typing import Optional
+import logging
+import time
+
+import httpx
+
+from app.core.config import settings
+from app.core.pool_metrics import PoolStats, register_pool
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+
+class _CheckInStream(httpx.AsyncByteStream):
+    """Response body that returns its connection to pool metrics when closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, stats: PoolStats):
+        self._stream = stream
+        self._stats = stats
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._stats.checked_in()
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """Connection-pooling transport that reports checkouts to pool metrics"""
+
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        acquired = False
+        outer_trace = request.extensions.get("trace")
+
+        def acquire():
+            nonlocal acquired
+            if not acquired:
+                acquired = True
+                self.stats.checkout_finished(time.perf_counter() - started)
+
+        async def trace(event_name, info):
+            if event_name.endswith("send_request_headers.started"):
+                acquire()
+            if outer_trace:
+                await outer_trace(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        self.stats.checkout_started()
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            if acquired:
+                self.stats.checked_in()
+            else:
+                self.stats.checkout_finished(time.perf_counter() - started, acquired=False)
+            raise
+
+        acquire()
+        response.stream = _CheckInStream(response.stream, self.stats)
+        return response
+
+def _create_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry_seconds
+    )
+    stats = register_pool("http", settings.http_max_connections)
+    return httpx.AsyncClient(
+        timeout=settings.http_timeout_seconds,
+        transport=InstrumentedTransport(stats, limits=limits)
+    )
+
+async def connect_http_client():
+    """Open the shared HTTP client"""
+    get_http_client()
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared HTTP client"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+async def close_http_client():
+    """Close the shared HTTP client"""
+    global _client
+    try:
+        if _client is not None:
+            await _client.aclose()
+    except Exception as e:
+        logger.error(f"Error closing HTTP client: {e}")
+    finally:
+        _client = None
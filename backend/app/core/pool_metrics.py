@@ -0,0 +1,93 @@
+"""
+Connection pool saturation metrics
+
+Each shared client (MongoDB, Redis, outbound HTTP) reports checkouts from
+its pool to a `PoolStats`. A pool near saturation shows checked-out
+connections close to its maximum, requests waiting for a connection and
+growing checkout wait times.
+
+Counters are updated from pymongo's monitoring threads as well as the
+event loop, so updates take a lock.
+"""
+from typing import Any, Dict, List, Optional
+import threading
+
+from app.core.metrics import Family, registry
+
+class PoolStats:
+    """Checked-out and waiting counts, and checkout wait times, for one pool"""
+
+    def __init__(self, name: str, max_size: Optional[int]):
+        self.name = name
+        self.max_size = max_size
+        self.checked_out = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._lock = threading.Lock()
+
+    def checkout_started(self) -> None:
+        with self._lock:
+            self.waiting += 1
+
+    def checkout_finished(self, wait_seconds: float, acquired: bool = True) -> None:
+        with self._lock:
+            self.waiting -= 1
+            if not acquired:
+                self.checkout_failures += 1
+                return
+            self.checked_out += 1
+            self.checkouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def checked_in(self) -> None:
+        with self._lock:
+            self.checked_out -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "checked_out": self.checked_out,
+                "waiting": self.waiting,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+
+_pools: Dict[str, PoolStats] = {}
+
+def register_pool(name: str, max_size: Optional[int]) -> PoolStats:
+    """Start tracking a pool; a pool re-created under the same name starts from zero"""
+    stats = PoolStats(name, max_size)
+    _pools[name] = stats
+    return stats
+
+def pool_snapshot() -> Dict[str, Dict[str, Any]]:
+    """Current metrics for every tracked pool, by name"""
+    return {name: stats.snapshot() for name, stats in _pools.items()}
+
+@registry.collector
+def _collect() -> List[Family]:
+    pools = pool_snapshot()
+
+    def samples(field):
+        return [({"pool": name}, stats[field]) for name, stats in pools.items()]
+
+    return [
+        ("connection_pool_max_size", "gauge", "Configured maximum connections per pool", samples("max_size")),
+        ("connection_pool_checked_out", "gauge", "Connections currently checked out", samples("checked_out")),
+        ("connection_pool_waiting", "gauge", "Checkouts currently waiting for a connection", samples("waiting")),
+        ("connection_pool_checkouts_total", "counter", "Successful checkouts", samples("checkouts")),
+        ("connection_pool_checkout_failures_total", "counter", "Checkouts that failed or timed out",
+         samples("checkout_failures")),
+        ("connection_pool_checkout_wait_seconds_total", "counter", "Time spent waiting for connections",
+         samples("wait_seconds_total")),
+        ("connection_pool_checkout_wait_seconds_max", "gauge", "Longest checkout wait since the pool was created",
+         samples("wait_seconds_max")),
+    ]
@@ -0,0 +1,164 @@
+"""
+Opt-in request profiling
+
+`ProfilingMiddleware` profiles a request when it carries the profiling
+token in an `X-Profile-Token` header (checked against `profiling_token`),
+or when it is picked by sampling (one in every `profiling_sample_rate`
+requests). The token is never accepted as a query parameter, which would
+leave it in access logs and browser history. Without a token configured
+and with sampling at 0, the middleware only passes requests through.
+
+A profiled request gets an `X-Profile-Id` response header. Its report
+is stored in the shared cache for `profiling_report_ttl_seconds` and
+served by GET /debug/profiles/{profile_id} to holders of the token. A
+report has:
+
+- the top functions by cumulative time from cProfile. cProfile sees the
+  event loop thread, so coroutines of concurrent requests that run while
+  the profiled one awaits show up too; only one request is profiled with
+  cProfile at a time.
+- MongoDB time per command and collection, fed by the command listener
+  in app/db/mongodb.py. Motor runs pymongo on executor threads but copies
+  the caller's context, so the request is found through a ContextVar.
+"""
+from contextvars import ContextVar
+from datetime import datetime
+from itertools import count
+from typing import Any, Dict, Optional
+import cProfile
+import hmac
+import io
+import logging
+import pstats
+import threading
+import time
+import uuid
+
+from app.core.config import settings
+from app.services.cache import cache
+
+logger = logging.getLogger(__name__)
+
+TOKEN_HEADER = b"x-profile-token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+class RequestProfile:
+    """MongoDB command timings collected for one profiled request"""
+
+    def __init__(self):
+        self.commands: Dict[str, Dict[str, float]] = {}
+        self._collections: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def command_started(self, request_id: int, command_name: str, command: Dict[str, Any]) -> None:
+        collection = command.get(command_name)
+        with self._lock:
+            self._collections[request_id] = collection if isinstance(collection, str) else ""
+
+    def command_finished(self, request_id: int, command_name: str, duration_micros: int, failed: bool = False) -> None:
+        with self._lock:
+            collection = self._collections.pop(request_id, "")
+            key = f"{command_name} {collection}".strip()
+            entry = self.commands.setdefault(key, {"count": 0, "failed": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["failed"] += int(failed)
+            entry["total_ms"] += duration_micros / 1000
+            entry["max_ms"] = max(entry["max_ms"], duration_micros / 1000)
+
+    def db_report(self) -> Dict[str, Any]:
+        with self._lock:
+            commands = {
+                key: {**entry, "total_ms": round(entry["total_ms"], 3), "max_ms": round(entry["max_ms"], 3)}
+                for key, entry in sorted(self.commands.items(), key=lambda item: -item[1]["total_ms"])
+            }
+        return {
+            "total_ms": round(sum(entry["total_ms"] for entry in commands.values()), 3),
+            "commands": commands,
+        }
+
+# The profile of the request being served, if it is profiled
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+def token_matches(token: Optional[str]) -> bool:
+    """Whether `token` is the configured profiling token"""
+    if not settings.profiling_token or not token:
+        return False
+    return hmac.compare_digest(token.encode(), settings.profiling_token.encode())
+
+def profile_key(profile_id: str) -> str:
+    return f"profile:{profile_id}"
+
+def _format_stats(profiler: cProfile.Profile) -> str:
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(settings.profiling_top_functions)
+    return output.getvalue()
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling flagged or sampled HTTP requests"""
+
+    def __init__(self, app):
+        self.app = app
+        self._requests = count(1)
+        self._profiler_active = False
+
+    def _should_profile(self, scope) -> bool:
+        headers = dict(scope.get("headers") or [])
+        if token_matches(headers.get(TOKEN_HEADER, b"").decode("latin-1")):
+            return True
+        rate = settings.profiling_sample_rate
+        return rate > 0 and next(self._requests) % rate == 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        profile = RequestProfile()
+        status = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                profile_header = (PROFILE_ID_HEADER.lower().encode(), profile_id.encode())
+                message = {**message, "headers": [*message.get("headers", []), profile_header]}
+            await send(message)
+
+        # cProfile hooks the whole thread, so overlapping requests are not profiled with it
+        profiler = None
+        if not self._profiler_active:
+            self._profiler_active = True
+            profiler = cProfile.Profile()
+
+        token = current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            if profiler:
+                profiler.enable()
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            if profiler:
+                profiler.disable()
+                self._profiler_active = False
+            duration_ms = (time.perf_counter() - started) * 1000
+            current_profile.reset(token)
+
+            route = scope.get("route")
+            report = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None),
+                "status": status,
+                "duration_ms": round(duration_ms, 3),
+                "profiled_at": datetime.utcnow(),
+                "db": profile.db_report(),
+                "profile": _format_stats(profiler) if profiler else None,
+            }
+            await cache.set(profile_key(profile_id), report, settings.profiling_report_ttl_seconds)
+            logger.info(
+                f"Profiled {scope['method']} {scope['path']} ({status}) in {duration_ms:.1f}ms, "
+                f"{report['db']['total_ms']}ms in MongoDB: profile {profile_id}"
+            )
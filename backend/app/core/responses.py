@@ -0,0 +1,43 @@
+"""
+JSON responses for MongoDB documents
+
+`MongoJSONResponse` is the app's default response class (see app/main.py).
+It renders with orjson, which writes datetimes natively and turns any
+stray NaN into null; other types that appear in documents, such as
+ObjectId, are serialized through the encoder registry.
+
+Handlers on hot paths return `MongoJSONResponse(content)` directly rather
+than a dict, which also skips FastAPI's jsonable_encoder walk. Handlers
+that return dicts still work with raw documents: registered encoders are
+shared with jsonable_encoder.
+"""
+from typing import Any, Callable, Dict
+
+from fastapi import encoders as fastapi_encoders
+from fastapi.responses import JSONResponse
+import orjson
+
+# Type -> function returning a JSON-native value; see register_encoder
+ENCODERS: Dict[type, Callable[[Any], Any]] = {}
+
+def register_encoder(value_type: type, encoder: Callable[[Any], Any]) -> None:
+    """Serialize `value_type` (and subclasses) with `encoder` in every response"""
+    ENCODERS[value_type] = encoder
+    fastapi_encoders.ENCODERS_BY_TYPE[value_type] = encoder
+
+def _default(value: Any) -> Any:
+    for value_type in type(value).__mro__:
+        encoder = ENCODERS.get(value_type)
+        if encoder:
+            return encoder(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Serialize a value the way responses render it"""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+class MongoJSONResponse(JSONResponse):
+    """orjson-rendered response that accepts raw MongoDB documents"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,175 @@
+"""
+Index advisor (dev command)
+
+Runs explain() on every query shape issued by the traces, annotations
+and auth APIs and flags any that do a collection scan (COLLSCAN) or sort
+in memory (SORT stage) instead of walking an index.
+
+Usage (from backend/, against the database in MONGODB_URL):
+    python -m app.db.index_advisor
+
+Exits with status 1 if any query shape is flagged. Keep query_shapes() in
+sync when adding or changing queries in app/api.
+"""
+from typing import Any, Dict, Iterator, List, Tuple
+import asyncio
+import sys
+
+from app.core.config import settings
+from app.db.mongodb import close_mongo_connection, connect_to_mongo, get_database
+from app.services.adjacency import KEY_PROJECTION
+from app.services.annotation_stats import RECENT_LIMIT, RECENT_PROJECTION, stats_pipeline
+from app.services.session_cache import TRANSCRIPT_PROJECTION
+from app.services.trace_order import REVERSE_TRACE_SORT, TRACE_SORT, after_key, before_key
+from app.services.trace_views import trace_projection
+from app.services.unannotated import next_unannotated_pipeline
+
+FLAGGED_STAGES = {
+    "COLLSCAN": "collection scan",
+    "SORT": "in-memory sort",
+}
+
+def _sort_spec(sort: List[Tuple[str, int]]) -> Dict[str, int]:
+    return {field: direction for field, direction in sort}
+
+def _count_documents(collection: str, query: Dict[str, Any]) -> Dict[str, Any]:
+    """The aggregate command pymongo's count_documents() sends"""
+    return {
+        "aggregate": collection,
+        "pipeline": [{"$match": query}, {"$group": {"_id": 1, "n": {"$sum": 1}}}],
+        "cursor": {}
+    }
+
+def query_shapes(trace: Dict[str, Any], user_id: str) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """
+    Return (name, collection, explain command) for each API query shape
+
+    `trace` supplies realistic values for the filters; the plans do not
+    depend on them much, but equality on real values keeps the planner honest.
+    """
+    key = (trace["flow_session"], trace["turn_number"], trace["trace_id"])
+    return [
+        # GET /api/traces
+        ("trace total", "traces", _count_documents("traces", {})),
+        ("list traces", "traces", {
+            "find": "traces", "filter": {}, "projection": trace_projection("list"), "sort": _sort_spec(TRACE_SORT),
+            "limit": settings.default_page_size + 1
+        }),
+        ("list traces (cursor)", "traces", {
+            "find": "traces", "filter": after_key(key), "sort": _sort_spec(TRACE_SORT),
+            "limit": settings.default_page_size + 1
+        }),
+        ("list traces (page jump)", "traces", {
+            "find": "traces", "filter": {"ordinal": {"$lte": settings.default_page_size}}, "sort": {"ordinal": -1},
+            "limit": settings.default_page_size + 1
+        }),
+        # GET /api/traces/{trace_id}/position
+        ("trace position (ordinals rebalancing)", "traces", _count_documents("traces", before_key(key))),
+        # GET /api/traces/{trace_id}
+        ("get trace", "traces", {"find": "traces", "filter": {"trace_id": trace["trace_id"]}, "limit": 1}),
+        ("session transcript", "traces", {
+            "find": "traces", "filter": {"flow_session": trace["flow_session"]},
+            "projection": TRANSCRIPT_PROJECTION, "sort": {"turn_number": 1}
+        }),
+        # GET /api/traces/{trace_id}/adjacent and POST /api/traces/adjacent
+        ("previous trace", "traces", {
+            "find": "traces", "filter": before_key(key), "projection": KEY_PROJECTION,
+            "sort": _sort_spec(REVERSE_TRACE_SORT), "limit": 1
+        }),
+        ("next trace", "traces", {
+            "find": "traces", "filter": after_key(key), "projection": KEY_PROJECTION,
+            "sort": _sort_spec(TRACE_SORT), "limit": 1
+        }),
+        ("adjacent by ordinal", "traces", {
+            "find": "traces", "filter": {"ordinal": {"$in": [1, 3]}}, "projection": {"_id": 0, "trace_id": 1, "ordinal": 1}
+        }),
+        ("adjacent page keys", "traces", {
+            "find": "traces", "filter": {"trace_id": {"$in": [trace["trace_id"]]}}, "projection": KEY_PROJECTION
+        }),
+        ("adjacent page span", "traces", {
+            "find": "traces", "filter": {"$and": [after_key(key, inclusive=True), before_key(key)]},
+            "projection": KEY_PROJECTION, "sort": _sort_spec(TRACE_SORT), "limit": 2 * settings.default_page_size + 1
+        }),
+        # GET /api/traces/next/unannotated
+        ("annotation frontier", "annotation_frontiers", {
+            "find": "annotation_frontiers", "filter": {"user_id": user_id}, "limit": 1
+        }),
+        ("next unannotated trace", "traces", {
+            "aggregate": "traces", "pipeline": next_unannotated_pipeline(user_id), "cursor": {}
+        }),
+        ("next unannotated from frontier", "traces", {
+            "aggregate": "traces", "pipeline": next_unannotated_pipeline(user_id, key), "cursor": {}
+        }),
+        # POST /api/annotations and GET /api/annotations/trace/{trace_id}
+        ("annotation for trace", "annotations", {
+            "find": "annotations", "filter": {"trace_id": trace["trace_id"], "user_id": user_id}, "limit": 1
+        }),
+        # GET /api/annotations/user/stats
+        ("annotation counters", "annotation_counters", {
+            "find": "annotation_counters", "filter": {"user_id": user_id}, "limit": 1
+        }),
+        ("recent annotations", "annotations", {
+            "find": "annotations", "filter": {"user_id": user_id}, "projection": RECENT_PROJECTION,
+            "sort": {"updated_at": -1}, "limit": RECENT_LIMIT
+        }),
+        ("rebuild user counters", "annotations", {
+            "aggregate": "annotations", "pipeline": stats_pipeline(user_id), "cursor": {}
+        }),
+        # GET /api/auth/me (user cache misses) and the Clerk webhooks
+        ("user by clerk id", "users", {"find": "users", "filter": {"clerk_id": user_id}, "limit": 1}),
+    ]
+
+def _plan_stages(node: Any) -> Iterator[str]:
+    """Yield every stage name in the winning plans of an explain result"""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "rejectedPlans":
+                continue
+            if key == "stage" and isinstance(value, str):
+                yield value
+            else:
+                yield from _plan_stages(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _plan_stages(item)
+
+def find_problems(explain: Dict[str, Any]) -> List[str]:
+    """Return a description of each flagged stage in a find or aggregate explain result"""
+    stages = set(_plan_stages(explain))
+    # Aggregations that could not push the sort into the query plan sort in memory
+    if any("$sort" in stage for stage in explain.get("stages", [])):
+        stages.add("SORT")
+    return [description for stage, description in FLAGGED_STAGES.items() if stage in stages]
+
+async def run_advisor() -> int:
+    """Explain every query shape and print a report; returns the number flagged"""
+    db = get_database()
+    trace = await db.traces.find_one({}, {"trace_id": 1, "flow_session": 1, "turn_number": 1}) or {
+        "trace_id": "sample-trace", "flow_session": "sample-session", "turn_number": 1
+    }
+    annotation = await db.annotations.find_one({}, {"user_id": 1})
+    user_id = annotation["user_id"] if annotation else "demo-user"
+
+    shapes = query_shapes(trace, user_id)
+    flagged = 0
+    for name, collection, command in shapes:
+        explain = await db.command("explain", command, verbosity="queryPlanner")
+        problems = find_problems(explain)
+        if problems:
+            flagged += 1
+            print(f"FLAG  {collection}: {name} - {', '.join(problems)}")
+        else:
+            print(f"ok    {collection}: {name}")
+
+    print(f"\n{flagged} of {len(shapes)} query shapes flagged")
+    return flagged
+
+async def main() -> int:
+    await connect_to_mongo()
+    try:
+        return await run_advisor()
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(main()) else 0)
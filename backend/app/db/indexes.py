@@ -0,0 +1,46 @@
+"""
+Index registry
+
+Declares every index the API's query shapes rely on, per collection.
+`create_indexes()` applies the registry at startup; creating an index that
+already exists with the same spec is a no-op, so this is safe to run on
+every boot. `app.db.index_advisor` checks the query shapes against it.
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+INDEXES = {
+    "traces": [
+        IndexModel([("trace_id", ASCENDING)], unique=True),
+        # List, adjacency and "next unannotated" all sort on this key
+        IndexModel(
+            [("flow_session", DESCENDING), ("turn_number", ASCENDING), ("trace_id", ASCENDING)],
+            name="trace_order"
+        ),
+        # Materialized position in trace_order, for navigation and page jumps.
+        # Not unique: renumbering passes through duplicates
+        IndexModel([("ordinal", ASCENDING)]),
+        IndexModel([("imported_by", ASCENDING)]),
+        IndexModel([("imported_at", ASCENDING)]),
+    ],
+    "annotations": [
+        # Annotation for a trace by a user; unique so concurrent upserts cannot duplicate it.
+        # Startup replaces the non-unique index of older databases (see app.db.mongodb)
+        IndexModel([("trace_id", ASCENDING), ("user_id", ASCENDING)], unique=True),
+        # A user's annotated trace ids, covered by the index
+        IndexModel([("user_id", ASCENDING), ("trace_id", ASCENDING)]),
+        # Per-user pass/fail counts
+        IndexModel([("user_id", ASCENDING), ("holistic_pass_fail", ASCENDING)]),
+        # A user's most recent annotations
+        IndexModel([("user_id", ASCENDING), ("updated_at", DESCENDING)]),
+        IndexModel([("created_at", ASCENDING)]),
+    ],
+    "annotation_counters": [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+    ],
+    "annotation_frontiers": [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+    ],
+    "users": [
+        IndexModel([("clerk_id", ASCENDING)]),
+    ],
+}
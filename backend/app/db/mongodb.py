@@ -2,13 +2,102 @@
 MongoDB connection management
 """
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional
+from pymongo import monitoring
+from typing import Any, Dict, Optional
 import logging
+import threading
+import time
 
 from app.core.config import settings
+from app.core.metrics import registry
+from app.core.pool_metrics import PoolStats, register_pool
+from app.core.profiling import current_profile
+from app.db.indexes import INDEXES
 
 logger = logging.getLogger(__name__)
 
+# Unique on annotations; see replace_non_unique_annotation_index
+ANNOTATION_KEYS = {"trace_id": 1, "user_id": 1}
+
+MONGO_COMMAND_SECONDS = registry.histogram("mongodb_command_duration_seconds", "MongoDB command round trips by command")
+MONGO_COMMAND_FAILURES = registry.counter("mongodb_command_failures_total", "Failed MongoDB commands by command")
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """
+    Times every MongoDB command from pymongo's command monitoring events,
+    and attributes it to the request being profiled, if any
+    """
+
+    def started(self, event):
+        profile = current_profile.get()
+        if profile:
+            profile.command_started(event.request_id, event.command_name, event.command)
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1_000_000, command=event.command_name)
+        profile = current_profile.get()
+        if profile:
+            profile.command_finished(event.request_id, event.command_name, event.duration_micros)
+
+    def failed(self, event):
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1_000_000, command=event.command_name)
+        MONGO_COMMAND_FAILURES.inc(command=event.command_name)
+        profile = current_profile.get()
+        if profile:
+            profile.command_finished(event.request_id, event.command_name, event.duration_micros, failed=True)
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Feeds connection checkouts into pool metrics; pymongo calls it on the thread doing the checkout"""
+
+    def __init__(self, stats: PoolStats):
+        self.stats = stats
+        self._checkout = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._checkout.started = time.perf_counter()
+        self.stats.checkout_started()
+
+    def connection_checked_out(self, event):
+        self.stats.checkout_finished(time.perf_counter() - self._checkout.started)
+
+    def connection_check_out_failed(self, event):
+        self.stats.checkout_finished(time.perf_counter() - self._checkout.started, acquired=False)
+
+    def connection_checked_in(self, event):
+        self.stats.checked_in()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+def client_options() -> Dict[str, Any]:
+    """Pool sizing for the MongoDB client, from settings"""
+    options = {
+        "maxPoolSize": settings.mongodb_max_pool_size,
+        "minPoolSize": settings.mongodb_min_pool_size,
+        "maxIdleTimeMS": settings.mongodb_max_idle_time_ms,
+    }
+    if settings.mongodb_wait_queue_timeout_ms is not None:
+        options["waitQueueTimeoutMS"] = settings.mongodb_wait_queue_timeout_ms
+    return options
+
 class MongoDB:
     client: Optional[AsyncIOMotorClient] = None
     database = None
@@ -19,7 +108,12 @@ async def connect_to_mongo():
     """Create database connection"""
     try:
         logger.info(f"Connecting to MongoDB at {settings.mongodb_url}")
-        db.client = AsyncIOMotorClient(settings.mongodb_url)
+        pool_stats = register_pool("mongodb", settings.mongodb_max_pool_size)
+        db.client = AsyncIOMotorClient(
+            settings.mongodb_url,
+            event_listeners=[CommandMetricsListener(), PoolMetricsListener(pool_stats)],
+            **client_options()
+        )
         db.database = db.client[settings.mongodb_db_name]
 
         # Verify connection
@@ -43,26 +137,42 @@ async def close_mongo_connection():
         logger.error(f"Error closing MongoDB connection: {e}")
 
 async def create_indexes():
-    """Create database indexes"""
-    try:
-        # Traces collection indexes
-        traces_collection = db.database["traces"]
-        await traces_collection.create_index("trace_id", unique=True)
-        await traces_collection.create_index("flow_session")
-        await traces_collection.create_index("imported_by")
-        await traces_collection.create_index("imported_at")
-
-        # Annotations collection indexes
-        annotations_collection = db.database["annotations"]
-        await annotations_collection.create_index([("trace_id", 1), ("user_id", 1)])
-        await annotations_collection.create_index("user_id")
-        await annotations_collection.create_index("created_at")
-        await annotations_collection.create_index("holistic_pass_fail")
-
-        logger.info("Database indexes created successfully")
+    """Create database indexes declared in the index registry"""
+    await replace_non_unique_annotation_index()
+    for collection_name, indexes in INDEXES.items():
+        # One at a time, so an index that conflicts with an existing one does not block the rest
+        names = []
+        for index in indexes:
+            try:
+                names += await db.database[collection_name].create_indexes([index])
+            except Exception as e:
+                logger.error(f"Error creating index {index.document['name']} on {collection_name}: {e}")
+        logger.info(f"Indexes ready on {collection_name}: {', '.join(names)}")
 
-    except Exception as e:
-        logger.error(f"Error creating indexes: {e}")
+async def replace_non_unique_annotation_index():
+    """
+    Drop the non-unique (trace_id, user_id) index of databases created before
+    it was unique, so create_indexes() can create the unique one under the same
+    name. Annotation upserts rely on that uniqueness, so if duplicate
+    annotations would stop the unique index from building, startup fails
+    until migrate_annotation_unique.py has removed them.
+    """
+    annotations = db.database.annotations
+    for name, spec in (await annotations.index_information()).items():
+        if dict(spec["key"]) != ANNOTATION_KEYS or spec.get("unique"):
+            continue
+        duplicate = await annotations.aggregate([
+            {"$group": {"_id": {"trace_id": "$trace_id", "user_id": "$user_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+            {"$limit": 1}
+        ], allowDiskUse=True).to_list(length=1)
+        if duplicate:
+            raise RuntimeError(
+                f"annotations has duplicate (trace_id, user_id) pairs, so index {name} cannot be made unique; "
+                "run migrate_annotation_unique.py"
+            )
+        await annotations.drop_index(name)
+        logger.warning(f"Dropped non-unique annotations index {name}; creating the unique one")
 
 def get_database():
     """Get database instance"""
@@ -4,11 +4,35 @@ Redis connection management
 import redis.asyncio as redis
 from typing import Optional
 import logging
+import time
 
 from app.core.config import settings
+from app.core.pool_metrics import PoolStats, register_pool
 
 logger = logging.getLogger(__name__)
 
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """Bounded pool (commands wait for a free connection) that reports checkouts to pool metrics"""
+
+    stats: Optional[PoolStats] = None
+
+    async def get_connection(self, command_name, *keys, **options):
+        started = time.perf_counter()
+        self.stats.checkout_started()
+        try:
+            connection = await super().get_connection(command_name, *keys, **options)
+        except BaseException:
+            self.stats.checkout_finished(time.perf_counter() - started, acquired=False)
+            raise
+        self.stats.checkout_finished(time.perf_counter() - started)
+        return connection
+
+    async def release(self, connection):
+        try:
+            await super().release(connection)
+        finally:
+            self.stats.checked_in()
+
 class RedisDB:
     client: Optional[redis.Redis] = None
 
@@ -18,12 +42,16 @@ async def connect_to_redis():
     """Create Redis connection"""
     try:
         logger.info(f"Connecting to Redis at {settings.redis_url}")
-        redis_db.client = redis.from_url(
+        pool = InstrumentedConnectionPool.from_url(
             settings.redis_url,
             db=settings.redis_db,
+            max_connections=settings.redis_max_connections,
+            timeout=settings.redis_pool_timeout_seconds,
             encoding="utf-8",
             decode_responses=True
         )
+        pool.stats = register_pool("redis", settings.redis_max_connections)
+        redis_db.client = redis.Redis(connection_pool=pool)
 
         # Verify connection
         await redis_db.client.ping()
@@ -37,7 +65,8 @@ async def close_redis_connection():
     """Close Redis connection"""
     try:
         if redis_db.client:
-            await redis_db.client.close()
+            # The client was given its pool, so it only closes it when asked
+            await redis_db.client.aclose(close_connection_pool=True)
             logger.info("Disconnected from Redis")
     except Exception as e:
         logger.error(f"Error closing Redis connection: {e}")
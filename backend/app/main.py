@@ -1,15 +1,27 @@
 """
 Main FastAPI application
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from bson import Decimal128, ObjectId
+from typing import Optional
 import logging
 
 from app.core.config import settings
-from app.db.mongodb import close_mongo_connection, connect_to_mongo
+from app.core.http_client import close_http_client, connect_http_client
+from app.core.metrics import MetricsMiddleware, registry
+from app.core.pool_metrics import pool_snapshot
+from app.core.profiling import PROFILE_ID_HEADER, ProfilingMiddleware, profile_key, token_matches
+from app.core.responses import MongoJSONResponse, register_encoder
+from app.db.mongodb import close_mongo_connection, connect_to_mongo, get_database
 from app.db.redis import close_redis_connection, connect_to_redis
 from app.api import auth, traces, annotations
+from app.services.cache import cache
+from app.services.import_jobs import shutdown_import_workers
+from app.services.trace_ordinals import schedule_rebalance
+from app.services.user_cache import user_cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,13 +34,25 @@ async def lifespan(app: FastAPI):
     logger.info("Starting up...")
     await connect_to_mongo()
     await connect_to_redis()
+    await connect_http_client()
+    # Drop users changed through webhooks received by other workers
+    user_cache.start_listener()
+    # Number traces imported before ordinals existed, or by an interrupted import
+    schedule_rebalance(get_database())
 
     yield
 
     # Shutdown
     logger.info("Shutting down...")
+    shutdown_import_workers()
+    await user_cache.stop_listener()
     await close_mongo_connection()
     await close_redis_connection()
+    await close_http_client()
+
+# BSON types that reach responses inside MongoDB documents
+register_encoder(ObjectId, str)
+register_encoder(Decimal128, lambda value: str(value.to_decimal()))
 
 # Create FastAPI app
 app = FastAPI(
@@ -36,6 +60,7 @@ app = FastAPI(
     description="API for evaluating chatbot conversation traces",
     version="0.1.0",
     lifespan=lifespan,
+    default_response_class=MongoJSONResponse,  # orjson with the BSON encoders above
     redirect_slashes=False  # Prevent 307 redirects that break CORS
 )
 
@@ -47,8 +72,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[PROFILE_ID_HEADER],  # Lets browser clients read which profile a response produced
 )
 
+# Request latency by route template, served at /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Profiles requests flagged with the profiling token, or sampled; reports at /debug/profiles
+app.add_middleware(ProfilingMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(traces.router, prefix="/api/traces", tags=["Traces"])
@@ -62,4 +94,30 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/health/pools")
+async def pool_health():
+    """Connection pool saturation for this process: checked out, waiting and checkout wait times"""
+    return pool_snapshot()
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus metrics for this process"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/debug/profiles/{profile_id}", include_in_schema=False)
+async def get_profile(
+    profile_id: str,
+    x_profile_token: Optional[str] = Header(None)
+):
+    """Report for a profiled request, named by its X-Profile-Id response header"""
+    if not settings.profiling_token:
+        raise HTTPException(status_code=404, detail="Profiling is not enabled")
+    if not token_matches(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+    found, report = await cache.get(profile_key(profile_id))
+    if not found:
+        raise HTTPException(status_code=404, detail="Profile not found or expired")
+    return report
@@ -2,7 +2,7 @@
 Annotation schemas for request/response validation
 """
 from pydantic import BaseModel, Field, validator
-from typing import Optional, Literal
+from typing import List, Optional, Literal
 from datetime import datetime
 
 class AnnotationCreate(BaseModel):
@@ -30,6 +30,10 @@ class AnnotationCreate(BaseModel):
             }
         }
 
+class AnnotationBatchCreate(BaseModel):
+    """Schema for creating or updating several annotations at once"""
+    annotations: List[AnnotationCreate] = Field(..., min_length=1, description="Annotations to save")
+
 class AnnotationUpdate(BaseModel):
     """Schema for updating an annotation"""
     holistic_pass_fail: Optional[Literal["Pass", "Fail"]] = None
@@ -0,0 +1,16 @@
+"""
+Trace schemas for request/response validation
+"""
+from pydantic import BaseModel, Field
+from typing import List
+
+class AdjacentBatchRequest(BaseModel):
+    """Schema for resolving prev/next of several traces at once"""
+    trace_ids: List[str] = Field(..., min_length=1, description="IDs of the traces to resolve, typically one list page")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "trace_ids": ["session_123_1", "session_123_2", "session_123_3"]
+            }
+        }
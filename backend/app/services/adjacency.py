@@ -0,0 +1,106 @@
+"""
+Previous/next trace resolution
+
+Navigation follows TRACE_SORT. While trace ordinals are current (see
+trace_ordinals), neighbours are the traces at `ordinal ± 1`, fetched for
+any number of traces with one `$in` on the ordinal index. Ordinals count
+from the end of the list, so the previous trace is `ordinal + 1`.
+
+While ordinals are being rebalanced after an import, the sort key is used
+instead: a trace's neighbours are two independent index seeks on
+trace_order (one walking forwards, one backwards), issued concurrently so
+they cost one round trip. For a page of traces, one range scan over the
+page's keys yields every neighbour inside the page, plus two seeks for the
+neighbours at its edges.
+"""
+from typing import Any, Dict, List, Optional
+import asyncio
+
+from app.services.trace_order import (
+    REVERSE_TRACE_SORT, TRACE_SORT, TraceKey, after_key, before_key, trace_key
+)
+from app.services.trace_ordinals import ordinals_current
+
+KEY_PROJECTION = {"_id": 0, "trace_id": 1, "flow_session": 1, "turn_number": 1, "ordinal": 1}
+
+Adjacent = Dict[str, Optional[str]]
+
+async def _seek(collection, query: Dict[str, Any], sort) -> Optional[str]:
+    found = await collection.find(query, KEY_PROJECTION).sort(sort).limit(1).to_list(length=1)
+    return found[0]["trace_id"] if found else None
+
+async def neighbours(collection, key: TraceKey) -> Adjacent:
+    """Return the trace ids immediately before and after `key`"""
+    prev_id, next_id = await asyncio.gather(
+        _seek(collection, before_key(key), REVERSE_TRACE_SORT),
+        _seek(collection, after_key(key), TRACE_SORT)
+    )
+    return {"prev": prev_id, "next": next_id}
+
+async def _by_ordinal(collection, traces: List[Dict[str, Any]]) -> Dict[str, Adjacent]:
+    """Resolve neighbours of traces whose ordinals are current"""
+    wanted = sorted({trace["ordinal"] + step for trace in traces for step in (-1, 1)})
+    found = await collection.find(
+        {"ordinal": {"$in": wanted}}, {"_id": 0, "trace_id": 1, "ordinal": 1}
+    ).to_list(length=None)
+    by_ordinal = {trace["ordinal"]: trace["trace_id"] for trace in found}
+    return {
+        trace["trace_id"]: {"prev": by_ordinal.get(trace["ordinal"] + 1), "next": by_ordinal.get(trace["ordinal"] - 1)}
+        for trace in traces
+    }
+
+async def find_adjacent(db, trace_id: str) -> Optional[Adjacent]:
+    """Return prev/next trace ids for `trace_id`, or None if it does not exist"""
+    current, use_ordinals = await asyncio.gather(
+        db.traces.find_one({"trace_id": trace_id}, KEY_PROJECTION),
+        ordinals_current(db)
+    )
+    if not current:
+        return None
+    if use_ordinals and current.get("ordinal"):
+        return (await _by_ordinal(db.traces, [current]))[trace_id]
+    return await neighbours(db.traces, trace_key(current))
+
+async def find_adjacent_batch(db, trace_ids: List[str]) -> Dict[str, Adjacent]:
+    """
+    Return prev/next trace ids for each of `trace_ids` that exists
+
+    Without current ordinals this is built for a page of the list view,
+    where the ids are contiguous. If the ids are scattered, the range scan
+    is abandoned once it grows past the page and each id is resolved with
+    its own seeks instead.
+    """
+    collection = db.traces
+    found, use_ordinals = await asyncio.gather(
+        collection.find({"trace_id": {"$in": trace_ids}}, KEY_PROJECTION).to_list(length=None),
+        ordinals_current(db)
+    )
+    if not found:
+        return {}
+    if use_ordinals and all(trace.get("ordinal") for trace in found):
+        return await _by_ordinal(collection, found)
+
+    keys = sorted((trace_key(trace) for trace in found), key=lambda key: (key[1], key[2]))
+    keys.sort(key=lambda key: key[0], reverse=True)
+    first, last = keys[0], keys[-1]
+
+    # Everything from the first to the last requested trace, in order
+    span_query = {"$and": [after_key(first, inclusive=True), before_key(last)]}
+    limit = 2 * len(keys) + 1
+    span, before_first, after_last = await asyncio.gather(
+        collection.find(span_query, KEY_PROJECTION).sort(TRACE_SORT).limit(limit).to_list(length=limit),
+        _seek(collection, before_key(first), REVERSE_TRACE_SORT),
+        _seek(collection, after_key(last), TRACE_SORT)
+    )
+
+    if len(span) == limit:
+        resolved = await asyncio.gather(*(neighbours(collection, key) for key in keys))
+        return {key[2]: adjacent for key, adjacent in zip(keys, resolved)}
+
+    ordered = [before_first] + [trace["trace_id"] for trace in span] + [last[2], after_last]
+    wanted = {key[2] for key in keys}
+    return {
+        trace_id: {"prev": ordered[i - 1], "next": ordered[i + 1]}
+        for i, trace_id in enumerate(ordered[1:-1], start=1)
+        if trace_id in wanted
+    }
@@ -0,0 +1,159 @@
+"""
+Per-user annotation statistics
+
+Each user has a counter document in `annotation_counters` holding their
+total, Pass and Fail counts. Annotation writes adjust it with `$inc` as
+they save (a Pass→Fail flip moves one count across), so reading stats is
+a point lookup plus the indexed "recent annotations" query.
+
+A missing counter document is rebuilt from the annotations with one
+`$facet` aggregation. Counters can drift if a process dies between saving
+an annotation and adjusting them, so the reconciliation job rebuilds all
+of them from source:
+
+    python -m app.services.annotation_stats
+
+The stats response itself is held in the read-through cache under the
+user's tag, which every save invalidates.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+import asyncio
+
+from app.core.config import settings
+from app.db.mongodb import close_mongo_connection, connect_to_mongo, get_database
+from app.services.cache import cache, cached, user_tag
+
+STATS_TAG = "annotation_stats"
+
+RESULT_FIELDS = {"Pass": "pass_count", "Fail": "fail_count"}
+
+RECENT_LIMIT = 5
+RECENT_PROJECTION = {"_id": 0, "trace_id": 1, "holistic_pass_fail": 1, "updated_at": 1}
+
+Counters = Dict[str, int]
+
+def counter_change(created: bool, before: Optional[str], after: Optional[str]) -> Counters:
+    """Counter increments for one save that moved an annotation's result from `before` to `after`"""
+    change: Counters = {}
+    if created:
+        change["total"] = 1
+    elif before in RESULT_FIELDS:
+        change[RESULT_FIELDS[before]] = -1
+    if after in RESULT_FIELDS:
+        field = RESULT_FIELDS[after]
+        change[field] = change.get(field, 0) + 1
+    return {field: count for field, count in change.items() if count}
+
+def merge_changes(changes: List[Counters]) -> Counters:
+    total: Counters = {}
+    for change in changes:
+        for field, count in change.items():
+            total[field] = total.get(field, 0) + count
+    return {field: count for field, count in total.items() if count}
+
+async def apply_change(db, user_id: str, change: Counters) -> None:
+    """
+    Adjust a user's counters after a save; if they have none yet, build them from their annotations
+
+    Called for every save, even one with no counter change, since it also
+    drops the user's cached stats (their recent annotations changed).
+    """
+    if change:
+        result = await db.annotation_counters.update_one(
+            {"user_id": user_id}, {"$inc": change, "$set": {"updated_at": datetime.utcnow()}}
+        )
+        if result.matched_count == 0:
+            # Starting from zero would ignore annotations saved before counters existed
+            await reconcile_user(db, user_id)
+    await cache.invalidate(user_tag(user_id))
+
+def stats_pipeline(user_id: str) -> List[Dict[str, Any]]:
+    """Aggregation returning a user's per-result counts and recent annotations in one round trip"""
+    return [
+        {"$match": {"user_id": user_id}},
+        {"$facet": {
+            "counts": [{"$group": {"_id": "$holistic_pass_fail", "count": {"$sum": 1}}}],
+            "recent": [
+                {"$sort": {"updated_at": -1}},
+                {"$limit": RECENT_LIMIT},
+                {"$project": RECENT_PROJECTION}
+            ]
+        }}
+    ]
+
+async def compute_stats(db, user_id: str) -> Tuple[Counters, List[Dict[str, Any]]]:
+    """Count a user's annotations from source; returns (counters, recent annotations)"""
+    result = (await db.annotations.aggregate(stats_pipeline(user_id)).to_list(length=1))[0]
+    by_result = {group["_id"]: group["count"] for group in result["counts"]}
+    counters = {"total": sum(by_result.values())}
+    counters.update({field: by_result.get(value, 0) for value, field in RESULT_FIELDS.items()})
+    return counters, result["recent"]
+
+async def reconcile_user(db, user_id: str) -> Tuple[Counters, List[Dict[str, Any]]]:
+    """Rebuild one user's counters from their annotations"""
+    counters, recent = await compute_stats(db, user_id)
+    await db.annotation_counters.update_one(
+        {"user_id": user_id}, {"$set": {**counters, "updated_at": datetime.utcnow()}}, upsert=True
+    )
+    return counters, recent
+
+def reconcile_pipeline() -> List[Dict[str, Any]]:
+    """Aggregation rebuilding every user's counters inside MongoDB"""
+    return [
+        {"$group": {"_id": {"user_id": "$user_id", "result": "$holistic_pass_fail"}, "count": {"$sum": 1}}},
+        {"$group": {
+            "_id": "$_id.user_id",
+            "total": {"$sum": "$count"},
+            **{
+                field: {"$sum": {"$cond": [{"$eq": ["$_id.result", value]}, "$count", 0]}}
+                for value, field in RESULT_FIELDS.items()
+            }
+        }},
+        {"$project": {
+            "_id": 0, "user_id": "$_id", "total": 1, **{field: 1 for field in RESULT_FIELDS.values()},
+            "updated_at": "$$NOW"
+        }},
+        {"$merge": {"into": "annotation_counters", "on": "user_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+
+async def reconcile_all(db) -> None:
+    """Rebuild every user's counters from the annotations"""
+    await db.annotations.aggregate(reconcile_pipeline(), allowDiskUse=True).to_list(length=None)
+    await cache.invalidate(STATS_TAG)
+
+@cached(
+    key=lambda db, user_id: f"user_stats:{user_id}",
+    ttl=lambda: settings.stats_cache_ttl_seconds,
+    tags=lambda db, user_id: [user_tag(user_id), STATS_TAG],
+)
+async def get_user_stats(db, user_id: str) -> Dict[str, Any]:
+    """Counters and recent annotations for a user's dashboard"""
+    counters, recent = await asyncio.gather(
+        db.annotation_counters.find_one({"user_id": user_id}),
+        db.annotations.find({"user_id": user_id}, RECENT_PROJECTION)
+        .sort("updated_at", -1).limit(RECENT_LIMIT).to_list(length=RECENT_LIMIT)
+    )
+    if counters is None:
+        counters, recent = await reconcile_user(db, user_id)
+
+    total = counters.get("total", 0)
+    pass_count = counters.get("pass_count", 0)
+    return {
+        "total_annotations": total,
+        "pass_count": pass_count,
+        "fail_count": counters.get("fail_count", 0),
+        "pass_rate": round(pass_count / total * 100, 2) if total > 0 else 0,
+        "recent_annotations": recent
+    }
+
+async def main() -> None:
+    await connect_to_mongo()
+    try:
+        await reconcile_all(get_database())
+        print(f"Rebuilt annotation counters in {settings.mongodb_db_name}")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
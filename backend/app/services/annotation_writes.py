@@ -0,0 +1,129 @@
+"""
+Annotation writes
+
+An annotation is saved with a single find_one_and_update upsert keyed on
+(trace_id, user_id): `$inc` bumps the version, `$setOnInsert` stamps
+created_at (and an _id) the first time, and the unique index on that
+pair makes concurrent saves of the same annotation collapse into one
+document. Two racing inserts can still both try to insert; the loser gets
+a duplicate key error and is retried, at which point it matches and
+updates.
+
+The upsert returns the document as it was before the write, which tells
+exactly how the user's Pass/Fail counters change (see annotation_stats);
+the saved annotation is that document with the update applied.
+
+Batches send the same upserts in one unordered bulk_write, then read back
+the saved versions with a single query.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.services.annotation_stats import apply_change, counter_change, merge_changes
+from app.services.csv_import import DUPLICATE_KEY_ERROR
+
+def annotation_update(fields: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    """Update document that applies `fields` as the user's annotation of a trace"""
+    return {
+        "$set": {**fields, "updated_at": now},
+        "$inc": {"version": 1},
+        "$setOnInsert": {"_id": ObjectId(), "created_at": now}
+    }
+
+def _saved(query: Dict[str, Any], update: Dict[str, Any], before: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """The annotation as `update` left it, given the document it was applied to"""
+    if before is None:
+        return {**update["$setOnInsert"], **query, **update["$set"], "version": 1}
+    return {**before, **update["$set"], "version": before.get("version", 0) + 1}
+
+async def upsert_annotation(db, user_id: str, fields: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+    """Create or update `user_id`'s annotation of fields["trace_id"]; returns (annotation, created)"""
+    query = {"trace_id": fields["trace_id"], "user_id": user_id}
+    update = annotation_update(fields, datetime.utcnow())
+    try:
+        before = await db.annotations.find_one_and_update(
+            query, update, upsert=True, return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        # A concurrent save inserted it first; this one now updates it
+        before = await db.annotations.find_one_and_update(
+            query, update, upsert=True, return_document=ReturnDocument.BEFORE
+        )
+
+    created = before is None
+    await apply_change(db, user_id, counter_change(
+        created, None if created else before.get("holistic_pass_fail"), fields.get("holistic_pass_fail")
+    ))
+    return _saved(query, update, before), created
+
+async def upsert_annotations(db, user_id: str, items: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Create or update several of `user_id`'s annotations with one bulk_write
+
+    If a trace appears more than once, the last item wins. Returns
+    {trace_id: {"status": "created" | "updated" | "error", "version", "error"}}.
+    """
+    latest = {item["trace_id"]: item for item in items}
+    trace_ids = list(latest)
+    now = datetime.utcnow()
+
+    # Results before the write, for the counter adjustment. A concurrent single save of the
+    # same annotation can slip in between; reconciliation corrects any resulting drift
+    previous = {
+        doc["trace_id"]: doc.get("holistic_pass_fail")
+        for doc in await db.annotations.find(
+            {"user_id": user_id, "trace_id": {"$in": trace_ids}}, {"_id": 0, "trace_id": 1, "holistic_pass_fail": 1}
+        ).to_list(length=None)
+    }
+    operations = [
+        UpdateOne({"trace_id": trace_id, "user_id": user_id}, annotation_update(fields, now), upsert=True)
+        for trace_id, fields in latest.items()
+    ]
+
+    errors: Dict[str, str] = {}
+    retries: List[str] = []
+    try:
+        result = await db.annotations.bulk_write(operations, ordered=False)
+        created = {trace_ids[index] for index in result.upserted_ids}
+    except BulkWriteError as e:
+        created = {trace_ids[upsert["index"]] for upsert in e.details.get("upserted", [])}
+        for error in e.details.get("writeErrors", []):
+            trace_id = trace_ids[error["index"]]
+            if error.get("code") == DUPLICATE_KEY_ERROR:
+                retries.append(trace_id)
+            else:
+                errors[trace_id] = error.get("errmsg", "Write failed")
+
+    # Lost an insert race with a concurrent save; now an update (which adjusts counters itself)
+    for trace_id in retries:
+        try:
+            await upsert_annotation(db, user_id, latest[trace_id])
+        except Exception as e:
+            errors[trace_id] = str(e)
+
+    await apply_change(db, user_id, merge_changes([
+        counter_change(trace_id in created, previous.get(trace_id), latest[trace_id].get("holistic_pass_fail"))
+        for trace_id in trace_ids
+        if trace_id not in errors and trace_id not in retries
+    ]))
+
+    saved = [trace_id for trace_id in trace_ids if trace_id not in errors]
+    versions = {
+        doc["trace_id"]: doc["version"]
+        for doc in await db.annotations.find(
+            {"user_id": user_id, "trace_id": {"$in": saved}}, {"_id": 0, "trace_id": 1, "version": 1}
+        ).to_list(length=None)
+    } if saved else {}
+
+    results = {
+        trace_id: {"status": "created" if trace_id in created else "updated", "version": versions.get(trace_id), "error": None}
+        for trace_id in saved
+    }
+    results.update({
+        trace_id: {"status": "error", "version": None, "error": message} for trace_id, message in errors.items()
+    })
+    return results
@@ -0,0 +1,337 @@
+"""
+Read-through cache
+
+`cache.get_or_load(key, loader, ttl, tags)` returns a cached value or runs
+`loader`, stores what it returns and hands it back. The `@cached`
+decorator wraps an async function the same way. Values are stored as JSON,
+rendered the way responses are, so callers get JSON types back (ObjectId
+ids as strings, for example) whether or not the value came from the cache.
+None is never cached, so "not found" is not remembered.
+
+Invalidation is by tag. Each entry records the version of each of its tags
+when its load started, and `invalidate(tag)` bumps the tag's version. An
+entry whose tags have moved on is a miss, including one stored by a load
+that raced the invalidation, on any process. The check runs inside Redis
+in the same round trip as the read.
+
+Concurrent misses for a key in one process share a single load
+(single-flight) instead of stampeding the database.
+
+Redis is optional. When it is missing or a command fails, the cache falls
+back to a bounded store in process memory and stops trying Redis for
+`cache_redis_retry_seconds`, so an outage costs one timeout rather than one
+per request. Tag invalidations are only seen by the process that makes
+them while in that mode; entries still expire with their TTL.
+"""
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple, Union
+import asyncio
+import functools
+import logging
+import time
+
+import orjson
+
+from app.core.config import settings
+from app.core.metrics import cache_families, registry
+from app.core.responses import dumps
+from app.db.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "cache:"
+TAG_PREFIX = "cache_tag:"
+
+# Return the stored value unless a tag version recorded with it is no longer current
+_GET_IF_CURRENT = """
+local entry = redis.call('hgetall', KEYS[1])
+if #entry == 0 then
+    return nil
+end
+local value
+for i = 1, #entry, 2 do
+    local field = entry[i]
+    if field == 'value' then
+        value = entry[i + 1]
+    elseif (redis.call('get', ARGV[1] .. string.sub(field, 3)) or '0') ~= entry[i + 1] then
+        return nil
+    end
+end
+return value
+"""
+
+# Adjust a cached integer in place, only if it is cached
+_INCREMENT_IF_EXISTS = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return redis.call('hincrby', KEYS[1], 'value', ARGV[1])
+end
+return nil
+"""
+
+# Tags shared by the callers that cache and the paths that change the data
+TRACES_TAG = "traces"  # Every cached trace document and transcript
+ORDINALS_TAG = "ordinals"  # Cached values that include trace ordinals
+
+def trace_tag(trace_id: str) -> str:
+    return f"trace:{trace_id}"
+
+def session_tag(flow_session: str) -> str:
+    return f"session:{flow_session}"
+
+def user_tag(user_id: str) -> str:
+    return f"user:{user_id}"
+
+TagVersions = Dict[str, str]
+
+def _namespace(key: str) -> str:
+    return key.split(":", 1)[0]
+
+class Cache:
+    """Tagged read-through cache in Redis, with a process-memory fallback"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget this process's entries, tag versions and counters"""
+        self._local: "OrderedDict[str, Tuple[float, bytes, TagVersions]]" = OrderedDict()
+        self._local_versions: Counter = Counter()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._redis_retry_at = 0.0
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self.coalesced: Counter = Counter()
+        self.redis_errors = 0
+
+    async def get_or_load(
+        self, key: str, loader: Callable[[], Awaitable[Any]], ttl: int, tags: Iterable[str] = ()
+    ) -> Any:
+        """Return the cached value for `key`, or load, cache and return it"""
+        value, _ = await self.get_or_load_with_result(key, loader, ttl, tags)
+        return value
+
+    async def get_or_load_with_result(
+        self, key: str, loader: Callable[[], Awaitable[Any]], ttl: int, tags: Iterable[str] = ()
+    ) -> Tuple[Any, str]:
+        """
+        Like get_or_load, also returning how the value was obtained: "hit" from
+        the cache, "miss" if this call ran the loader, or "coalesced" if it
+        waited on another call's load
+        """
+        found, value = await self.get(key)
+        if found:
+            self.hits[_namespace(key)] += 1
+            return value, "hit"
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced[_namespace(key)] += 1
+            payload = await asyncio.shield(inflight)
+            return (orjson.loads(payload) if payload is not None else None), "coalesced"
+
+        self.misses[_namespace(key)] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            tags = list(tags)
+            # Versions are read before loading, so an invalidation during the load wins
+            versions = await self._tag_versions(tags)
+            value = await loader()
+            payload = None
+            if value is not None:
+                payload = dumps(value)
+                await self._store(key, payload, ttl, versions)
+            future.set_result(payload)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved; waiters (if any) re-raise it
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+        return (orjson.loads(payload) if payload is not None else None), "miss"
+
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        """Return (found, value) for `key`"""
+        client = self._client()
+        if client:
+            try:
+                payload = await client.eval(_GET_IF_CURRENT, 1, KEY_PREFIX + key, TAG_PREFIX)
+                return (True, orjson.loads(payload)) if payload is not None else (False, None)
+            except Exception as e:
+                self._redis_failed("reading cache", e)
+
+        entry = self._local.get(key)
+        if entry is None:
+            return False, None
+        expires_at, payload, versions = entry
+        if time.monotonic() >= expires_at or any(
+            str(self._local_versions[tag]) != version for tag, version in versions.items()
+        ):
+            del self._local[key]
+            return False, None
+        return True, orjson.loads(payload)
+
+    async def set(self, key: str, value: Any, ttl: int, tags: Iterable[str] = ()) -> None:
+        """Store `value` under `key` for `ttl` seconds"""
+        await self._store(key, dumps(value), ttl, await self._tag_versions(list(tags)))
+
+    async def increment(self, key: str, amount: int) -> None:
+        """Add `amount` to a cached integer; a value that is not cached stays uncached"""
+        if not amount:
+            return
+        client = self._client()
+        if client:
+            try:
+                await client.eval(_INCREMENT_IF_EXISTS, 1, KEY_PREFIX + key, amount)
+                return
+            except Exception as e:
+                # A stale Redis copy is corrected when its TTL expires
+                self._redis_failed("updating cache", e)
+
+        entry = self._local.get(key)
+        if entry is not None:
+            expires_at, payload, versions = entry
+            self._local[key] = (expires_at, orjson.dumps(orjson.loads(payload) + amount), versions)
+
+    async def delete(self, *keys: str) -> None:
+        """Drop entries by key"""
+        if not keys:
+            return
+        for key in keys:
+            self._local.pop(key, None)
+        client = self._client()
+        if client:
+            try:
+                await client.delete(*(KEY_PREFIX + key for key in keys))
+            except Exception as e:
+                self._redis_failed("deleting from cache", e)
+
+    async def invalidate(self, *tags: str) -> None:
+        """Make every entry carrying one of `tags` stale, in every process sharing Redis"""
+        tags = set(tags)
+        if not tags:
+            return
+        for tag in tags:
+            self._local_versions[tag] += 1
+        client = self._client()
+        if client:
+            try:
+                async with client.pipeline(transaction=False) as pipe:
+                    for tag in tags:
+                        pipe.incr(TAG_PREFIX + tag)
+                    await pipe.execute()
+            except Exception as e:
+                self._redis_failed("invalidating cache tags", e)
+
+    async def tag_version(self, tag: str) -> str:
+        """Current version of `tag`; it changes whenever the tag is invalidated"""
+        return (await self._tag_versions([tag]))[tag]
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters per key namespace for this process since it started"""
+        namespaces = {}
+        for namespace in sorted(set(self.hits) | set(self.misses) | set(self.coalesced)):
+            lookups = self.hits[namespace] + self.misses[namespace] + self.coalesced[namespace]
+            namespaces[namespace] = {
+                "hits": self.hits[namespace],
+                "misses": self.misses[namespace],
+                "coalesced": self.coalesced[namespace],
+                "hit_ratio": round((lookups - self.misses[namespace]) / lookups, 4) if lookups else None,
+            }
+        return {
+            "namespaces": namespaces,
+            "redis_available": self._client() is not None,
+            "redis_errors": self.redis_errors,
+            "local_entries": len(self._local),
+        }
+
+    def _client(self):
+        client = get_redis()
+        if client is None or time.monotonic() < self._redis_retry_at:
+            return None
+        return client
+
+    def _redis_failed(self, action: str, error: Exception) -> None:
+        self.redis_errors += 1
+        self._redis_retry_at = time.monotonic() + settings.cache_redis_retry_seconds
+        logger.warning(
+            f"Redis unavailable {action}, using process memory for {settings.cache_redis_retry_seconds}s: {error}"
+        )
+
+    async def _tag_versions(self, tags: list) -> TagVersions:
+        if not tags:
+            return {}
+        client = self._client()
+        if client:
+            try:
+                versions = await client.mget(*(TAG_PREFIX + tag for tag in tags))
+                return {tag: version or "0" for tag, version in zip(tags, versions)}
+            except Exception as e:
+                self._redis_failed("reading cache tags", e)
+        return {tag: str(self._local_versions[tag]) for tag in tags}
+
+    async def _store(self, key: str, payload: bytes, ttl: int, versions: TagVersions) -> None:
+        client = self._client()
+        if client:
+            try:
+                async with client.pipeline(transaction=True) as pipe:
+                    # Replace, so tags of an earlier entry under this key do not linger
+                    pipe.delete(KEY_PREFIX + key)
+                    pipe.hset(KEY_PREFIX + key, mapping={
+                        "value": payload, **{f"t:{tag}": version for tag, version in versions.items()}
+                    })
+                    pipe.expire(KEY_PREFIX + key, ttl)
+                    await pipe.execute()
+                return
+            except Exception as e:
+                self._redis_failed("writing cache", e)
+
+        # Local entries are versioned by this process's own invalidations
+        local_versions = {tag: str(self._local_versions[tag]) for tag in versions}
+        self._local[key] = (time.monotonic() + ttl, payload, local_versions)
+        self._local.move_to_end(key)
+        while len(self._local) > settings.cache_local_max_entries:
+            self._local.popitem(last=False)
+
+cache = Cache()
+
+@registry.collector
+def _collect():
+    families = [("cache_redis_errors_total", "counter", "Redis failures in the read-through cache",
+                 [({}, cache.redis_errors)])]
+    for namespace in set(cache.hits) | set(cache.misses) | set(cache.coalesced):
+        families += cache_families(
+            namespace,
+            {"hit": cache.hits[namespace], "miss": cache.misses[namespace], "coalesced": cache.coalesced[namespace]},
+            cache.hits[namespace] + cache.coalesced[namespace]
+        )
+    return families
+
+def cached(
+    key: Callable[..., str],
+    ttl: Union[int, Callable[[], int]],
+    tags: Optional[Callable[..., Iterable[str]]] = None,
+):
+    """
+    Cache an async function's results through `cache`
+
+    `key` and `tags` are called with the function's arguments; `ttl` is
+    seconds, or a callable returning seconds so settings are read per call.
+    The undecorated function stays available as `.uncached`.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await cache.get_or_load(
+                key(*args, **kwargs),
+                lambda: fn(*args, **kwargs),
+                ttl() if callable(ttl) else ttl,
+                tags(*args, **kwargs) if tags else ()
+            )
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
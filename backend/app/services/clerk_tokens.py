@@ -0,0 +1,160 @@
+"""
+Clerk session token verification
+
+Clerk session tokens are RS256 JWTs signed with the instance's keys, which
+Clerk publishes as a JWKS at {CLERK_FRONTEND_API_URL}/.well-known/jwks.json.
+Tokens are verified locally against that key set rather than by calling
+Clerk's API on every request:
+
+- the JWKS is fetched through the shared HTTP client and kept for
+  `clerk_jwks_ttl_seconds`. A token signed with a key id not in the set
+  triggers a refetch, at most once per `clerk_jwks_min_refresh_seconds`,
+  which is how key rotation is picked up. If a refetch fails, the cached
+  keys stay in use.
+- verified claims are kept in a bounded LRU keyed by the token's SHA-256,
+  until the token expires or `token_cache_ttl_seconds` passes, whichever
+  comes first, so a session's repeated requests skip the signature check.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import time
+
+from jose import JWTError, jwt
+
+from app.core.config import settings
+from app.core.http_client import get_http_client
+from app.core.metrics import cache_families, registry
+
+logger = logging.getLogger(__name__)
+
+ALGORITHMS = ["RS256"]
+
+Claims = Dict[str, Any]
+
+class InvalidTokenError(ValueError):
+    """Raised when a session token fails verification"""
+
+def jwks_url() -> Optional[str]:
+    """Where Clerk publishes the instance's signing keys, or None if Clerk is not configured"""
+    if settings.clerk_jwks_url:
+        return settings.clerk_jwks_url
+    if settings.clerk_frontend_api_url:
+        return f"{settings.clerk_frontend_api_url.rstrip('/')}/.well-known/jwks.json"
+    return None
+
+def _issuer() -> Optional[str]:
+    # Clerk issues session tokens from the frontend API URL
+    return settings.clerk_frontend_api_url.rstrip("/") if settings.clerk_frontend_api_url else None
+
+class JWKSCache:
+    """Clerk's signing keys by key id, refetched on expiry or on an unknown key id"""
+
+    def __init__(self):
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._fetched_at: Optional[float] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self.fetches = 0
+
+    async def key(self, kid: Optional[str]) -> Dict[str, Any]:
+        """Return the JWK for `kid`"""
+        fetched_at = self._fetched_at
+        age = time.monotonic() - fetched_at if fetched_at is not None else None
+        if age is None or age >= settings.clerk_jwks_ttl_seconds or (
+            kid not in self._keys and age >= settings.clerk_jwks_min_refresh_seconds
+        ):
+            await self._refresh(fetched_at)
+
+        key = self._keys.get(kid)
+        if key is None:
+            raise InvalidTokenError(f"Unknown signing key '{kid}'")
+        return key
+
+    async def _refresh(self, seen: Optional[float]) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._fetched_at != seen:
+                # Another request refreshed while this one waited
+                return
+            url = jwks_url()
+            try:
+                self.fetches += 1
+                response = await get_http_client().get(url)
+                response.raise_for_status()
+                keys = {key["kid"]: key for key in response.json().get("keys", []) if "kid" in key}
+            except Exception as e:
+                if not self._keys:
+                    raise InvalidTokenError(f"Could not fetch signing keys: {e}")
+                logger.warning(f"Could not refresh Clerk JWKS, keeping cached keys: {e}")
+                keys = self._keys
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+
+class TokenVerifier:
+    """Local session token verification with a per-process cache of verified claims"""
+
+    def __init__(self, jwks: JWKSCache):
+        self.jwks = jwks
+        self._claims: "OrderedDict[str, Tuple[float, Claims]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def verify(self, token: str) -> Claims:
+        """Return the claims of a valid token; raises InvalidTokenError otherwise"""
+        digest = hashlib.sha256(token.encode()).hexdigest()
+        entry = self._claims.get(digest)
+        if entry is not None:
+            expires_at, claims = entry
+            if time.time() < expires_at:
+                self._claims.move_to_end(digest)
+                self.hits += 1
+                return claims
+            del self._claims[digest]
+
+        self.misses += 1
+        claims = await self._decode(token)
+        self._claims[digest] = (min(claims["exp"], time.time() + settings.token_cache_ttl_seconds), claims)
+        while len(self._claims) > settings.token_cache_size:
+            self._claims.popitem(last=False)
+        return claims
+
+    async def _decode(self, token: str) -> Claims:
+        try:
+            header = jwt.get_unverified_header(token)
+        except JWTError as e:
+            raise InvalidTokenError(f"Malformed token: {e}")
+        if header.get("alg") not in ALGORITHMS:
+            raise InvalidTokenError(f"Unexpected signing algorithm '{header.get('alg')}'")
+
+        key = await self.jwks.key(header.get("kid"))
+        try:
+            claims = jwt.decode(
+                token, key, algorithms=ALGORITHMS, issuer=_issuer(),
+                options={"verify_aud": False, "leeway": settings.token_leeway_seconds}
+            )
+        except JWTError as e:
+            raise InvalidTokenError(str(e))
+
+        if "exp" not in claims or "sub" not in claims:
+            raise InvalidTokenError("Token is missing exp or sub")
+        if settings.clerk_authorized_parties and claims.get("azp") not in settings.clerk_authorized_parties:
+            raise InvalidTokenError(f"Token issued for unexpected party '{claims.get('azp')}'")
+        return claims
+
+    def clear(self) -> None:
+        self._claims.clear()
+
+token_verifier = TokenVerifier(JWKSCache())
+
+@registry.collector
+def _collect():
+    families = cache_families(
+        "verified_tokens", {"hit": token_verifier.hits, "miss": token_verifier.misses}, token_verifier.hits
+    )
+    families.append(
+        ("clerk_jwks_fetches_total", "counter", "Fetches of Clerk's signing keys", [({}, token_verifier.jwks.fetches)])
+    )
+    return families
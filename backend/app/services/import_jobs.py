@@ -0,0 +1,326 @@
+"""
+Background CSV import jobs
+
+`import-csv` saves the upload to a temp file and returns a job id straight
+away. The CSV is parsed and normalized in a worker process, which hands
+batches back over a bounded queue, and the event loop bulk-inserts them
+while recording progress in the job store. Nothing CPU-bound runs on the
+event loop, so other requests stay responsive during large imports.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from datetime import datetime, timedelta
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import time
+import uuid
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.db.mongodb import get_database
+from app.db.redis import get_redis
+from app.services.csv_import import CSVImportError, build_trace_documents, insert_traces, iter_csv_chunks
+from app.services.session_cache import session_transcripts
+from app.services.trace_ordinals import mark_ordinals_stale, schedule_rebalance
+from app.services.trace_totals import trace_totals
+from app.services.unannotated import rewind_frontiers
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY_PREFIX = "import_job:"
+
+# Parsed batches held in memory per job before the parser waits for inserts
+MAX_PENDING_BATCHES = 2
+
+# How often a waiting job checks whether its parser process died
+PARSER_POLL_SECONDS = 1.0
+
+IMPORT_ROWS = registry.counter("import_rows_total", "CSV rows processed by imports, by outcome")
+IMPORTS = registry.counter("imports_total", "Imports finished, by status")
+IMPORT_BATCH_SECONDS = registry.histogram("import_batch_insert_seconds", "Time to store one parsed batch")
+IMPORT_SECONDS = registry.histogram(
+    "import_duration_seconds", "Time from an import starting to run until it finishes",
+    buckets=(1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+)
+
+class ImportJobStore:
+    """
+    Job state stored as JSON in Redis with a TTL
+
+    Every save is mirrored into an in-process dict (pruned to the same TTL),
+    which reads fall back to when Redis is unavailable, so a job run by this
+    worker keeps reporting progress through a Redis outage or a failed read.
+    """
+
+    def __init__(self):
+        self._memory: Dict[str, Dict[str, Any]] = {}
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        job["updated_at"] = datetime.utcnow().isoformat()
+        self._prune_memory()
+        self._memory[job["job_id"]] = dict(job)
+
+        client = get_redis()
+        if client:
+            try:
+                await client.set(
+                    JOB_KEY_PREFIX + job["job_id"],
+                    json.dumps(job),
+                    ex=settings.import_job_ttl_seconds
+                )
+            except Exception as e:
+                logger.warning(f"Redis unavailable for import job {job['job_id']}, using memory: {e}")
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        client = get_redis()
+        if client:
+            try:
+                data = await client.get(JOB_KEY_PREFIX + job_id)
+                if data:
+                    return json.loads(data)
+            except Exception as e:
+                logger.warning(f"Redis unavailable reading import job {job_id}: {e}")
+
+        job = self._memory.get(job_id)
+        return dict(job) if job else None
+
+    def _prune_memory(self) -> None:
+        """Drop in-memory jobs older than the Redis TTL"""
+        cutoff = (datetime.utcnow() - timedelta(seconds=settings.import_job_ttl_seconds)).isoformat()
+        for job_id in [k for k, job in self._memory.items() if job["updated_at"] < cutoff]:
+            del self._memory[job_id]
+
+job_store = ImportJobStore()
+
+# The API process has live threads (motor's executor, the queue manager's connection),
+# and a forked child could inherit a lock one of them held, e.g. logging's, and hang
+# on it. Parser processes start from a clean forkserver instead.
+_mp_context = multiprocessing.get_context("forkserver")
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_queue_manager = None
+_import_slots: Optional[asyncio.Semaphore] = None
+_running_jobs: Set[asyncio.Task] = set()
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=settings.import_max_workers, mp_context=_mp_context)
+    return _process_pool
+
+def _get_import_slots() -> asyncio.Semaphore:
+    """Bounds how many imports run at once; the rest wait as queued"""
+    global _import_slots
+    if _import_slots is None:
+        _import_slots = asyncio.Semaphore(settings.import_max_concurrent)
+    return _import_slots
+
+def _get_queue_manager():
+    global _queue_manager
+    if _queue_manager is None:
+        _queue_manager = _mp_context.Manager()
+    return _queue_manager
+
+def shutdown_import_workers() -> None:
+    """Stop the parser process pool and queue manager (called on app shutdown)"""
+    global _process_pool, _queue_manager, _import_slots
+    for task in list(_running_jobs):
+        task.cancel()
+    _import_slots = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+    if _queue_manager is not None:
+        _queue_manager.shutdown()
+        _queue_manager = None
+
+def parse_csv_file(path: str, chunk_size: int, imported_by: Optional[str], batches, cancelled) -> None:
+    """
+    Parse a CSV into trace documents inside a worker process
+
+    Each chunk is put on `batches` as ("batch", traces); the stream ends with
+    ("done", None) or ("error", message). The queue is bounded, so the parser
+    blocks while the event loop catches up on inserts, and gives up once
+    `cancelled` is set.
+    """
+    def put(message) -> bool:
+        while not cancelled.is_set():
+            try:
+                batches.put(message, timeout=PARSER_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        imported_at = datetime.utcnow()
+        with open(path, "rb") as f:
+            for chunk in iter_csv_chunks(f, chunk_size):
+                if not put(("batch", build_trace_documents(chunk, imported_by, imported_at))):
+                    return
+        put(("done", None))
+    except CSVImportError as e:
+        put(("error", str(e)))
+    except Exception as e:
+        put(("error", f"CSV parser failed: {str(e)}"))
+
+async def _next_message(batches, parser: asyncio.Future):
+    """Wait for the parser's next message without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            return await loop.run_in_executor(None, batches.get, True, PARSER_POLL_SECONDS)
+        except queue.Empty:
+            if parser.done():
+                # Surfaces the worker's exception if the process died
+                parser.result()
+                raise RuntimeError("CSV parser exited without finishing")
+
+async def spool_upload(fileobj) -> str:
+    """Copy an upload to a temp file that outlives the request; returns its path"""
+    def copy() -> str:
+        fileobj.seek(0)
+        with tempfile.NamedTemporaryFile(prefix="import-", suffix=".csv", delete=False) as tmp:
+            shutil.copyfileobj(fileobj, tmp, length=1024 * 1024)
+            return tmp.name
+
+    return await asyncio.to_thread(copy)
+
+def remove_upload(path: str) -> None:
+    """Delete a spooled upload, ignoring files that are already gone"""
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+def new_import_job(filename: str) -> Dict[str, Any]:
+    """Build the initial state for an import job"""
+    return {
+        "job_id": uuid.uuid4().hex,
+        "status": "queued",
+        "filename": filename,
+        "rows_parsed": 0,
+        "inserted": 0,
+        "skipped": 0,
+        "failed": 0,
+        "error": None,
+        "created_at": datetime.utcnow().isoformat(),
+        "finished_at": None
+    }
+
+async def create_import_job(path: str, filename: str, imported_by: Optional[str]) -> Dict[str, Any]:
+    """Register a job for an uploaded file and start it in the background"""
+    job = new_import_job(filename)
+    await job_store.save(job)
+
+    task = asyncio.create_task(run_import_job(job, path, imported_by))
+    _running_jobs.add(task)
+    task.add_done_callback(_running_jobs.discard)
+
+    return job
+
+async def import_file(
+    job: Dict[str, Any],
+    path: str,
+    imported_by: Optional[str],
+    on_progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+) -> None:
+    """
+    Import a CSV file, updating the counters on `job` as batches are stored
+
+    Waits for a free import slot, parses in the process pool and inserts on
+    the event loop. Raises CSVImportError for malformed files.
+    """
+    async with _get_import_slots():
+        job["status"] = "running"
+        if on_progress:
+            await on_progress(job)
+
+        manager = _get_queue_manager()
+        batches = manager.Queue(maxsize=MAX_PENDING_BATCHES)
+        cancelled = manager.Event()
+        parser = asyncio.get_running_loop().run_in_executor(
+            _get_process_pool(), parse_csv_file, path, settings.import_chunk_size, imported_by, batches, cancelled
+        )
+        db = get_database()
+        traces_collection = db.traces
+        started = time.perf_counter()
+        status = "failed"
+
+        try:
+            while True:
+                kind, payload = await _next_message(batches, parser)
+                if kind == "done":
+                    break
+                if kind == "error":
+                    raise CSVImportError(payload)
+
+                job["rows_parsed"] += len(payload)
+                batch_started = time.perf_counter()
+                # Readers stop trusting ordinals before new traces can be seen without one
+                await mark_ordinals_stale(db)
+                inserted, skipped, failed = await insert_traces(traces_collection, payload)
+                IMPORT_BATCH_SECONDS.observe(time.perf_counter() - batch_started)
+                IMPORT_ROWS.inc(len(payload), outcome="parsed")
+                IMPORT_ROWS.inc(inserted, outcome="inserted")
+                IMPORT_ROWS.inc(skipped, outcome="skipped")
+                IMPORT_ROWS.inc(failed, outcome="failed")
+                await trace_totals.increment(inserted)
+                if inserted:
+                    # A rebalance that ran during the insert may have missed some of the batch
+                    await mark_ordinals_stale(db)
+                    await session_transcripts.invalidate(trace["flow_session"] for trace in payload)
+                    # New traces may sort before annotators' frontiers
+                    await rewind_frontiers(db, payload)
+                job["inserted"] += inserted
+                job["skipped"] += skipped
+                job["failed"] += failed
+                if on_progress:
+                    await on_progress(job)
+
+            await parser
+            status = "completed"
+        finally:
+            IMPORTS.inc(status=status)
+            IMPORT_SECONDS.observe(time.perf_counter() - started)
+            # Stop the parser if we bailed out while it was still producing batches
+            try:
+                cancelled.set()
+            except Exception:
+                pass
+            # Inserted traces shift the positions of those after them
+            if job["inserted"]:
+                schedule_rebalance(db)
+
+async def run_import_job(job: Dict[str, Any], path: str, imported_by: Optional[str]) -> None:
+    """Run a background import, recording its outcome in the job store"""
+    try:
+        await import_file(job, path, imported_by, on_progress=job_store.save)
+        job["status"] = "completed"
+        logger.info(
+            f"Import job {job['job_id']} completed: {job['inserted']} inserted, "
+            f"{job['skipped']} skipped, {job['failed']} failed"
+        )
+
+    except asyncio.CancelledError:
+        # Shutdown cancels running jobs; record it so pollers stop waiting
+        logger.warning(f"Import job {job['job_id']} interrupted")
+        job["status"] = "failed"
+        job["error"] = "interrupted"
+        raise
+
+    except Exception as e:
+        logger.error(f"Import job {job['job_id']} failed: {e}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+
+    finally:
+        job["finished_at"] = datetime.utcnow().isoformat()
+        await job_store.save(job)
+        remove_upload(path)
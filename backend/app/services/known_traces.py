@@ -0,0 +1,74 @@
+"""
+Known trace ids
+
+Saving an annotation must check that its trace exists. Each process
+remembers ids it has seen exist (in a bounded LRU) and only reads MongoDB
+for ids it has not met. Opening a trace records its id, so annotating the
+trace on screen costs no read. Only existence is cached: an unknown id is
+always checked, so traces imported later are found.
+
+Traces are only deleted all at once (clear_db.py), which invalidates the
+cache's TRACES_TAG. The set is versioned by that tag: at most every
+`known_traces_recheck_seconds`, a lookup reads the tag's version and
+forgets every id if it changed. Without Redis, other processes' clears
+are not seen.
+"""
+from collections import OrderedDict
+from typing import Iterable, Optional, Set
+import time
+
+from app.core.config import settings
+from app.services.cache import TRACES_TAG, cache
+
+class KnownTraces:
+    """Bounded LRU set of trace ids known to exist"""
+
+    def __init__(self):
+        self._ids: "OrderedDict[str, None]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._checked_at = float("-inf")
+
+    def add(self, trace_id: str) -> None:
+        self._ids[trace_id] = None
+        self._ids.move_to_end(trace_id)
+        while len(self._ids) > settings.known_traces_cache_size:
+            self._ids.popitem(last=False)
+
+    async def exists(self, db, trace_id: str) -> bool:
+        """True if the trace exists, reading MongoDB only for unseen ids"""
+        await self._check_version()
+        if trace_id in self._ids:
+            self._ids.move_to_end(trace_id)
+            return True
+
+        if await db.traces.find_one({"trace_id": trace_id}, {"_id": 1}) is None:
+            return False
+        self.add(trace_id)
+        return True
+
+    async def existing(self, db, trace_ids: Iterable[str]) -> Set[str]:
+        """Return which of `trace_ids` exist, with one read for all unseen ids"""
+        await self._check_version()
+        trace_ids = set(trace_ids)
+        unseen = [trace_id for trace_id in trace_ids if trace_id not in self._ids]
+        if unseen:
+            found = await db.traces.find({"trace_id": {"$in": unseen}}, {"_id": 0, "trace_id": 1}).to_list(length=None)
+            for trace in found:
+                self.add(trace["trace_id"])
+        return {trace_id for trace_id in trace_ids if trace_id in self._ids}
+
+    def clear(self) -> None:
+        self._ids.clear()
+
+    async def _check_version(self) -> None:
+        """Forget every id if traces were cleared since the last check"""
+        now = time.monotonic()
+        if now - self._checked_at < settings.known_traces_recheck_seconds:
+            return
+        self._checked_at = now
+        version = await cache.tag_version(TRACES_TAG)
+        if self._version is not None and version != self._version:
+            self.clear()
+        self._version = version
+
+known_traces = KnownTraces()
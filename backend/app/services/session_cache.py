@@ -0,0 +1,132 @@
+"""
+Session transcript cache
+
+Opening a trace shows every earlier turn of its flow_session as context.
+Rather than query those turns for each trace, the session's whole
+transcript (turn_number, user_message, ai_response per turn) is loaded
+once and each trace's context is a slice of it.
+
+Transcripts live in an in-process LRU in front of the read-through cache
+(app/services/cache.py), which shares them through Redis with other
+workers and restarts. Imports invalidate the session tags of the sessions
+they add turns to; other processes' LRU entries expire after a short TTL,
+which bounds how long they can miss those turns.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from bisect import bisect_left
+import time
+
+from app.core.config import settings
+from app.core.metrics import cache_families, registry
+from app.services.cache import TRACES_TAG, cache, session_tag
+
+TRANSCRIPT_PROJECTION = {"_id": 0, "turn_number": 1, "user_message": 1, "ai_response": 1}
+
+Transcript = List[Dict[str, Any]]
+
+class SessionTranscriptCache:
+    """Per-session transcripts in a process LRU over the shared cache"""
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, Tuple[float, Transcript]]" = OrderedDict()
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    async def get(self, db, flow_session: str) -> Transcript:
+        """Return every turn of `flow_session` in turn order"""
+        transcript = self._get_local(flow_session)
+        if transcript is not None:
+            self.memory_hits += 1
+            return transcript
+
+        invalidations = self.invalidations
+
+        async def load() -> Transcript:
+            return await db.traces.find(
+                {"flow_session": flow_session}, TRANSCRIPT_PROJECTION
+            ).sort("turn_number", 1).to_list(length=None)
+
+        transcript, result = await cache.get_or_load_with_result(
+            f"session:{flow_session}", load, settings.session_cache_ttl_seconds,
+            [session_tag(flow_session), TRACES_TAG]
+        )
+        # Requests that waited on another request's load were not served from a cache
+        if result == "hit":
+            self.redis_hits += 1
+        elif result == "coalesced":
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        # An import invalidating sessions meanwhile may have added turns this read missed
+        if self.invalidations == invalidations:
+            self._put_local(flow_session, transcript)
+        return transcript
+
+    async def context(self, db, flow_session: str, turn_number: int) -> Transcript:
+        """Return the turns of `flow_session` before `turn_number`"""
+        transcript = await self.get(db, flow_session)
+        return transcript[:bisect_left(transcript, turn_number, key=lambda turn: turn["turn_number"])]
+
+    async def invalidate(self, flow_sessions: Iterable[str]) -> None:
+        """Drop cached transcripts for sessions whose turns changed"""
+        keys = set(flow_sessions)
+        if not keys:
+            return
+
+        self.invalidations += len(keys)
+        for flow_session in keys:
+            self._entries.pop(flow_session, None)
+
+        await cache.invalidate(*(session_tag(flow_session) for flow_session in keys))
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process since it started"""
+        hits = self.memory_hits + self.redis_hits
+        lookups = hits + self.misses + self.coalesced
+        return {
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            "invalidations": self.invalidations,
+            "sessions_cached": len(self._entries),
+        }
+
+    def _get_local(self, flow_session: str) -> Optional[Transcript]:
+        entry = self._entries.get(flow_session)
+        if entry is None:
+            return None
+        expires_at, transcript = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[flow_session]
+            return None
+        self._entries.move_to_end(flow_session)
+        return transcript
+
+    def _put_local(self, flow_session: str, transcript: Transcript) -> None:
+        self._entries[flow_session] = (time.monotonic() + settings.session_cache_local_ttl_seconds, transcript)
+        self._entries.move_to_end(flow_session)
+        while len(self._entries) > settings.session_cache_size:
+            self._entries.popitem(last=False)
+
+session_transcripts = SessionTranscriptCache()
+
+@registry.collector
+def _collect():
+    stats = session_transcripts.stats()
+    return cache_families(
+        "session_transcripts",
+        {
+            "memory_hit": stats["memory_hits"], "redis_hit": stats["redis_hits"],
+            "miss": stats["misses"], "coalesced": stats["coalesced"]
+        },
+        stats["memory_hits"] + stats["redis_hits"]
+    )
@@ -0,0 +1,74 @@
+"""
+Trace ordering helpers
+
+Every trace view walks the same order: newest sessions first, turns within
+a session in order, with trace_id as a tiebreaker so the order is total.
+These helpers build the sort spec, range predicates on that key, and the
+opaque cursors used for keyset pagination.
+"""
+from typing import Any, Dict, List, Tuple
+import base64
+import binascii
+import json
+
+# Sort order shared by list, navigation and "next unannotated"
+TRACE_SORT = [
+    ("flow_session", -1),  # Newest sessions first
+    ("turn_number", 1),    # But turns within session in order (1, 2, 3...)
+    ("trace_id", 1)        # Tiebreaker so the order is total
+]
+
+# The same order walked backwards, for "previous" seeks
+REVERSE_TRACE_SORT = [(field, -direction) for field, direction in TRACE_SORT]
+
+TraceKey = Tuple[str, int, str]
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+def trace_key(trace: Dict[str, Any]) -> TraceKey:
+    """Return the (flow_session, turn_number, trace_id) sort key of a trace"""
+    return trace["flow_session"], trace["turn_number"], trace["trace_id"]
+
+def first_key(traces: List[Dict[str, Any]]) -> TraceKey:
+    """Return the sort key of whichever trace comes first in TRACE_SORT order"""
+    top_session = max(trace["flow_session"] for trace in traces)
+    first = min(
+        (trace for trace in traces if trace["flow_session"] == top_session),
+        key=lambda trace: (trace["turn_number"], trace["trace_id"])
+    )
+    return trace_key(first)
+
+def after_key(key: TraceKey, inclusive: bool = False) -> Dict[str, Any]:
+    """Filter matching traces that come after `key` (or at it, if inclusive) in TRACE_SORT order"""
+    flow_session, turn_number, trace_id = key
+    return {"$or": [
+        {"flow_session": {"$lt": flow_session}},
+        {"flow_session": flow_session, "turn_number": {"$gt": turn_number}},
+        {"flow_session": flow_session, "turn_number": turn_number, "trace_id": {"$gte" if inclusive else "$gt": trace_id}}
+    ]}
+
+def before_key(key: TraceKey) -> Dict[str, Any]:
+    """Filter matching traces that come before `key` in TRACE_SORT order"""
+    flow_session, turn_number, trace_id = key
+    return {"$or": [
+        {"flow_session": {"$gt": flow_session}},
+        {"flow_session": flow_session, "turn_number": {"$lt": turn_number}},
+        {"flow_session": flow_session, "turn_number": turn_number, "trace_id": {"$lt": trace_id}}
+    ]}
+
+def encode_cursor(key: TraceKey) -> str:
+    """Encode a sort key as an opaque, URL-safe cursor"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> TraceKey:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        flow_session, turn_number, trace_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {str(e)}")
+
+    if not isinstance(flow_session, str) or not isinstance(turn_number, int) or not isinstance(trace_id, str):
+        raise InvalidCursorError("Invalid cursor: unexpected key types")
+    return flow_session, turn_number, trace_id
@@ -0,0 +1,184 @@
+"""
+Materialized trace ordinals
+
+Each trace carries `ordinal`, its 1-based position counted from the end
+of TRACE_SORT order (the oldest session's last turn is 1). With N traces
+numbered, a trace's list position is `N - ordinal + 1`, navigation is
+`ordinal ∓ 1`, "trace N of M" is a point read and jumping to page K is a
+range scan down the ordinal index rather than a skip.
+
+Exports usually add newer sessions, which sort first in the list. Counting
+from the oldest end gives them fresh high ordinals, so a rebalance after
+such an import writes only the new traces and existing ordinals (and
+cached trace documents) stay valid. Only traces inserted among existing
+ones, e.g. an older session imported late, shift the ordinals above them.
+
+Ordinals are renumbered (rebalanced) inside MongoDB once an import
+finishes. A generation counter in `trace_meta` records whether they are
+current: every insert batch bumps `generation`, and a rebalance records
+the generation it numbered as `ordered_generation`, along with the
+highest ordinal as `max_ordinal`, unless another batch landed while it
+ran. While the two differ, readers fall back to seeking on the sort key.
+A lease document in `trace_meta` lets one worker rebalance at a time;
+the others wait for it, then find the ordinals current or renumber again.
+"""
+from typing import Any, Dict, List, Optional, Set, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import uuid
+
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.services.cache import ORDINALS_TAG, cache
+from app.services.trace_order import REVERSE_TRACE_SORT, after_key, before_key, trace_key
+
+logger = logging.getLogger(__name__)
+
+META_ID = "ordinals"
+# Held by the worker renumbering, so workers' rebalances do not interleave their writes
+LEASE_ID = "ordinals_lease"
+LEASE_POLL_SECONDS = 1.0
+# Bumped when the numbering changes, so stored ordinals are renumbered at startup
+ORDINAL_SCHEME = 2
+
+_rebalance_lock: Optional[asyncio.Lock] = None
+_background_tasks: Set[asyncio.Task] = set()
+
+def rebalance_pipeline() -> List[Dict[str, Any]]:
+    """Aggregation renumbering every trace whose ordinal no longer matches its position from the oldest end"""
+    return [
+        # Only the sort key reaches the window stage, not the raw CSV row, so its sort stays small
+        {"$project": {"_id": 1, "ordinal": 1, **{field: 1 for field, _ in REVERSE_TRACE_SORT}}},
+        {"$setWindowFields": {
+            "sortBy": {field: direction for field, direction in REVERSE_TRACE_SORT},
+            "output": {"position": {"$documentNumber": {}}}
+        }},
+        # Newer sessions are numbered above existing traces, so only they are written
+        {"$match": {"$expr": {"$ne": ["$ordinal", "$position"]}}},
+        {"$project": {"_id": 1, "ordinal": "$position"}},
+        {"$merge": {"into": "traces", "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+    ]
+
+def _get_rebalance_lock() -> asyncio.Lock:
+    global _rebalance_lock
+    if _rebalance_lock is None:
+        _rebalance_lock = asyncio.Lock()
+    return _rebalance_lock
+
+def _is_current(meta: Optional[Dict[str, Any]]) -> bool:
+    return bool(meta) and meta.get("scheme") == ORDINAL_SCHEME and \
+        meta.get("ordered_generation") == meta.get("generation", 0)
+
+async def ordinal_total(db) -> Optional[int]:
+    """The highest ordinal if every trace's ordinal is current, else None"""
+    meta = await db.trace_meta.find_one({"_id": META_ID})
+    return meta.get("max_ordinal", 0) if _is_current(meta) else None
+
+async def ordinals_current(db) -> bool:
+    """True if every trace's ordinal matches its position"""
+    return await ordinal_total(db) is not None
+
+def position_of(ordinal: int, total: int) -> int:
+    """1-based list position of the trace numbered `ordinal` when `total` traces are numbered"""
+    return total - ordinal + 1
+
+async def find_position(db, trace: Dict[str, Any]) -> Tuple[int, Optional[int]]:
+    """
+    Return the 1-based position of `trace` and the number of traces it is
+    counted among. While ordinals are stale, earlier traces are counted and
+    the total is None; the caller supplies one.
+    """
+    if trace.get("ordinal"):
+        total = await ordinal_total(db)
+        if total is not None:
+            return position_of(trace["ordinal"], total), total
+    return await db.traces.count_documents(before_key(trace_key(trace))) + 1, None
+
+async def mark_ordinals_stale(db) -> None:
+    """Record that traces were inserted since the last rebalance"""
+    await db.trace_meta.update_one({"_id": META_ID}, {"$inc": {"generation": 1}}, upsert=True)
+
+async def rebalance_ordinals(db) -> bool:
+    """Renumber ordinals if traces were inserted since the last rebalance; returns whether it ran"""
+    async with _get_rebalance_lock():
+        owner = uuid.uuid4().hex
+        while not await _acquire_lease(db, owner):
+            # Another worker is renumbering; once it is done, this one checks whether it still needs to
+            await asyncio.sleep(LEASE_POLL_SECONDS)
+        try:
+            return await _rebalance(db)
+        finally:
+            await db.trace_meta.delete_one({"_id": LEASE_ID, "owner": owner})
+
+async def _acquire_lease(db, owner: str) -> bool:
+    """Take the cross-worker rebalance lease if it is free or has expired"""
+    now = datetime.utcnow()
+    try:
+        # Matches a free or expired lease; a held one makes the upsert collide on _id
+        await db.trace_meta.update_one(
+            {"_id": LEASE_ID, "expires_at": {"$lte": now}},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=settings.ordinal_rebalance_lease_seconds)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+async def _rebalance(db) -> bool:
+    meta = await db.trace_meta.find_one({"_id": META_ID})
+    if _is_current(meta):
+        return False
+    generation = meta.get("generation", 0) if meta else 0
+
+    started = datetime.utcnow()
+    renumbers_existing = (meta or {}).get("scheme") != ORDINAL_SCHEME or await _inserted_among_numbered(db)
+    await db.traces.aggregate(rebalance_pipeline()).to_list(length=None)
+    highest = await db.traces.find_one({"ordinal": {"$gt": 0}}, {"_id": 0, "ordinal": 1}, sort=[("ordinal", -1)])
+    # Current only if no batch was inserted since the rebalance started; otherwise ordinals
+    # stay stale until the rebalance that import schedules when it finishes
+    try:
+        await db.trace_meta.update_one(
+            {"_id": META_ID, "generation": meta.get("generation") if meta else None},
+            {"$set": {
+                "ordered_generation": generation,
+                "scheme": ORDINAL_SCHEME,
+                "max_ordinal": (highest or {}).get("ordinal") or 0,
+                "rebalanced_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The first insert batch created the meta document meanwhile
+        pass
+    # Cached documents of newly numbered traces lack their ordinal until they expire; nothing reads it from them
+    if renumbers_existing:
+        await cache.invalidate(ORDINALS_TAG)
+    logger.info(
+        f"Rebalanced trace ordinals in {(datetime.utcnow() - started).total_seconds():.2f}s"
+        f"{' (existing ordinals shifted)' if renumbers_existing else ''}"
+    )
+    return True
+
+async def _inserted_among_numbered(db) -> bool:
+    """True if an unnumbered trace sorts below the highest-numbered one, shifting existing ordinals"""
+    top = await db.traces.find_one(
+        {"ordinal": {"$gt": 0}}, {"_id": 0, "trace_id": 1, "flow_session": 1, "turn_number": 1}, sort=[("ordinal", -1)]
+    )
+    if not top:
+        return False
+    inserted = await db.traces.find_one({"$and": [{"ordinal": None}, after_key(trace_key(top))]}, {"_id": 1})
+    return inserted is not None
+
+async def _rebalance_logged(db) -> None:
+    try:
+        await rebalance_ordinals(db)
+    except Exception as e:
+        logger.error(f"Error rebalancing trace ordinals: {e}")
+
+def schedule_rebalance(db) -> None:
+    """Rebalance ordinals in the background, e.g. after an import or at startup"""
+    task = asyncio.create_task(_rebalance_logged(db))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
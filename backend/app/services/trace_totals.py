@@ -0,0 +1,32 @@
+"""
+Cached trace totals
+
+`list_traces` needs the total trace count for the paginator on every page,
+and count_documents({}) scans the whole collection. The total is held in
+the read-through cache with a TTL, so concurrent misses share one count,
+and kept current by the import and clear paths, which adjust it instead of
+invalidating it.
+"""
+from app.core.config import settings
+from app.services.cache import cache
+
+TOTAL_KEY = "traces:total"
+
+class TraceTotals:
+    """Trace count kept in the read-through cache"""
+
+    async def get(self, collection) -> int:
+        """Return the cached total, counting the collection on a miss"""
+        return await cache.get_or_load(
+            TOTAL_KEY, lambda: collection.count_documents({}), settings.totals_cache_ttl_seconds
+        )
+
+    async def set(self, total: int) -> None:
+        await cache.set(TOTAL_KEY, total, settings.totals_cache_ttl_seconds)
+
+    async def increment(self, count: int) -> None:
+        """Adjust a cached total after traces are inserted (or deleted, with a negative count)"""
+        # A missing total is recounted rather than started from zero
+        await cache.increment(TOTAL_KEY, count)
+
+trace_totals = TraceTotals()
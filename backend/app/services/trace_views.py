@@ -0,0 +1,76 @@
+"""
+Trace view profiles
+
+Trace documents keep the whole raw CSV row in `metadata`, roughly doubling
+their size. Endpoints ask MongoDB for only the fields a view renders:
+
+- list: what the trace list shows
+- detail: everything the trace viewer uses, without the raw row
+- full: the whole stored document
+
+`fields=` picks an explicit set instead. The sort key is always included,
+since cursors, navigation and session context are built from it.
+
+Single-trace reads go through the read-through cache, one entry per trace
+and projection.
+"""
+from typing import Any, Dict, Optional
+import re
+
+from app.core.config import settings
+from app.services.cache import ORDINALS_TAG, TRACES_TAG, cached, trace_tag
+
+VIEW_FIELDS = {
+    "list": ["user_message", "ai_response", "total_turns", "ordinal"],
+    "detail": ["user_message", "ai_response", "total_turns", "ordinal", "tool_calls", "imported_at", "imported_by"],
+    "full": None,
+}
+
+ALWAYS_INCLUDED = ["trace_id", "flow_session", "turn_number"]
+
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$")
+
+class InvalidProjectionError(ValueError):
+    """Raised for an unknown view or a malformed field list"""
+
+def trace_projection(view: str, fields: Optional[str] = None) -> Optional[Dict[str, int]]:
+    """Return the Mongo projection for a view profile or comma-separated `fields`; None means the whole document"""
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        invalid = [name for name in names if not _FIELD_NAME.match(name)]
+        if invalid:
+            raise InvalidProjectionError(f"Invalid field names: {', '.join(invalid)}")
+        # MongoDB rejects a projection naming both a field and a path inside it
+        requested = set(ALWAYS_INCLUDED + names)
+        overlapping = sorted(
+            name for name in requested if any(name.startswith(f"{other}.") for other in requested)
+        )
+        if overlapping:
+            raise InvalidProjectionError(f"Fields overlap a parent field also requested: {', '.join(overlapping)}")
+    elif view in VIEW_FIELDS:
+        names = VIEW_FIELDS[view]
+        if names is None:
+            return None
+    else:
+        raise InvalidProjectionError(f"Unknown view '{view}'. Expected one of: {', '.join(VIEW_FIELDS)}")
+
+    projection = {"_id": 0}
+    projection.update({name: 1 for name in ALWAYS_INCLUDED + names if name != "_id"})
+    if "_id" in names:
+        projection["_id"] = 1
+    return projection
+
+def _projection_key(projection: Optional[Dict[str, int]]) -> str:
+    if projection is None:
+        return "full"
+    return ",".join(f"{name}={value}" for name, value in sorted(projection.items()))
+
+@cached(
+    key=lambda db, trace_id, projection: f"trace:{trace_id}:{_projection_key(projection)}",
+    ttl=lambda: settings.trace_cache_ttl_seconds,
+    # Ordinals change when imports are rebalanced; nothing else rewrites a stored trace
+    tags=lambda db, trace_id, projection: [trace_tag(trace_id), TRACES_TAG, ORDINALS_TAG],
+)
+async def load_trace(db, trace_id: str, projection: Optional[Dict[str, int]]) -> Optional[Dict[str, Any]]:
+    """Fetch one trace with `projection`, or None if it does not exist"""
+    return await db.traces.find_one({"trace_id": trace_id}, projection)
@@ -0,0 +1,128 @@
+"""
+"Next unannotated trace" lookup
+
+The anti-join between traces and the user's annotations runs inside
+MongoDB: traces are walked in TRACE_SORT order off the trace_order index,
+each is probed against annotations through the (trace_id, user_id) index,
+and the pipeline stops at the first trace the user has not annotated.
+Nothing proportional to the number of annotations is sent to Python.
+
+To avoid re-walking the annotated prefix on every call, each user has a
+frontier in `annotation_frontiers`: the sort key of their first unannotated
+trace, or no key once everything is annotated. Every trace before the
+frontier is annotated, so the lookup starts there:
+
+- annotating the frontier trace advances it (`advance_frontier`)
+- imports pull frontiers back to the first inserted trace (`rewind_frontiers`)
+- a missing frontier, or one with nothing unannotated after it, is rebuilt
+  by walking from the start
+
+Imports bump every frontier's `version`, and frontiers only move forward if
+their version is unchanged, so an advance racing an import cannot skip over
+freshly inserted traces.
+"""
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+
+from app.services.trace_order import TRACE_SORT, TraceKey, after_key, first_key, trace_key
+
+KEY_FIELDS = ("flow_session", "turn_number", "trace_id")
+
+def next_unannotated_pipeline(user_id: str, start: Optional[TraceKey] = None) -> List[Dict[str, Any]]:
+    """
+    Aggregation returning the first trace (in TRACE_SORT order) without an annotation by `user_id`
+
+    With `start`, the walk begins at that sort key (inclusive) instead of at the first trace.
+    """
+    match = [{"$match": after_key(start, inclusive=True)}] if start else []
+    return match + [
+        # Absorbed into the query plan as an index walk, so it streams instead of sorting
+        {"$sort": {field: direction for field, direction in TRACE_SORT}},
+        # Only the sort key is needed, which the trace_order index covers
+        {"$project": {"_id": 0, "trace_id": 1, "flow_session": 1, "turn_number": 1}},
+        {"$lookup": {
+            "from": "annotations",
+            "localField": "trace_id",
+            "foreignField": "trace_id",
+            "pipeline": [
+                {"$match": {"user_id": user_id}},
+                {"$limit": 1},
+                {"$project": {"_id": 1}}
+            ],
+            "as": "user_annotations"
+        }},
+        {"$match": {"user_annotations": {"$size": 0}}},
+        {"$limit": 1},
+        {"$project": {"user_annotations": 0}}
+    ]
+
+async def _first_unannotated(db, user_id: str, start: Optional[TraceKey] = None) -> Optional[Dict[str, Any]]:
+    result = await db.traces.aggregate(next_unannotated_pipeline(user_id, start)).to_list(length=1)
+    return result[0] if result else None
+
+def _frontier_key(frontier: Dict[str, Any]) -> Optional[TraceKey]:
+    return trace_key(frontier) if frontier.get("trace_id") is not None else None
+
+def _key_fields(key: Optional[TraceKey]) -> Dict[str, Any]:
+    return dict(zip(KEY_FIELDS, key or (None, None, None)))
+
+async def _save_frontier(db, user_id: str, key: Optional[TraceKey], version: Optional[int]) -> None:
+    """Store a frontier, unless an import has bumped its version since it was read"""
+    fields = {**_key_fields(key), "updated_at": datetime.utcnow()}
+    if version is None:
+        await db.annotation_frontiers.update_one(
+            {"user_id": user_id},
+            {"$set": fields, "$setOnInsert": {"version": 0}},
+            upsert=True
+        )
+    else:
+        await db.annotation_frontiers.update_one({"user_id": user_id, "version": version}, {"$set": fields})
+
+async def _rebuild_frontier(db, user_id: str, version: Optional[int]) -> Optional[Dict[str, Any]]:
+    found = await _first_unannotated(db, user_id)
+    await _save_frontier(db, user_id, trace_key(found) if found else None, version)
+    return found
+
+async def find_next_unannotated(db, user_id: str) -> Optional[Dict[str, Any]]:
+    """Return the sort key of the first trace `user_id` has not annotated, or None"""
+    frontier = await db.annotation_frontiers.find_one({"user_id": user_id})
+    if not frontier:
+        return await _rebuild_frontier(db, user_id, None)
+
+    key = _frontier_key(frontier)
+    if key is None:
+        # Everything was annotated, and no import has arrived since
+        return None
+
+    found = await _first_unannotated(db, user_id, key)
+    if not found:
+        # Nothing after the frontier; confirm from the start before recording that
+        return await _rebuild_frontier(db, user_id, frontier["version"])
+
+    if trace_key(found) != key:
+        await _save_frontier(db, user_id, trace_key(found), frontier["version"])
+    return found
+
+async def advance_frontier(db, user_id: str, trace_ids: List[str]) -> None:
+    """Move the user's frontier forward if one of the newly annotated `trace_ids` was the frontier trace"""
+    frontier = await db.annotation_frontiers.find_one({"user_id": user_id, "trace_id": {"$in": trace_ids}})
+    if not frontier:
+        # Annotations away from the frontier leave it valid
+        return
+
+    found = await _first_unannotated(db, user_id, trace_key(frontier))
+    await _save_frontier(db, user_id, trace_key(found) if found else None, frontier["version"])
+
+async def rewind_frontiers(db, traces: List[Dict[str, Any]]) -> None:
+    """Pull every frontier back to the first of newly imported `traces` if they land before it"""
+    if not traces:
+        return
+
+    key = first_key(traces)
+    now = datetime.utcnow()
+    # Bump versions first so an advance computed before the insert cannot land after the rewind
+    await db.annotation_frontiers.update_many({}, {"$inc": {"version": 1}})
+    await db.annotation_frontiers.update_many(
+        {"$or": [{"trace_id": None}] + after_key(key)["$or"]},
+        {"$set": {**_key_fields(key), "updated_at": now}}
+    )
@@ -0,0 +1,163 @@
+"""
+Cached user resolution
+
+Every authenticated request maps the token's Clerk id to a user document.
+Each process keeps those documents in a bounded LRU with a short TTL
+(`user_cache_ttl_seconds`), so the lookup costs no database read on the
+hot path. A user seen for the first time is created with one upsert.
+
+The Clerk webhooks change users; `invalidate` drops the entry locally and
+publishes the Clerk id on a Redis channel that every worker subscribes to
+(`start_listener`, run at startup), so other workers drop it too. If the
+subscription is lost, the LRU is cleared once it is re-established, since
+invalidations may have been missed meanwhile. Without Redis, the TTL
+bounds how long other workers can serve a changed user.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from datetime import datetime
+import asyncio
+import logging
+import time
+
+from pymongo import ReturnDocument
+
+from app.core.config import settings
+from app.core.metrics import cache_families, registry
+from app.db.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "user_cache:invalidate"
+
+User = Dict[str, Any]
+
+class UserCache:
+    """clerk_id -> user document, per process, invalidated across workers through Redis pub/sub"""
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, Tuple[float, User]]" = OrderedDict()
+        self._listener: Optional[asyncio.Task] = None
+        self.invalidations = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def resolve(self, db, claims: Dict[str, Any]) -> User:
+        """Return the user for verified token `claims`, creating them on first sight"""
+        clerk_id = claims["sub"]
+        user = self._get_local(clerk_id)
+        if user is not None:
+            self.hits += 1
+            return dict(user)
+
+        self.misses += 1
+        invalidations = self.invalidations
+        now = datetime.utcnow()
+        user = await db.users.find_one_and_update(
+            {"clerk_id": clerk_id},
+            {"$setOnInsert": {
+                "clerk_id": clerk_id,
+                "email": claims.get("email"),
+                "name": claims.get("name"),
+                "created_at": now,
+                "updated_at": now
+            }},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        # A webhook changing users meanwhile may have made this read stale
+        if self.invalidations == invalidations:
+            self._put_local(clerk_id, user)
+        return dict(user)
+
+    async def invalidate(self, clerk_id: str) -> None:
+        """Drop a changed user in this process and, through Redis, in every other worker"""
+        self._drop(clerk_id)
+        client = get_redis()
+        if client:
+            try:
+                await client.publish(INVALIDATION_CHANNEL, clerk_id)
+            except Exception as e:
+                # Other workers' entries expire with their TTL
+                logger.warning(f"Redis unavailable publishing user invalidation: {e}")
+
+    def start_listener(self) -> None:
+        """Subscribe to invalidations from other workers, if Redis is connected"""
+        if get_redis() is None or (self._listener and not self._listener.done()):
+            return
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop_listener(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "users_cached": len(self._entries),
+        }
+
+    async def _listen(self) -> None:
+        subscribed_before = False
+        while True:
+            client = get_redis()
+            if client is None:
+                return
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                if subscribed_before:
+                    # Invalidations published while the subscription was down were missed
+                    self.clear()
+                subscribed_before = True
+                async for message in pubsub.listen():
+                    self.handle_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"User cache invalidation subscription lost, retrying: {e}")
+                await asyncio.sleep(settings.user_cache_resubscribe_seconds)
+            finally:
+                await pubsub.aclose()
+
+    def handle_message(self, message: Dict[str, Any]) -> None:
+        if message.get("type") == "message":
+            self._drop(message["data"])
+
+    def _drop(self, clerk_id: str) -> None:
+        self.invalidations += 1
+        self._entries.pop(clerk_id, None)
+
+    def _get_local(self, clerk_id: str) -> Optional[User]:
+        entry = self._entries.get(clerk_id)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[clerk_id]
+            return None
+        self._entries.move_to_end(clerk_id)
+        return user
+
+    def _put_local(self, clerk_id: str, user: User) -> None:
+        self._entries[clerk_id] = (time.monotonic() + settings.user_cache_ttl_seconds, user)
+        self._entries.move_to_end(clerk_id)
+        while len(self._entries) > settings.user_cache_size:
+            self._entries.popitem(last=False)
+
+user_cache = UserCache()
+
+@registry.collector
+def _collect():
+    return cache_families("users", {"hit": user_cache.hits, "miss": user_cache.misses}, user_cache.hits)
@@ -0,0 +1,128 @@
+"""
+Benchmark: GET /api/traces?page_size=100 response path, before and after
+
+Serves a page of 100 realistic trace documents (long messages, a
+28-column raw CSV row in metadata, ObjectId and datetime fields) from an
+in-memory collection, so only the handler and serialization are timed:
+
+- before: documents rebuilt by clean_nan_values, _id stringified by hand,
+  then jsonable_encoder and the stock JSONResponse (the original handler)
+- after:  the current list_traces returning MongoJSONResponse, with
+  view=full for the same payload and with the default list view
+
+Usage (from backend/):
+    python -m benchmarks.bench_list_traces --requests 500
+"""
+from datetime import datetime
+from typing import Any, Dict
+from unittest.mock import AsyncMock, MagicMock, patch
+import argparse
+import copy
+import logging
+import math
+import statistics
+import time
+
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+PAGE_SIZE = 100
+
+def make_trace(i: int) -> Dict[str, Any]:
+    user_message = f"Hi, I ordered item {i} last week and it still has not arrived. " * 6
+    ai_response = f"Sorry to hear that. Order {i} left our warehouse on Monday and should arrive soon. " * 12
+    metadata = {f"col{col}": (float("nan") if col % 5 == 0 else f"value {i}-{col}") for col in range(22)}
+    metadata.update({
+        "trace_id": f"trace-{i}", "flow_session": f"session-{i // 10:07d}", "turn_number": i % 10 + 1,
+        "total_turns": 10, "user_message": user_message, "ai_response": ai_response
+    })
+    return {
+        "_id": ObjectId(),
+        "trace_id": f"trace-{i}",
+        "flow_session": f"session-{i // 10:07d}",
+        "turn_number": i % 10 + 1,
+        "total_turns": 10,
+        "user_message": user_message,
+        "ai_response": ai_response,
+        "metadata": metadata,
+        "imported_at": datetime(2025, 1, 1, 12, 0, 0),
+        "imported_by": "bench",
+        "ordinal": i + 1,
+    }
+
+def fake_db(docs):
+    """Collection whose find() returns copies of `docs`, honouring the projection"""
+    def find(query, projection=None):
+        def project(doc):
+            if projection is None:
+                return copy.copy(doc)
+            return {key: value for key, value in doc.items() if projection.get(key, 0)}
+        page = [project(doc) for doc in docs]
+        cursor = MagicMock()
+        cursor.sort.return_value = cursor
+        cursor.skip.return_value = cursor
+        cursor.limit.return_value = cursor
+        cursor.to_list = AsyncMock(return_value=page)
+        return cursor
+    return MagicMock(traces=MagicMock(find=find))
+
+def clean_nan_values(data: Dict[str, Any]) -> Dict[str, Any]:
+    """The per-document cleanup the original handler ran"""
+    return {
+        k: (None if isinstance(v, float) and math.isnan(v) else
+            clean_nan_values(v) if isinstance(v, dict) else v)
+        for k, v in data.items()
+    }
+
+def legacy_app(docs) -> FastAPI:
+    legacy = FastAPI()
+
+    @legacy.get("/api/traces")
+    async def list_traces(page_size: int = PAGE_SIZE):
+        traces = []
+        for doc in docs:
+            trace = copy.copy(doc)
+            trace["_id"] = str(trace["_id"])
+            traces.append(clean_nan_values(trace))
+        return {"traces": traces, "page": 1, "page_size": page_size, "total": 10_000, "total_pages": 100}
+
+    return legacy
+
+def time_requests(client: TestClient, url: str, requests: int):
+    client.get(url).raise_for_status()
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(url)
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies), len(response.content)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    docs = [make_trace(i) for i in range(PAGE_SIZE + 1)]
+    url = f"/api/traces?page_size={PAGE_SIZE}"
+
+    before, before_bytes = time_requests(TestClient(legacy_app(docs[:PAGE_SIZE])), url, args.requests)
+
+    with patch("app.api.traces.get_database", return_value=fake_db(docs)), \
+            patch("app.api.traces.trace_totals.get", AsyncMock(return_value=10_000)):
+        client = TestClient(app)
+        full, full_bytes = time_requests(client, url + "&view=full", args.requests)
+        listed, list_bytes = time_requests(client, url, args.requests)
+
+    print(f"{args.requests} requests, median latency per request (page of {PAGE_SIZE})")
+    print(f"before (jsonable_encoder, full docs): {before * 1000:6.2f} ms  {before_bytes / 1024:6.0f} KiB")
+    print(f"after  (orjson, view=full):           {full * 1000:6.2f} ms  {full_bytes / 1024:6.0f} KiB"
+          f"  {before / full:.1f}x")
+    print(f"after  (orjson, default list view):   {listed * 1000:6.2f} ms  {list_bytes / 1024:6.0f} KiB"
+          f"  {before / listed:.1f}x")
+
+if __name__ == "__main__":
+    main()
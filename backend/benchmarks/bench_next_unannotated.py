@@ -0,0 +1,122 @@
+"""
+Benchmark: GET /api/traces/next/unannotated, $nin scan vs in-database anti-join
+
+Seeds a scratch database with traces and annotates the first N of them (in
+list order) for one user, which is where annotators doing Pass & Next end
+up. Each implementation is then timed at 1k, 10k and 100k annotations.
+Needs a running MongoDB at MONGODB_URL; the scratch database is dropped
+afterwards.
+
+Usage (from backend/):
+    python -m benchmarks.bench_next_unannotated
+    python -m benchmarks.bench_next_unannotated --annotations 1000 10000 --repeat 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.db.indexes import INDEXES
+from app.services.unannotated import find_next_unannotated
+
+USER_ID = "bench-user"
+TURNS_PER_SESSION = 10
+INSERT_BATCH = 10_000
+
+async def legacy_find_next_unannotated(db, user_id: str):
+    """The implementation replaced by the aggregation pipeline"""
+    annotated_ids = [doc["trace_id"] async for doc in db.annotations.find({"user_id": user_id}, {"trace_id": 1})]
+    return await db.traces.find_one(
+        {"trace_id": {"$nin": annotated_ids}},
+        sort=[("flow_session", -1), ("turn_number", 1)]
+    )
+
+def trace_in_list_order(position: int, session_count: int) -> dict:
+    """Trace at `position` in (flow_session desc, turn_number asc) order"""
+    session = session_count - 1 - position // TURNS_PER_SESSION
+    turn = position % TURNS_PER_SESSION + 1
+    return {
+        "trace_id": f"trace-{session:07d}-{turn:02d}",
+        "flow_session": f"session-{session:07d}",
+        "turn_number": turn,
+        "total_turns": TURNS_PER_SESSION,
+        "user_message": "Where is my parcel?",
+        "ai_response": "Your parcel is on its way.",
+        "metadata": {},
+        "imported_at": datetime.utcnow(),
+        "imported_by": "bench"
+    }
+
+async def seed(db, trace_count: int) -> None:
+    for collection_name, indexes in INDEXES.items():
+        await db[collection_name].create_indexes(indexes)
+
+    session_count = -(-trace_count // TURNS_PER_SESSION)
+    for start in range(0, trace_count, INSERT_BATCH):
+        await db.traces.insert_many([
+            trace_in_list_order(i, session_count) for i in range(start, min(start + INSERT_BATCH, trace_count))
+        ])
+
+async def annotate_first(db, count: int) -> None:
+    """Extend the user's annotations so the first `count` traces in list order are annotated"""
+    already = await db.annotations.count_documents({"user_id": USER_ID})
+    cursor = db.traces.find({}, {"trace_id": 1}).sort([("flow_session", -1), ("turn_number", 1)]).skip(already)
+    batch = []
+    async for trace in cursor.limit(count - already):
+        batch.append({
+            "trace_id": trace["trace_id"],
+            "user_id": USER_ID,
+            "holistic_pass_fail": "Pass",
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+            "version": 1
+        })
+        if len(batch) == INSERT_BATCH:
+            await db.annotations.insert_many(batch)
+            batch = []
+    if batch:
+        await db.annotations.insert_many(batch)
+
+async def time_call(fn, db, repeat: int) -> float:
+    """Median latency in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn(db, USER_ID)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--annotations", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(settings.mongodb_url)
+    db_name = f"{settings.mongodb_db_name}_bench"
+    db = client[db_name]
+    await client.drop_database(db_name)
+
+    try:
+        await seed(db, max(args.annotations) + 1_000)
+
+        print(f"{'annotations':>12} | {'$nin (ms)':>10} | {'pipeline (ms)':>13} | speedup")
+        for count in sorted(args.annotations):
+            await annotate_first(db, count)
+            new = await find_next_unannotated(db, USER_ID)
+            old = await legacy_find_next_unannotated(db, USER_ID)
+            assert new["trace_id"] == old["trace_id"], (new, old)
+
+            legacy_ms = await time_call(legacy_find_next_unannotated, db, args.repeat)
+            pipeline_ms = await time_call(find_next_unannotated, db, args.repeat)
+            print(f"{count:>12,} | {legacy_ms:>10.1f} | {pipeline_ms:>13.1f} | {legacy_ms / pipeline_ms:.1f}x")
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
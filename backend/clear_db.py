@@ -2,6 +2,11 @@
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from app.db.redis import close_redis_connection, connect_to_redis
+from app.services.annotation_stats import STATS_TAG
+from app.services.cache import TRACES_TAG, cache
+from app.services.trace_totals import trace_totals
+
 async def clear_database():
     client = AsyncIOMotorClient("mongodb://localhost:27017")
     db = client.eval_platform
@@ -10,10 +15,23 @@ async def clear_database():
     result1 = await db.traces.delete_many({})
     print(f"Deleted {result1.deleted_count} traces")
 
+    # No traces left to number; the next import starts ordinals afresh
+    await db.trace_meta.delete_many({})
+
+    # Keep the cached trace total used by the paginator in step, and drop cached traces and stats
+    await connect_to_redis()
+    await trace_totals.set(0)
+    await cache.invalidate(TRACES_TAG, STATS_TAG)
+    await close_redis_connection()
+
     # Delete all annotations
     result2 = await db.annotations.delete_many({})
     print(f"Deleted {result2.deleted_count} annotations")
 
+    # Frontiers point into the deleted traces; they are rebuilt on next use
+    await db.annotation_frontiers.delete_many({})
+    await db.annotation_counters.delete_many({})
+
     client.close()
 
 if __name__ == "__main__":
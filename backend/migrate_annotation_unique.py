@@ -0,0 +1,47 @@
+"""
+One-time migration: make (trace_id, user_id) unique on annotations
+
+Annotation saves are upserts backed by a unique (trace_id, user_id)
+index. Databases created before that may hold duplicate annotations from
+racing saves, plus the old non-unique index with the same keys. Startup
+replaces that index by itself when there are no duplicates, and refuses
+to start otherwise. This keeps the most recently updated annotation of
+each duplicate group, drops the old index and creates the unique one:
+
+    python migrate_annotation_unique.py
+"""
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.db.indexes import INDEXES
+
+KEYS = {"trace_id": 1, "user_id": 1}
+
+async def migrate_annotation_unique():
+    client = AsyncIOMotorClient(settings.mongodb_url)
+    db = client[settings.mongodb_db_name]
+
+    duplicates = db.annotations.aggregate([
+        {"$sort": {"updated_at": -1, "version": -1}},
+        {"$group": {"_id": {"trace_id": "$trace_id", "user_id": "$user_id"}, "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}}
+    ], allowDiskUse=True)
+    removed = 0
+    async for group in duplicates:
+        result = await db.annotations.delete_many({"_id": {"$in": group["ids"][1:]}})
+        removed += result.deleted_count
+    print(f"Removed {removed} duplicate annotations")
+
+    for name, spec in (await db.annotations.index_information()).items():
+        if dict(spec["key"]) == KEYS and not spec.get("unique"):
+            await db.annotations.drop_index(name)
+            print(f"Dropped non-unique index {name}")
+
+    names = await db.annotations.create_indexes(INDEXES["annotations"])
+    print(f"Indexes ready on annotations: {', '.join(names)}")
+
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(migrate_annotation_unique())
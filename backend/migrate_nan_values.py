@@ -0,0 +1,50 @@
+"""
+One-time migration: replace NaN with null in stored traces
+
+Imports now store missing CSV values as null, but traces imported by
+earlier versions can hold NaN in `metadata` (and, from very old imports,
+at the top level). Responses no longer clean documents on every read, so
+run this once against each existing database:
+
+    python migrate_nan_values.py
+
+It only rewrites documents that still contain NaN, so re-running is safe.
+"""
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+
+NAN = float("nan")
+
+def _has_nan(path: str):
+    """Expression: does the object at `path` have a NaN value (MongoDB compares NaN equal to NaN)"""
+    return {"$in": [NAN, {"$map": {"input": {"$objectToArray": {"$ifNull": [path, {}]}}, "in": "$$this.v"}}]}
+
+def _without_nan(path: str):
+    """Expression: the object at `path` with NaN values replaced by null"""
+    return {"$arrayToObject": {"$map": {
+        "input": {"$objectToArray": path},
+        "in": {"k": "$$this.k", "v": {"$cond": [{"$eq": ["$$this.v", NAN]}, None, "$$this.v"]}}
+    }}}
+
+async def migrate_nan_values():
+    client = AsyncIOMotorClient(settings.mongodb_url)
+    db = client[settings.mongodb_db_name]
+
+    top_level = await db.traces.update_many(
+        {"$expr": _has_nan("$$ROOT")},
+        [{"$replaceWith": _without_nan("$$ROOT")}]
+    )
+    print(f"Cleaned top-level NaN in {top_level.modified_count} traces")
+
+    metadata = await db.traces.update_many(
+        {"$expr": {"$and": [{"$eq": [{"$type": "$metadata"}, "object"]}, _has_nan("$metadata")]}},
+        [{"$set": {"metadata": _without_nan("$metadata")}}]
+    )
+    print(f"Cleaned metadata NaN in {metadata.modified_count} traces")
+
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(migrate_nan_values())
@@ -92,11 +92,10 @@ class TestCSVImport:
         file = ("test.csv", csv_content.encode(), "text/csv")
 
         # Mock database operations
-        mock_db.traces.find_one.return_value = None
-        mock_db.traces.insert_one.return_value = MagicMock(inserted_id="test_id")
+        mock_db.traces.insert_many.return_value = MagicMock(inserted_ids=["test_id"])
 
         response = client.post(
-            "/api/traces/import-csv",
+            "/api/traces/import-csv?background=false",
             files={"file": file},
             headers={"Authorization": "Bearer test_token"}
         )
@@ -0,0 +1,166 @@
+"""
+API tests for background CSV import jobs
+"""
+import asyncio
+import statistics
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.import_jobs import job_store, new_import_job, run_import_job, shutdown_import_workers
+
+CSV_HEADER = "id,Flow Session,Turn_Number,Total_Turns_in_Session,body.user_message,response.text_output\n"
+
+@pytest.fixture
+def client():
+    """Client with a running lifespan, so background jobs share one event loop"""
+    with patch("app.main.connect_to_mongo", AsyncMock()), \
+            patch("app.main.connect_to_redis", AsyncMock()), \
+            patch("app.main.close_mongo_connection", AsyncMock()), \
+            patch("app.main.close_redis_connection", AsyncMock()):
+        with TestClient(app) as test_client:
+            yield test_client
+
+@pytest.fixture
+def mock_traces():
+    """Mock traces collection used by the import job runner"""
+    traces = MagicMock()
+    traces.insert_many = AsyncMock(side_effect=lambda docs, ordered: MagicMock(inserted_ids=[None] * len(docs)))
+    db = MagicMock(
+        traces=traces,
+        annotation_frontiers=MagicMock(update_many=AsyncMock()),
+        trace_meta=MagicMock(update_one=AsyncMock(), find_one=AsyncMock(return_value=None))
+    )
+    traces.aggregate = MagicMock(return_value=MagicMock(to_list=AsyncMock(return_value=[])))
+    with patch("app.services.import_jobs.get_database", return_value=db), \
+            patch("app.services.import_jobs.get_redis", return_value=None), \
+            patch("app.core.config.settings.import_chunk_size", 4):
+        yield traces
+    shutdown_import_workers()
+
+def wait_for_job(client: TestClient, job_id: str, timeout: float = 30.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/traces/import-jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Import job {job_id} did not finish")
+
+def test_import_returns_job_id_and_reports_progress(client, mock_traces):
+    """[P1] POST /api/traces/import-csv - queues a job and the job reports counts"""
+    rows = "".join(f"t{i},s1,{i + 1},10,question {i},answer {i}\n" for i in range(10))
+
+    response = client.post("/api/traces/import-csv", files={"file": ("traces.csv", CSV_HEADER + rows, "text/csv")})
+
+    assert response.status_code == 202
+    job = wait_for_job(client, response.json()["job_id"])
+    assert job["status"] == "completed"
+    assert (job["rows_parsed"], job["inserted"], job["skipped"], job["failed"]) == (10, 10, 0, 0)
+    # Chunks of 4 rows are inserted as separate batches
+    assert mock_traces.insert_many.await_count == 3
+
+def test_import_job_records_parse_errors(client, mock_traces):
+    """[P2] Malformed rows after the header fail the job rather than the request"""
+    rows = "t1,s1,1,2,hi,there\nt2,s1,not-a-number,2,hi,there\n"
+
+    response = client.post("/api/traces/import-csv", files={"file": ("traces.csv", CSV_HEADER + rows, "text/csv")})
+
+    assert response.status_code == 202
+    job = wait_for_job(client, response.json()["job_id"])
+    assert job["status"] == "failed"
+    assert "turn_number" in job["error"]
+
+def test_import_rejects_missing_columns_before_queueing(client, mock_traces):
+    """[P1] Header validation still returns 400 synchronously"""
+    response = client.post("/api/traces/import-csv", files={"file": ("bad.csv", "a,b\n1,2\n", "text/csv")})
+
+    assert response.status_code == 400
+    assert "Missing required columns" in response.json()["detail"]
+
+def test_ordinals_marked_stale_before_each_batch_is_inserted(client, mock_traces):
+    """Ordinal readers must fall back before inserted traces become visible"""
+    calls = []
+    insert = mock_traces.insert_many.side_effect
+
+    async def mark_stale(db):
+        calls.append("stale")
+
+    def insert_many(docs, ordered):
+        calls.append("insert")
+        return insert(docs, ordered)
+
+    mock_traces.insert_many.side_effect = insert_many
+    rows = "".join(f"t{i},s1,{i + 1},10,question {i},answer {i}\n" for i in range(6))
+    with patch("app.services.import_jobs.mark_ordinals_stale", mark_stale):
+        response = client.post("/api/traces/import-csv", files={"file": ("traces.csv", CSV_HEADER + rows, "text/csv")})
+        assert wait_for_job(client, response.json()["job_id"])["status"] == "completed"
+
+    # Two batches of 4 and 2 rows, each marked stale before and after its insert
+    assert calls == ["stale", "insert", "stale"] * 2
+
+@pytest.mark.asyncio
+async def test_cancelled_job_is_recorded_as_interrupted():
+    """A job cancelled by shutdown is saved as failed rather than left running"""
+    job = new_import_job("traces.csv")
+
+    async def never_finishes(job, path, imported_by, on_progress):
+        job["status"] = "running"
+        await asyncio.Event().wait()
+
+    with patch("app.services.import_jobs.import_file", never_finishes), \
+            patch("app.services.import_jobs.get_redis", return_value=None), \
+            patch("app.services.import_jobs.remove_upload"):
+        task = asyncio.create_task(run_import_job(job, "upload.csv", None))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        saved = await job_store.get(job["job_id"])
+    assert (saved["status"], saved["error"]) == ("failed", "interrupted")
+    assert saved["finished_at"]
+
+@pytest.mark.asyncio
+async def test_job_readable_when_redis_read_fails_after_save():
+    """A transient Redis error on read must not turn a live job into a 404"""
+    job = new_import_job("traces.csv")
+    client = MagicMock(set=AsyncMock(), get=AsyncMock(side_effect=ConnectionError("Redis went away")))
+
+    with patch("app.services.import_jobs.get_redis", return_value=client):
+        await job_store.save(job)
+        saved = await job_store.get(job["job_id"])
+
+    client.set.assert_awaited_once()
+    assert saved["job_id"] == job["job_id"]
+
+def test_unknown_import_job_returns_404(client):
+    with patch("app.services.import_jobs.get_redis", return_value=None):
+        response = client.get("/api/traces/import-jobs/does-not-exist")
+
+    assert response.status_code == 404
+
+def test_health_stays_responsive_during_large_import(client, mock_traces):
+    """[P1] Parsing runs off the event loop, so /health latency stays low mid-import"""
+    rows = "".join(f"t{i},s{i // 10},{i % 10 + 1},10,question {i} {'x' * 200},answer {i} {'y' * 400}\n" for i in range(100_000))
+
+    with patch("app.core.config.settings.import_chunk_size", 20_000):
+        response = client.post("/api/traces/import-csv", files={"file": ("big.csv", CSV_HEADER + rows, "text/csv")})
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        latencies = []
+        while client.get(f"/api/traces/import-jobs/{job_id}").json()["status"] in ("queued", "running"):
+            start = time.perf_counter()
+            assert client.get("/health").status_code == 200
+            latencies.append(time.perf_counter() - start)
+
+    assert wait_for_job(client, job_id)["inserted"] == 100_000
+    assert len(latencies) >= 5
+    p95 = statistics.quantiles(latencies, n=20)[-1]
+    assert p95 < 0.05, f"/health p95 was {p95 * 1000:.0f}ms during import"
+    # Inline parsing of a 20k-row chunk would block the loop for far longer than this
+    assert max(latencies) < 0.5, f"/health took up to {max(latencies) * 1000:.0f}ms during import"
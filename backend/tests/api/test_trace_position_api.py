@@ -0,0 +1,49 @@
+"""
+API tests for a trace's position in the list order
+"""
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.trace_ordinals import ORDINAL_SCHEME
+
+TRACE = {"trace_id": "t1", "flow_session": "s1", "turn_number": 1, "ordinal": 40}
+
+@pytest.fixture
+def client():
+    with patch("app.main.connect_to_mongo", AsyncMock()), \
+            patch("app.main.connect_to_redis", AsyncMock()), \
+            patch("app.main.close_mongo_connection", AsyncMock()), \
+            patch("app.main.close_redis_connection", AsyncMock()), \
+            patch("app.main.schedule_rebalance"):
+        with TestClient(app) as test_client:
+            yield test_client
+
+def mock_db(meta):
+    db = MagicMock()
+    db.traces.find_one = AsyncMock(return_value=dict(TRACE))
+    db.traces.count_documents = AsyncMock(return_value=9)
+    db.trace_meta.find_one = AsyncMock(return_value=meta)
+    return db
+
+def test_total_comes_from_the_ordinal_numbering(client):
+    """[P1] GET /api/traces/{id}/position - a stale cached total cannot put N past M"""
+    db = mock_db({"generation": 4, "ordered_generation": 4, "scheme": ORDINAL_SCHEME, "max_ordinal": 50})
+
+    with patch("app.api.traces.get_database", return_value=db), \
+            patch("app.api.traces.trace_totals.get", AsyncMock(return_value=30)):
+        response = client.get("/api/traces/t1/position")
+
+    assert response.json() == {"trace_id": "t1", "position": 11, "total": 50}
+
+def test_cached_total_used_while_ordinals_are_stale(client):
+    """[P1] GET /api/traces/{id}/position - counted position, cached total"""
+    db = mock_db({"generation": 5, "ordered_generation": 4, "scheme": ORDINAL_SCHEME, "max_ordinal": 50})
+
+    with patch("app.api.traces.get_database", return_value=db), \
+            patch("app.api.traces.trace_totals.get", AsyncMock(return_value=60)):
+        response = client.get("/api/traces/t1/position")
+
+    assert response.json() == {"trace_id": "t1", "position": 10, "total": 60}
@@ -0,0 +1,111 @@
+"""
+Shared fixtures
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+import json
+import threading
+
+import pytest
+
+from app.services import cache as cache_module
+from app.services.cache import cache
+
+class FakeRedis:
+    """In-memory stand-in for the Redis commands the read-through cache uses"""
+
+    def __init__(self):
+        self.data = {}
+        self.evals = 0
+
+    async def eval(self, script, numkeys, key, arg):
+        self.evals += 1
+        entry = self.data.get(key)
+        if script == cache_module._GET_IF_CURRENT:
+            if entry is None:
+                return None
+            for field, version in entry.items():
+                if field.startswith("t:") and self.data.get(arg + field[2:], "0") != version:
+                    return None
+            return entry["value"]
+        if script == cache_module._INCREMENT_IF_EXISTS and entry is not None:
+            entry["value"] = str(int(entry["value"]) + int(arg))
+            return int(entry["value"])
+        return None
+
+    async def mget(self, *keys):
+        return [self.data.get(key) for key in keys]
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def delete(self, key):
+        self.ops.append(lambda data: data.pop(key, None))
+
+    def hset(self, key, mapping):
+        values = {field: value.decode() if isinstance(value, bytes) else str(value) for field, value in mapping.items()}
+        self.ops.append(lambda data: data.setdefault(key, {}).update(values))
+
+    def expire(self, key, seconds):
+        self.ops.append(lambda data: None)
+
+    def incr(self, key):
+        self.ops.append(lambda data: data.__setitem__(key, str(int(data.get(key, "0")) + 1)))
+
+    async def execute(self):
+        for op in self.ops:
+            op(self.redis.data)
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    """Each test starts with an empty read-through cache and no Redis"""
+    cache.reset()
+    with patch("app.services.cache.get_redis", return_value=None):
+        yield cache
+
+@pytest.fixture
+def fake_redis():
+    redis = FakeRedis()
+    with patch("app.services.cache.get_redis", return_value=redis):
+        yield redis
+
+@pytest.fixture
+def http_server():
+    """Local HTTP server answering every GET with `server.payload` as JSON; counts requests"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            server.requests += 1
+            body = json.dumps(server.payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.payload = {}
+    server.requests = 0
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
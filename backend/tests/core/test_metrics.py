@@ -0,0 +1,68 @@
+"""
+Tests for the Prometheus-style metrics registry and request timing
+"""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.metrics import MetricsMiddleware, Registry, REQUEST_SECONDS
+from app.db.mongodb import CommandMetricsListener, MONGO_COMMAND_FAILURES, MONGO_COMMAND_SECONDS
+
+class CommandEvent:
+    def __init__(self, command_name, duration_micros):
+        self.command_name = command_name
+        self.duration_micros = duration_micros
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+
+    latency.observe(0.05, route="/a")
+    latency.observe(0.5, route="/a")
+    latency.observe(3.0, route="/a")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{route="/a"} 3' in lines
+
+def test_collectors_reporting_the_same_family_are_merged():
+    registry = Registry()
+    registry.counter("rows_total", "Rows").inc(3, outcome="inserted")
+    registry.collector(lambda: [("hits_total", "counter", "Hits", [({"cache": "a"}, 1)])])
+    registry.collector(lambda: [("hits_total", "counter", "Hits", [({"cache": "b"}, 2), ({"cache": "c"}, None)])])
+
+    text = registry.render()
+    assert 'rows_total{outcome="inserted"} 3' in text
+    assert text.count("# TYPE hits_total counter") == 1
+    assert 'hits_total{cache="a"} 1' in text and 'hits_total{cache="b"} 2' in text
+    assert 'cache="c"' not in text
+
+def test_middleware_labels_requests_by_route_template():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        return {"id": item_id}
+
+    client = TestClient(app)
+    before = REQUEST_SECONDS.count(method="GET", route="/items/{item_id}", status=200)
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/missing")
+
+    assert REQUEST_SECONDS.count(method="GET", route="/items/{item_id}", status=200) == before + 2
+    assert REQUEST_SECONDS.count(method="GET", route="unmatched", status=404) >= 1
+
+def test_mongo_listener_times_commands_and_counts_failures():
+    listener = CommandMetricsListener()
+    count = MONGO_COMMAND_SECONDS.count(command="testFind")
+    failures = MONGO_COMMAND_FAILURES.value(command="testFind")
+
+    listener.succeeded(CommandEvent("testFind", 1500))
+    listener.failed(CommandEvent("testFind", 2500))
+
+    assert MONGO_COMMAND_SECONDS.count(command="testFind") == count + 2
+    assert MONGO_COMMAND_FAILURES.value(command="testFind") == failures + 1
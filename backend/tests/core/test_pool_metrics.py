@@ -0,0 +1,80 @@
+"""
+Tests for connection pool saturation metrics
+"""
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+import redis.asyncio as redis
+
+from app.core.http_client import InstrumentedTransport
+from app.core.pool_metrics import PoolStats, pool_snapshot, register_pool
+from app.db.mongodb import PoolMetricsListener
+from app.db.redis import InstrumentedConnectionPool
+
+def test_stats_track_checked_out_waiting_and_wait_times():
+    stats = PoolStats("test", 2)
+
+    stats.checkout_started()
+    stats.checkout_started()
+    assert stats.snapshot()["waiting"] == 2
+
+    stats.checkout_finished(0.002)
+    stats.checkout_finished(0.004)
+    snapshot = stats.snapshot()
+    assert (snapshot["waiting"], snapshot["checked_out"], snapshot["checkouts"]) == (0, 2, 2)
+    assert snapshot["wait_seconds_avg"] == 0.003 and snapshot["wait_seconds_max"] == 0.004
+
+    stats.checked_in()
+    stats.checkout_started()
+    stats.checkout_finished(5.0, acquired=False)
+    snapshot = stats.snapshot()
+    assert (snapshot["checked_out"], snapshot["checkouts"], snapshot["checkout_failures"]) == (1, 2, 1)
+
+def test_registered_pools_appear_in_snapshot():
+    register_pool("test-pool", 10).checkout_started()
+
+    assert pool_snapshot()["test-pool"]["waiting"] == 1
+
+def test_mongo_listener_counts_checkouts():
+    stats = PoolStats("mongodb", 100)
+    listener = PoolMetricsListener(stats)
+
+    listener.connection_check_out_started(None)
+    listener.connection_checked_out(None)
+    listener.connection_check_out_started(None)
+    listener.connection_check_out_failed(None)
+
+    snapshot = stats.snapshot()
+    assert (snapshot["checked_out"], snapshot["waiting"], snapshot["checkout_failures"]) == (1, 0, 1)
+    listener.connection_checked_in(None)
+    assert stats.snapshot()["checked_out"] == 0
+
+@pytest.mark.asyncio
+async def test_redis_pool_counts_checkouts_and_releases():
+    pool = InstrumentedConnectionPool(max_connections=2)
+    pool.stats = PoolStats("redis", 2)
+    connection = object()
+
+    with patch.object(redis.BlockingConnectionPool, "get_connection", AsyncMock(return_value=connection)), \
+            patch.object(redis.BlockingConnectionPool, "release", AsyncMock()):
+        assert await pool.get_connection("GET") is connection
+        assert pool.stats.snapshot()["checked_out"] == 1
+        await pool.release(connection)
+
+    assert pool.stats.snapshot()["checked_out"] == 0
+    assert pool.stats.snapshot()["checkouts"] == 1
+
+@pytest.mark.asyncio
+async def test_http_connection_held_until_response_closed(http_server):
+    stats = PoolStats("http", 2)
+    http_server.payload = {"ok": True}
+
+    async with httpx.AsyncClient(transport=InstrumentedTransport(stats)) as client:
+        async with client.stream("GET", http_server.url) as response:
+            assert stats.snapshot()["checked_out"] == 1
+            await response.aread()
+        assert (await client.get(http_server.url)).json() == {"ok": True}
+
+    snapshot = stats.snapshot()
+    assert (snapshot["checked_out"], snapshot["waiting"], snapshot["checkouts"]) == (0, 0, 2)
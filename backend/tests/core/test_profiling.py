@@ -0,0 +1,76 @@
+"""
+Tests for opt-in request profiling
+"""
+import asyncio
+import contextvars
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.profiling import ProfilingMiddleware, profile_key
+from app.db.mongodb import CommandMetricsListener
+from app.services.cache import cache
+
+class StartedEvent:
+    def __init__(self, request_id, command_name, command):
+        self.request_id = request_id
+        self.command_name = command_name
+        self.command = command
+
+class FinishedEvent:
+    def __init__(self, request_id, command_name, duration_micros):
+        self.request_id = request_id
+        self.command_name = command_name
+        self.duration_micros = duration_micros
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "profiling_token", "secret")
+    monkeypatch.setattr(settings, "profiling_sample_rate", 0)
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware)
+    listener = CommandMetricsListener()
+
+    @app.get("/traces/{trace_id}")
+    async def get_trace(trace_id: str):
+        # What pymongo reports for a find issued by this request, from an executor thread like motor's
+        def run_find():
+            listener.started(StartedEvent(1, "find", {"find": "traces", "filter": {"trace_id": trace_id}}))
+            listener.succeeded(FinishedEvent(1, "find", 2500))
+        context = contextvars.copy_context()
+        await asyncio.get_running_loop().run_in_executor(None, context.run, run_find)
+        return {"trace_id": trace_id}
+
+    return TestClient(app)
+
+def report(profile_id):
+    found, value = asyncio.run(cache.get(profile_key(profile_id)))
+    assert found
+    return value
+
+def test_request_with_token_is_profiled_with_db_breakdown(client):
+    response = client.get("/traces/t1", headers={"X-Profile-Token": "secret"})
+
+    assert response.json() == {"trace_id": "t1"}
+    profile = report(response.headers["x-profile-id"])
+    assert (profile["route"], profile["status"]) == ("/traces/{trace_id}", 200)
+    assert profile["db"]["commands"]["find traces"] == {"count": 1, "failed": 0, "total_ms": 2.5, "max_ms": 2.5}
+    assert profile["db"]["total_ms"] == 2.5
+    assert "get_trace" in profile["profile"]
+
+def test_token_in_query_string_is_ignored(client):
+    """The token must not travel in URLs, where access logs and browser history keep it"""
+    assert "x-profile-id" not in client.get("/traces/t1", params={"profile": "secret"}).headers
+
+def test_requests_without_the_token_are_not_profiled(client):
+    assert "x-profile-id" not in client.get("/traces/t1").headers
+    assert "x-profile-id" not in client.get("/traces/t1", headers={"X-Profile-Token": "wrong"}).headers
+
+def test_sampling_profiles_one_in_n_requests(client, monkeypatch):
+    monkeypatch.setattr(settings, "profiling_sample_rate", 3)
+
+    profiled = ["x-profile-id" in client.get("/traces/t1").headers for _ in range(6)]
+
+    assert profiled.count(True) == 2
@@ -0,0 +1,38 @@
+"""
+Tests for the MongoDB JSON response class and encoder registry
+"""
+from datetime import datetime
+from decimal import Decimal
+import json
+
+from bson import Decimal128, ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from app.core.responses import MongoJSONResponse
+import app.main  # noqa: F401 - registers the BSON encoders
+
+def test_renders_bson_types_and_nan_without_preprocessing():
+    object_id = ObjectId()
+    response = MongoJSONResponse({
+        "_id": object_id,
+        "imported_at": datetime(2025, 1, 2, 3, 4, 5),
+        "metadata": {"score": float("nan"), "amount": Decimal128(Decimal("1.50"))},
+        "context": [{"turn_number": 1}]
+    })
+
+    assert json.loads(response.body) == {
+        "_id": str(object_id),
+        "imported_at": "2025-01-02T03:04:05",
+        "metadata": {"score": None, "amount": "1.50"},
+        "context": [{"turn_number": 1}]
+    }
+    assert response.media_type == "application/json"
+
+def test_registered_encoders_apply_to_returned_dicts():
+    """Handlers returning dicts go through jsonable_encoder, which shares the registry"""
+    object_id = ObjectId()
+
+    assert jsonable_encoder({"_id": object_id}) == {"_id": str(object_id)}
+
+def test_app_default_response_class():
+    assert app.main.app.router.default_response_class is MongoJSONResponse
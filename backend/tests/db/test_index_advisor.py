@@ -0,0 +1,45 @@
+"""
+Tests for the index advisor's explain plan analysis
+"""
+from app.db.index_advisor import find_problems, query_shapes
+
+def test_index_walk_is_not_flagged():
+    explain = {"queryPlanner": {"winningPlan": {
+        "stage": "LIMIT",
+        "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "trace_order"}}
+    }}}
+
+    assert find_problems(explain) == []
+
+def test_collection_scan_and_blocking_sort_are_flagged():
+    explain = {"queryPlanner": {
+        "winningPlan": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}},
+        "rejectedPlans": []
+    }}
+
+    assert find_problems(explain) == ["collection scan", "in-memory sort"]
+
+def test_rejected_plans_are_ignored():
+    explain = {"queryPlanner": {
+        "winningPlan": {"stage": "IXSCAN"},
+        "rejectedPlans": [{"stage": "COLLSCAN"}]
+    }}
+
+    assert find_problems(explain) == []
+
+def test_aggregate_sort_stage_is_flagged():
+    """A $sort left in the pipeline (not absorbed by the query plan) sorts in memory"""
+    explain = {"stages": [
+        {"$cursor": {"queryPlanner": {"winningPlan": {"stage": "IXSCAN"}}}},
+        {"$sort": {"sortKey": {"flow_session": -1}}}
+    ]}
+
+    assert find_problems(explain) == ["in-memory sort"]
+
+def test_query_shapes_cover_both_apis():
+    shapes = query_shapes({"trace_id": "t1", "flow_session": "s1", "turn_number": 2}, "user_1")
+
+    assert {collection for _, collection, _ in shapes} == {
+        "traces", "annotations", "annotation_frontiers", "annotation_counters", "users"
+    }
+    assert len({name for name, _, _ in shapes}) == len(shapes)
@@ -0,0 +1,66 @@
+"""
+Tests for index creation at startup
+"""
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.db.indexes import INDEXES
+from app.db.mongodb import create_indexes
+
+def mock_database(annotation_indexes, duplicates=()):
+    collections = {}
+
+    def collection(name):
+        if name not in collections:
+            collections[name] = MagicMock(
+                create_indexes=AsyncMock(side_effect=lambda models: [models[0].document["name"]]),
+                index_information=AsyncMock(return_value={}),
+                drop_index=AsyncMock()
+            )
+        return collections[name]
+
+    database = MagicMock()
+    database.__getitem__.side_effect = collection
+    annotations = collection("annotations")
+    database.annotations = annotations
+    annotations.index_information.return_value = annotation_indexes
+    annotations.aggregate = MagicMock(return_value=MagicMock(to_list=AsyncMock(return_value=list(duplicates))))
+    return database, collections
+
+OLD_INDEX = {"_id_": {"key": [("_id", 1)]}, "trace_id_1_user_id_1": {"key": [("trace_id", 1), ("user_id", 1)]}}
+
+@pytest.mark.asyncio
+async def test_one_conflicting_index_does_not_block_the_rest():
+    database, collections = mock_database({})
+    annotations = collections["annotations"]
+
+    def create(models):
+        if models[0].document.get("unique"):
+            raise Exception("IndexOptionsConflict")
+        return [models[0].document["name"]]
+
+    annotations.create_indexes.side_effect = create
+
+    with patch("app.db.mongodb.db", MagicMock(database=database)):
+        await create_indexes()
+
+    assert annotations.create_indexes.await_count == len(INDEXES["annotations"])
+
+@pytest.mark.asyncio
+async def test_old_non_unique_annotation_index_is_replaced():
+    database, collections = mock_database(OLD_INDEX)
+
+    with patch("app.db.mongodb.db", MagicMock(database=database)):
+        await create_indexes()
+
+    collections["annotations"].drop_index.assert_awaited_once_with("trace_id_1_user_id_1")
+
+@pytest.mark.asyncio
+async def test_duplicate_annotations_stop_startup():
+    database, collections = mock_database(OLD_INDEX, duplicates=[{"count": 2}])
+
+    with patch("app.db.mongodb.db", MagicMock(database=database)), pytest.raises(RuntimeError):
+        await create_indexes()
+
+    collections["annotations"].drop_index.assert_not_called()
@@ -0,0 +1,106 @@
+"""
+Tests for prev/next trace resolution
+"""
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.adjacency import find_adjacent, find_adjacent_batch
+
+def matches(trace: dict, query: dict) -> bool:
+    """Evaluate the subset of Mongo query operators used by the adjacency seeks"""
+    if "$or" in query:
+        return any(matches(trace, clause) for clause in query["$or"])
+    if "$and" in query:
+        return all(matches(trace, clause) for clause in query["$and"])
+    for field, condition in query.items():
+        value = trace.get(field)
+        if isinstance(condition, dict):
+            op, operand = next(iter(condition.items()))
+            checks = {
+                "$lt": lambda: value < operand, "$gt": lambda: value > operand,
+                "$gte": lambda: value >= operand, "$in": lambda: value in operand
+            }
+            if not checks[op]():
+                return False
+        elif value != condition:
+            return False
+    return True
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, spec):
+        for field, direction in reversed(spec):
+            self.docs.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+class FakeTraces:
+    def __init__(self, traces):
+        self.traces = traces
+        self.finds = 0
+
+    def find(self, query, projection=None):
+        self.finds += 1
+        return FakeCursor([dict(t) for t in self.traces if matches(t, query)])
+
+    async def find_one(self, query, projection=None):
+        found = [t for t in self.traces if matches(t, query)]
+        return dict(found[0]) if found else None
+
+@pytest.fixture
+def traces():
+    # List order: s2 turns 1-3, then s1 turns 1-2
+    return FakeTraces([
+        {"flow_session": fs, "turn_number": tn, "trace_id": f"{fs}-{tn}"}
+        for fs, turns in [("s1", 2), ("s2", 3)] for tn in range(1, turns + 1)
+    ])
+
+@pytest.fixture(params=[False, True], ids=["key-seeks", "ordinals"])
+def db(request, traces):
+    """Database with ordinals (counted from the end of the list) either stale or current"""
+    if request.param:
+        for ordinal, trace_id in enumerate(reversed(ORDER), start=1):
+            next(t for t in traces.traces if t["trace_id"] == trace_id)["ordinal"] = ordinal
+    meta = {"generation": 3, "ordered_generation": 3 if request.param else 2, "scheme": 2, "max_ordinal": len(ORDER)}
+    return MagicMock(traces=traces, trace_meta=MagicMock(find_one=AsyncMock(return_value=meta)))
+
+ORDER = ["s2-1", "s2-2", "s2-3", "s1-1", "s1-2"]
+
+@pytest.mark.asyncio
+async def test_adjacent_crosses_session_boundaries(db):
+    assert await find_adjacent(db, "s2-3") == {"prev": "s2-2", "next": "s1-1"}
+    assert await find_adjacent(db, "s1-1") == {"prev": "s2-3", "next": "s1-2"}
+    assert await find_adjacent(db, "s2-1") == {"prev": None, "next": "s2-2"}
+    assert await find_adjacent(db, "s1-2") == {"prev": "s1-1", "next": None}
+
+@pytest.mark.asyncio
+async def test_adjacent_unknown_trace(db):
+    assert await find_adjacent(db, "missing") is None
+
+@pytest.mark.asyncio
+async def test_batch_matches_single_lookups_for_a_page(db):
+    page = ORDER[1:4]
+
+    result = await find_adjacent_batch(db, page + ["missing"])
+
+    # Key lookup plus either one ordinal $in, or the page span and two edge seeks
+    assert db.traces.finds <= 4
+    assert result == {trace_id: await find_adjacent(db, trace_id) for trace_id in page}
+
+@pytest.mark.asyncio
+async def test_batch_handles_scattered_ids(db):
+    result = await find_adjacent_batch(db, ["s2-1", "s1-2"])
+
+    assert result == {
+        "s2-1": {"prev": None, "next": "s2-2"},
+        "s1-2": {"prev": "s1-1", "next": None},
+    }
@@ -0,0 +1,64 @@
+"""
+Tests for per-user annotation counters and stats
+"""
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.annotation_stats import apply_change, counter_change, get_user_stats, reconcile_pipeline
+
+@pytest.mark.parametrize("created, before, after, change", [
+    (True, None, "Pass", {"total": 1, "pass_count": 1}),
+    (False, "Pass", "Fail", {"pass_count": -1, "fail_count": 1}),
+    (False, "Fail", "Fail", {}),
+])
+def test_counter_change(created, before, after, change):
+    assert counter_change(created, before, after) == change
+
+def facet_result(counts, recent=()):
+    return [{"counts": [{"_id": result, "count": count} for result, count in counts.items()], "recent": list(recent)}]
+
+@pytest.mark.asyncio
+async def test_stats_read_counters_without_counting():
+    db = MagicMock()
+    db.annotation_counters.find_one = AsyncMock(return_value={"total": 4, "pass_count": 3, "fail_count": 1})
+    recent = [{"trace_id": "t1", "holistic_pass_fail": "Pass"}]
+    db.annotations.find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=recent)
+
+    stats = await get_user_stats(db, "u")
+
+    assert stats == {
+        "total_annotations": 4, "pass_count": 3, "fail_count": 1, "pass_rate": 75.0, "recent_annotations": recent
+    }
+    db.annotations.aggregate.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_missing_counters_rebuilt_with_one_aggregation():
+    db = MagicMock()
+    db.annotation_counters.find_one = AsyncMock(return_value=None)
+    db.annotation_counters.update_one = AsyncMock()
+    db.annotations.find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=[])
+    db.annotations.aggregate.return_value.to_list = AsyncMock(return_value=facet_result({"Pass": 2, "Fail": 1}))
+
+    stats = await get_user_stats(db, "u")
+
+    assert (stats["total_annotations"], stats["pass_count"], stats["fail_count"]) == (3, 2, 1)
+    stored = db.annotation_counters.update_one.await_args.args[1]["$set"]
+    assert (stored["total"], stored["pass_count"], stored["fail_count"]) == (3, 2, 1)
+
+@pytest.mark.asyncio
+async def test_first_increment_for_user_without_counters_rebuilds():
+    db = MagicMock()
+    db.annotation_counters.update_one = AsyncMock(side_effect=[MagicMock(matched_count=0), None])
+    db.annotations.aggregate.return_value.to_list = AsyncMock(return_value=facet_result({"Pass": 7}))
+
+    await apply_change(db, "u", {"total": 1, "pass_count": 1})
+
+    rebuilt = db.annotation_counters.update_one.await_args_list[1]
+    assert rebuilt.args[1]["$set"]["total"] == 7 and rebuilt.kwargs == {"upsert": True}
+
+def test_reconcile_merges_counters_per_user():
+    stages = reconcile_pipeline()
+
+    assert stages[-1]["$merge"]["into"] == "annotation_counters"
+    assert stages[-1]["$merge"]["on"] == "user_id"
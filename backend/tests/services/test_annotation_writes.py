@@ -0,0 +1,148 @@
+"""
+Tests for atomic annotation upserts and the known-trace cache
+"""
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.services.annotation_writes import upsert_annotation, upsert_annotations
+from app.services.cache import TRACES_TAG, cache
+from app.services.known_traces import KnownTraces
+
+FIELDS = {"trace_id": "t1", "holistic_pass_fail": "Pass", "first_failure_note": None}
+
+def mock_db(before=None, duplicate_first=False, previous=(), versions=None, bulk_result=None, bulk_error=None):
+    db = MagicMock()
+    db.annotations.find_one_and_update = AsyncMock(
+        side_effect=([DuplicateKeyError("E11000")] if duplicate_first else []) + [before]
+    )
+    db.annotations.bulk_write = AsyncMock(return_value=bulk_result, side_effect=bulk_error)
+    db.annotations.find = MagicMock(side_effect=[
+        MagicMock(to_list=AsyncMock(return_value=list(previous))),
+        MagicMock(to_list=AsyncMock(return_value=[
+            {"trace_id": trace_id, "version": version} for trace_id, version in (versions or {}).items()
+        ])),
+    ])
+    db.annotation_counters.update_one = AsyncMock(return_value=MagicMock(matched_count=1))
+    return db
+
+def counter_increments(db):
+    return [call.args[1]["$inc"] for call in db.annotation_counters.update_one.await_args_list]
+
+@pytest.mark.asyncio
+async def test_upsert_is_one_atomic_call():
+    db = mock_db(before=None)
+
+    annotation, created = await upsert_annotation(db, "u", FIELDS)
+
+    assert created is True
+    assert annotation["version"] == 1 and annotation["user_id"] == "u" and "_id" in annotation
+    query, update = db.annotations.find_one_and_update.await_args.args
+    assert query == {"trace_id": "t1", "user_id": "u"}
+    assert update["$inc"] == {"version": 1}
+    assert set(update["$setOnInsert"]) == {"_id", "created_at"}
+    assert update["$set"]["holistic_pass_fail"] == "Pass" and "updated_at" in update["$set"]
+    assert db.annotations.find_one_and_update.await_args.kwargs == {
+        "upsert": True, "return_document": ReturnDocument.BEFORE
+    }
+    assert counter_increments(db) == [{"total": 1, "pass_count": 1}]
+
+@pytest.mark.asyncio
+async def test_flip_moves_one_count_across():
+    before = {"_id": "a1", "trace_id": "t1", "user_id": "u", "holistic_pass_fail": "Fail", "version": 2}
+    db = mock_db(before=before)
+
+    annotation, created = await upsert_annotation(db, "u", FIELDS)
+
+    assert created is False
+    assert annotation["version"] == 3 and annotation["holistic_pass_fail"] == "Pass" and annotation["_id"] == "a1"
+    assert counter_increments(db) == [{"fail_count": -1, "pass_count": 1}]
+
+@pytest.mark.asyncio
+async def test_losing_a_concurrent_insert_retries_as_update():
+    before = {"_id": "a1", "trace_id": "t1", "user_id": "u", "holistic_pass_fail": "Pass", "version": 1}
+    db = mock_db(before=before, duplicate_first=True)
+
+    annotation, created = await upsert_annotation(db, "u", FIELDS)
+
+    assert created is False and annotation["version"] == 2
+    assert db.annotations.find_one_and_update.await_count == 2
+    # Pass stayed Pass: counters untouched
+    assert counter_increments(db) == []
+
+@pytest.mark.asyncio
+async def test_batch_is_one_bulk_write_with_per_item_results():
+    items = [
+        {**FIELDS, "trace_id": "t1", "holistic_pass_fail": "Fail"},
+        {**FIELDS, "trace_id": "t2"},
+        {**FIELDS, "trace_id": "t1"},
+    ]
+    db = mock_db(
+        previous=[{"trace_id": "t1", "holistic_pass_fail": "Fail"}],
+        bulk_result=MagicMock(upserted_ids={1: "new-id"}),
+        versions={"t1": 4, "t2": 1}
+    )
+
+    results = await upsert_annotations(db, "u", items)
+
+    operations = db.annotations.bulk_write.await_args.args[0]
+    assert len(operations) == 2  # last save of t1 wins
+    assert db.annotations.bulk_write.await_args.kwargs == {"ordered": False}
+    assert results == {
+        "t1": {"status": "updated", "version": 4, "error": None},
+        "t2": {"status": "created", "version": 1, "error": None},
+    }
+    # t1 flipped Fail to Pass, t2 is a new Pass: one counter write for the batch
+    assert counter_increments(db) == [{"fail_count": -1, "pass_count": 2, "total": 1}]
+
+@pytest.mark.asyncio
+async def test_batch_retries_lost_races_and_reports_other_errors():
+    items = [{**FIELDS, "trace_id": "t1"}, {**FIELDS, "trace_id": "t2"}]
+    error = BulkWriteError({"writeErrors": [
+        {"index": 0, "code": 11000, "errmsg": "E11000 duplicate key"},
+        {"index": 1, "code": 121, "errmsg": "Document failed validation"},
+    ], "upserted": []})
+    before = {"_id": "a1", "trace_id": "t1", "user_id": "u", "holistic_pass_fail": "Pass", "version": 2}
+    db = mock_db(before=before, bulk_error=error, versions={"t1": 3})
+
+    results = await upsert_annotations(db, "u", items)
+
+    db.annotations.find_one_and_update.assert_awaited_once()
+    assert results["t1"] == {"status": "updated", "version": 3, "error": None}
+    assert results["t2"] == {"status": "error", "version": None, "error": "Document failed validation"}
+
+@pytest.mark.asyncio
+async def test_known_traces_reads_once_and_never_caches_misses():
+    known = KnownTraces()
+    db = MagicMock()
+    db.traces.find_one = AsyncMock(side_effect=[{"_id": 1}, None, {"_id": 2}])
+
+    assert await known.exists(db, "t1") is True
+    assert await known.exists(db, "t1") is True
+    assert await known.exists(db, "t2") is False
+    assert await known.exists(db, "t2") is True
+    assert db.traces.find_one.await_count == 3
+
+@pytest.mark.asyncio
+async def test_known_traces_forgets_ids_when_traces_are_cleared():
+    known = KnownTraces()
+    db = MagicMock()
+    db.traces.find_one = AsyncMock(side_effect=[{"_id": 1}, None])
+
+    with patch("app.core.config.settings.known_traces_recheck_seconds", 0):
+        assert await known.exists(db, "t1") is True
+        await cache.invalidate(TRACES_TAG)
+        assert await known.exists(db, "t1") is False
+
+    assert db.traces.find_one.await_count == 2
+
+def test_known_traces_is_bounded():
+    known = KnownTraces()
+
+    with patch("app.core.config.settings.known_traces_cache_size", 2):
+        for trace_id in ["a", "b", "c"]:
+            known.add(trace_id)
+
+    assert list(known._ids) == ["b", "c"]
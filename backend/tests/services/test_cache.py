@@ -0,0 +1,127 @@
+"""
+Tests for the read-through cache
+"""
+from unittest.mock import AsyncMock, patch
+from datetime import datetime
+import asyncio
+
+import pytest
+
+from app.services.cache import Cache, cached
+
+def loader(*values):
+    return AsyncMock(side_effect=list(values))
+
+@pytest.mark.asyncio
+async def test_miss_loads_once_then_hits(fake_redis):
+    load = loader({"created_at": datetime(2024, 1, 2, 3, 4, 5), "n": 1})
+    cache = Cache()
+
+    first = await cache.get_or_load("doc:1", load, 60)
+    second = await Cache().get_or_load("doc:1", load, 60)
+
+    # Values come back as JSON types either way
+    assert first == second == {"created_at": "2024-01-02T03:04:05", "n": 1}
+    assert load.await_count == 1
+    assert cache.stats()["namespaces"]["doc"]["misses"] == 1
+
+@pytest.mark.asyncio
+async def test_tag_invalidation_reaches_other_processes(fake_redis):
+    load = loader(1, 2)
+    await Cache().get_or_load("doc:1", load, 60, ["user:u"])
+
+    await Cache().invalidate("user:u")
+
+    assert await Cache().get_or_load("doc:1", load, 60, ["user:u"]) == 2
+
+@pytest.mark.asyncio
+async def test_invalidation_during_load_is_not_served(fake_redis):
+    cache = Cache()
+
+    async def load_racing_invalidation():
+        await cache.invalidate("session:s")
+        return "stale"
+
+    await cache.get_or_load("doc:1", load_racing_invalidation, 60, ["session:s"])
+
+    assert await cache.get("doc:1") == (False, None)
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load():
+    started = asyncio.Event()
+    release = asyncio.Event()
+    calls = 0
+
+    async def slow_load():
+        nonlocal calls
+        calls += 1
+        started.set()
+        await release.wait()
+        return {"n": calls}
+
+    cache = Cache()
+    tasks = [asyncio.create_task(cache.get_or_load("doc:1", slow_load, 60)) for _ in range(10)]
+    await started.wait()
+    release.set()
+    results = await asyncio.gather(*tasks)
+
+    assert calls == 1
+    assert results == [{"n": 1}] * 10
+    assert cache.stats()["namespaces"]["doc"]["coalesced"] == 9
+
+@pytest.mark.asyncio
+async def test_failed_load_reaches_waiters_and_is_not_cached():
+    release = asyncio.Event()
+
+    async def failing_load():
+        await release.wait()
+        raise RuntimeError("db down")
+
+    cache = Cache()
+    tasks = [asyncio.create_task(cache.get_or_load("doc:1", failing_load, 60)) for _ in range(2)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert await cache.get("doc:1") == (False, None)
+
+@pytest.mark.asyncio
+async def test_none_is_not_cached():
+    load = loader(None, {"n": 1})
+    cache = Cache()
+
+    assert await cache.get_or_load("doc:1", load, 60) is None
+    assert await cache.get_or_load("doc:1", load, 60) == {"n": 1}
+
+@pytest.mark.asyncio
+async def test_redis_outage_falls_back_to_memory_without_retrying_each_call():
+    redis = AsyncMock()
+    redis.eval.side_effect = ConnectionError("down")
+    load = loader({"n": 1})
+    cache = Cache()
+
+    with patch("app.services.cache.get_redis", return_value=redis):
+        assert await cache.get_or_load("doc:1", load, 60) == {"n": 1}
+        assert await cache.get_or_load("doc:1", load, 60) == {"n": 1}
+
+    assert load.await_count == 1
+    assert redis.eval.await_count == 1
+    assert cache.stats()["redis_errors"] == 1
+
+@pytest.mark.asyncio
+async def test_cached_decorator_keys_and_tags_by_arguments(fresh_cache):
+    calls = []
+
+    @cached(key=lambda user_id: f"stats:{user_id}", ttl=60, tags=lambda user_id: [f"user:{user_id}"])
+    async def stats(user_id):
+        calls.append(user_id)
+        return {"user": user_id}
+
+    await stats("a")
+    await stats("a")
+    await stats("b")
+    await fresh_cache.invalidate("user:a")
+    await stats("a")
+
+    assert calls == ["a", "b", "a"]
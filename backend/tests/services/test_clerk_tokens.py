@@ -0,0 +1,114 @@
+"""
+Tests for local Clerk session token verification against a stub JWKS server
+"""
+from unittest.mock import patch
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+import pytest
+import pytest_asyncio
+
+from app.core.http_client import close_http_client
+from app.services.clerk_tokens import InvalidTokenError, JWKSCache, TokenVerifier
+
+ISSUER = "https://clerk.example.test"
+
+def keypair(kid):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    public_jwk = {**jwk.construct(public_pem, "RS256").to_dict(), "kid": kid, "use": "sig"}
+    return private_pem, public_jwk
+
+def sign(private_pem, kid, expires_in=60, **claims):
+    now = int(time.time())
+    return jwt.encode(
+        {"sub": "user_1", "iss": ISSUER, "iat": now, "exp": now + expires_in, **claims},
+        private_pem, algorithm="RS256", headers={"kid": kid}
+    )
+
+@pytest.fixture
+def jwks_server(http_server):
+    """Serves `keys` as a JWKS"""
+    http_server.payload = {"keys": []}
+    with patch("app.core.config.settings.clerk_jwks_url", f"{http_server.url}/jwks.json"), \
+            patch("app.core.config.settings.clerk_frontend_api_url", ISSUER), \
+            patch("app.core.config.settings.clerk_jwks_min_refresh_seconds", 0):
+        yield http_server
+
+@pytest_asyncio.fixture
+async def verifier(jwks_server):
+    yield TokenVerifier(JWKSCache())
+    # The shared client's pool belongs to this test's event loop
+    await close_http_client()
+
+@pytest.mark.asyncio
+async def test_valid_token_verified_once_then_served_from_cache(jwks_server, verifier):
+    private_pem, public_jwk = keypair("k1")
+    jwks_server.payload["keys"] = [public_jwk]
+    token = sign(private_pem, "k1")
+
+    with patch("app.services.clerk_tokens.jwt.decode", wraps=jwt.decode) as decode:
+        assert (await verifier.verify(token))["sub"] == "user_1"
+        assert (await verifier.verify(token))["sub"] == "user_1"
+
+    assert decode.call_count == 1
+    assert jwks_server.requests == 1
+    assert (verifier.hits, verifier.misses) == (1, 1)
+
+@pytest.mark.asyncio
+async def test_expired_token_rejected(jwks_server, verifier):
+    private_pem, public_jwk = keypair("k1")
+    jwks_server.payload["keys"] = [public_jwk]
+
+    with pytest.raises(InvalidTokenError):
+        await verifier.verify(sign(private_pem, "k1", expires_in=-60))
+
+@pytest.mark.asyncio
+async def test_cached_claims_expire_with_the_token(jwks_server, verifier):
+    private_pem, public_jwk = keypair("k1")
+    jwks_server.payload["keys"] = [public_jwk]
+    token = sign(private_pem, "k1", expires_in=30)
+    await verifier.verify(token)
+
+    later = time.time() + 120
+    with patch("app.services.clerk_tokens.time.time", return_value=later), \
+            patch("jose.jwt.timegm", return_value=int(later)):
+        with pytest.raises(InvalidTokenError):
+            await verifier.verify(token)
+
+@pytest.mark.asyncio
+async def test_token_signed_with_another_key_rejected(jwks_server, verifier):
+    _, public_jwk = keypair("k1")
+    other_pem, _ = keypair("k1")
+    jwks_server.payload["keys"] = [public_jwk]
+
+    with pytest.raises(InvalidTokenError):
+        await verifier.verify(sign(other_pem, "k1"))
+
+@pytest.mark.asyncio
+async def test_wrong_issuer_rejected(jwks_server, verifier):
+    private_pem, public_jwk = keypair("k1")
+    jwks_server.payload["keys"] = [public_jwk]
+
+    with pytest.raises(InvalidTokenError):
+        await verifier.verify(sign(private_pem, "k1", iss="https://evil.example.test"))
+
+@pytest.mark.asyncio
+async def test_rotated_key_picked_up_by_refetch(jwks_server, verifier):
+    old_pem, old_jwk = keypair("k1")
+    new_pem, new_jwk = keypair("k2")
+    jwks_server.payload["keys"] = [old_jwk]
+    await verifier.verify(sign(old_pem, "k1"))
+
+    jwks_server.payload["keys"] = [old_jwk, new_jwk]
+    claims = await verifier.verify(sign(new_pem, "k2", sub="user_2"))
+
+    assert claims["sub"] == "user_2"
+    assert jwks_server.requests == 2
@@ -0,0 +1,100 @@
+"""
+Tests for the chunked CSV import helpers
+"""
+import io
+from unittest.mock import AsyncMock
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from app.services.csv_import import CSVImportError, build_trace_documents, insert_traces, iter_csv_chunks
+
+BOTDOJO_HEADER = "id,Flow Session,Turn_Number,Total_Turns_in_Session,body.user_message,response.text_output\n"
+
+def make_csv(rows: int) -> io.BytesIO:
+    lines = [BOTDOJO_HEADER] + [f't{i},s{i // 3},{i % 3 + 1},3,"hello\nthere",reply {i}\n' for i in range(rows)]
+    return io.BytesIO("".join(lines).encode())
+
+def test_chunks_respect_chunk_size():
+    """Rows are yielded in batches no larger than the chunk size"""
+    chunks = list(iter_csv_chunks(make_csv(7), chunk_size=3))
+
+    assert [len(c) for c in chunks] == [3, 3, 1]
+
+def test_chunks_apply_column_mappings():
+    """BotDojo export headers are mapped to trace fields"""
+    chunk = next(iter_csv_chunks(make_csv(1), chunk_size=10))
+
+    assert {"trace_id", "flow_session", "turn_number", "user_message"} <= set(chunk.columns)
+    assert chunk.iloc[0]["user_message"] == "hello\nthere"
+
+def test_missing_columns_rejected_before_first_chunk():
+    """Validation happens on the header, before any rows are processed"""
+    with pytest.raises(CSVImportError, match="Missing required columns"):
+        next(iter_csv_chunks(io.BytesIO(b"col1,col2\nval1,val2\n"), chunk_size=10))
+
+def test_empty_file_rejected():
+    with pytest.raises(CSVImportError, match="Invalid CSV format"):
+        list(iter_csv_chunks(io.BytesIO(b""), chunk_size=10))
+
+def test_build_trace_documents_coerces_columns():
+    """Numeric columns become ints, text columns strings, NaN becomes None in metadata"""
+    csv = BOTDOJO_HEADER + "101,s1,1,2,hi,\n102,s1,2.0,2,,bye\n"
+    chunk = next(iter_csv_chunks(io.BytesIO(csv.encode()), chunk_size=10))
+
+    traces = build_trace_documents(chunk, imported_by="user_1")
+
+    assert [t["trace_id"] for t in traces] == ["101", "102"]
+    assert [t["turn_number"] for t in traces] == [1, 2]
+    assert all(type(t["turn_number"]) is int for t in traces)
+    assert traces[0]["ai_response"] == "None"
+    assert traces[0]["metadata"]["ai_response"] is None
+    assert traces[1]["metadata"]["user_message"] is None
+    assert traces[1]["imported_by"] == "user_1"
+
+def test_numeric_keys_do_not_depend_on_chunk_boundaries():
+    """A blank in a numeric-looking key column must not turn 500 into 500.0 in its chunk only"""
+    csv = BOTDOJO_HEADER + "500,900,1,2,hi,there\n501,900,2,2,hi,there\n,901,1,1,hi,there\n503,,1,1,hi,there\n"
+
+    def keys(chunk_size):
+        chunks = iter_csv_chunks(io.BytesIO(csv.encode()), chunk_size=chunk_size)
+        return [(t["trace_id"], t["flow_session"]) for chunk in chunks for t in build_trace_documents(chunk, None)]
+
+    assert keys(2) == keys(10) == [("500", "900"), ("501", "900"), ("None", "901"), ("503", "None")]
+
+def test_build_trace_documents_rejects_missing_turn_number():
+    csv = BOTDOJO_HEADER + "101,s1,,2,hi,there\n"
+    chunk = next(iter_csv_chunks(io.BytesIO(csv.encode()), chunk_size=10))
+
+    with pytest.raises(CSVImportError, match="turn_number"):
+        build_trace_documents(chunk, imported_by=None)
+
+@pytest.mark.asyncio
+async def test_insert_traces_counts_duplicates_as_skipped():
+    """Duplicate key errors from the unique trace_id index are reported as skipped"""
+    collection = AsyncMock()
+    collection.insert_many.side_effect = BulkWriteError({
+        "nInserted": 2,
+        "writeErrors": [{"index": 1, "code": 11000, "errmsg": "E11000 duplicate key"}],
+    })
+
+    counts = await insert_traces(collection, [{"trace_id": "a"}, {"trace_id": "b"}, {"trace_id": "c"}])
+
+    assert counts == (2, 1, 0)
+    collection.insert_many.assert_awaited_once()
+    assert collection.insert_many.call_args.kwargs == {"ordered": False}
+
+@pytest.mark.asyncio
+async def test_insert_traces_counts_other_write_errors_as_failed():
+    collection = AsyncMock()
+    collection.insert_many.side_effect = BulkWriteError({
+        "nInserted": 0,
+        "writeErrors": [
+            {"index": 0, "code": 121, "errmsg": "Document failed validation"},
+            {"index": 1, "code": 11000, "errmsg": "E11000 duplicate key"},
+        ],
+    })
+
+    counts = await insert_traces(collection, [{"trace_id": "a"}, {"trace_id": "b"}])
+
+    assert counts == (0, 1, 1)
@@ -0,0 +1,92 @@
+"""
+Tests for the session transcript cache
+"""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.session_cache import SessionTranscriptCache
+
+def mock_db(turns):
+    db = MagicMock()
+    db.traces.find = MagicMock(
+        side_effect=lambda *args: MagicMock(sort=lambda *a: MagicMock(to_list=AsyncMock(return_value=list(turns))))
+    )
+    return db
+
+TURNS = [{"turn_number": n, "user_message": f"q{n}", "ai_response": f"a{n}"} for n in range(1, 6)]
+
+@pytest.mark.asyncio
+async def test_context_is_slice_of_one_session_read():
+    """Walking a conversation reads the session once"""
+    cache = SessionTranscriptCache()
+    db = mock_db(TURNS)
+
+    contexts = [await cache.context(db, "s1", n) for n in range(1, 6)]
+
+    assert [len(context) for context in contexts] == [0, 1, 2, 3, 4]
+    assert contexts[3] == TURNS[:3]
+    assert db.traces.find.call_count == 1
+    assert cache.stats()["memory_hits"] == 4 and cache.stats()["misses"] == 1
+
+@pytest.mark.asyncio
+async def test_invalidate_reloads_session():
+    cache = SessionTranscriptCache()
+    db = mock_db(TURNS)
+    await cache.get(db, "s1")
+
+    await cache.invalidate(["s1"])
+    await cache.get(db, "s1")
+
+    assert db.traces.find.call_count == 2
+
+@pytest.mark.asyncio
+async def test_least_recently_used_session_is_evicted():
+    cache = SessionTranscriptCache()
+    db = mock_db(TURNS)
+
+    with patch("app.core.config.settings.session_cache_size", 2):
+        for flow_session in ["s1", "s2", "s1", "s3"]:
+            await cache.get(db, flow_session)
+
+    assert cache.stats()["sessions_cached"] == 2
+    assert cache._get_local("s2") is None
+    assert cache._get_local("s1") is not None
+
+@pytest.mark.asyncio
+async def test_redis_tier_serves_other_processes(fake_redis):
+    db = mock_db(TURNS)
+
+    await SessionTranscriptCache().get(db, "s1")
+    other = SessionTranscriptCache()
+    assert await other.context(db, "s1", 2) == TURNS[:1]
+    assert db.traces.find.call_count == 1
+    assert other.stats()["redis_hits"] == 1
+
+    # An import in any process invalidates the shared copy
+    await SessionTranscriptCache().invalidate(["s1"])
+    await SessionTranscriptCache().get(db, "s1")
+    assert db.traces.find.call_count == 2
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_load_without_counting_hits():
+    """Waiting on another request's load is neither a miss nor a Redis hit"""
+    cache = SessionTranscriptCache()
+    loads = 0
+
+    async def slow_load(length):
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return list(TURNS)
+
+    db = MagicMock()
+    db.traces.find = MagicMock(return_value=MagicMock(sort=lambda *a: MagicMock(to_list=slow_load)))
+
+    transcripts = await asyncio.gather(*(cache.get(db, "s1") for _ in range(5)))
+
+    assert loads == 1 and all(transcript == TURNS for transcript in transcripts)
+    stats = cache.stats()
+    assert (stats["misses"], stats["redis_hits"], stats["coalesced"]) == (1, 0, 4)
+    assert stats["hit_ratio"] == 0
@@ -0,0 +1,71 @@
+"""
+Tests for trace ordering and keyset pagination cursors
+"""
+import pytest
+
+from app.services.trace_order import InvalidCursorError, after_key, decode_cursor, encode_cursor, first_key
+
+def matches(trace: dict, query: dict) -> bool:
+    """Evaluate the subset of Mongo query operators produced by after_key"""
+    if "$or" in query:
+        return any(matches(trace, clause) for clause in query["$or"])
+    for field, condition in query.items():
+        value = trace[field]
+        if isinstance(condition, dict):
+            op, operand = next(iter(condition.items()))
+            if op == "$lt" and not value < operand:
+                return False
+            if op == "$gt" and not value > operand:
+                return False
+            if op == "$gte" and not value >= operand:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+def test_cursor_round_trip():
+    key = ("session-b", 3, "trace/with+odd=chars")
+
+    assert decode_cursor(encode_cursor(key)) == key
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "e30", encode_cursor(("s", 1, "t"))[:-4]])
+def test_invalid_cursor_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
+
+def test_after_key_pages_through_sort_order_without_gaps():
+    """Seeking after each page's last key visits every trace exactly once, in order"""
+    traces = [
+        {"flow_session": fs, "turn_number": tn, "trace_id": f"{fs}-{tn}-{tie}"}
+        for fs in ["s1", "s2", "s3"] for tn in [1, 2] for tie in ["a", "b"]
+    ]
+    expected = sorted(traces, key=lambda t: t["trace_id"])
+    expected.sort(key=lambda t: t["turn_number"])
+    expected.sort(key=lambda t: t["flow_session"], reverse=True)
+
+    seen = []
+    page = expected[:5]
+    while page:
+        seen.extend(page)
+        last = page[-1]
+        query = after_key((last["flow_session"], last["turn_number"], last["trace_id"]))
+        page = [t for t in expected if matches(t, query)][:5]
+
+    assert seen == expected
+
+def test_inclusive_after_key_keeps_the_key_itself():
+    trace = {"flow_session": "s2", "turn_number": 1, "trace_id": "t"}
+    key = ("s2", 1, "t")
+
+    assert not matches(trace, after_key(key))
+    assert matches(trace, after_key(key, inclusive=True))
+
+def test_first_key_follows_sort_order():
+    traces = [
+        {"flow_session": "s1", "turn_number": 1, "trace_id": "a"},
+        {"flow_session": "s2", "turn_number": 2, "trace_id": "b"},
+        {"flow_session": "s2", "turn_number": 1, "trace_id": "d"},
+        {"flow_session": "s2", "turn_number": 1, "trace_id": "c"},
+    ]
+
+    assert first_key(traces) == ("s2", 1, "c")
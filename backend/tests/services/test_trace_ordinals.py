@@ -0,0 +1,114 @@
+"""
+Tests for materialized trace ordinals
+"""
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from app.services.trace_order import REVERSE_TRACE_SORT, before_key
+from app.services.trace_ordinals import (
+    ORDINAL_SCHEME, find_position, rebalance_ordinals, rebalance_pipeline
+)
+
+def mock_db(meta, inserted_among_numbered=None):
+    db = MagicMock()
+    db.trace_meta.find_one = AsyncMock(return_value=meta)
+    db.trace_meta.update_one = AsyncMock()
+    db.trace_meta.delete_one = AsyncMock()
+    db.traces.aggregate = MagicMock(return_value=MagicMock(to_list=AsyncMock(return_value=[])))
+    db.traces.count_documents = AsyncMock(return_value=41)
+    top = {"flow_session": "s9", "turn_number": 1, "trace_id": "t9", "ordinal": 50}
+    db.traces.find_one = AsyncMock(side_effect=lambda query, *args, **kwargs: (
+        inserted_among_numbered if "$and" in query else top
+    ))
+    return db
+
+def current(generation, ordered_generation, max_ordinal=50):
+    return {
+        "generation": generation, "ordered_generation": ordered_generation,
+        "scheme": ORDINAL_SCHEME, "max_ordinal": max_ordinal
+    }
+
+def test_rebalance_numbers_from_the_oldest_end_and_writes_only_changes():
+    stages = rebalance_pipeline()[1:]
+
+    assert stages[0]["$setWindowFields"]["sortBy"] == dict(REVERSE_TRACE_SORT)
+    assert stages[1] == {"$match": {"$expr": {"$ne": ["$ordinal", "$position"]}}}
+    assert stages[-1]["$merge"]["into"] == "traces"
+
+@pytest.mark.asyncio
+async def test_rebalance_records_generation_it_numbered():
+    db = mock_db(current(5, 3))
+
+    assert await rebalance_ordinals(db) is True
+    db.traces.aggregate.assert_called_once()
+    query, update = db.trace_meta.update_one.call_args.args
+    # Only marked current if no batch was inserted while it ran
+    assert query == {"_id": "ordinals", "generation": 5}
+    assert (update["$set"]["ordered_generation"], update["$set"]["max_ordinal"]) == (5, 50)
+    db.trace_meta.delete_one.assert_awaited_once()
+
+def test_window_stage_only_sees_the_sort_key():
+    project = rebalance_pipeline()[0]["$project"]
+
+    assert set(project) == {"_id", "ordinal", "flow_session", "turn_number", "trace_id"}
+
+@pytest.mark.asyncio
+async def test_rebalance_waits_for_another_workers_lease():
+    db = mock_db(current(5, 3))
+    lease_taken = [DuplicateKeyError("E11000"), DuplicateKeyError("E11000"), None, None]
+    db.trace_meta.update_one = AsyncMock(side_effect=lease_taken)
+
+    with patch("app.services.trace_ordinals.asyncio.sleep", AsyncMock()) as sleep:
+        assert await rebalance_ordinals(db) is True
+
+    assert sleep.await_count == 2
+    db.traces.aggregate.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_newer_sessions_keep_cached_documents():
+    db = mock_db(current(5, 3), inserted_among_numbered=None)
+
+    with patch("app.services.trace_ordinals.cache.invalidate", AsyncMock()) as invalidate:
+        await rebalance_ordinals(db)
+
+    invalidate.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_traces_inserted_among_numbered_ones_invalidate_cached_documents():
+    db = mock_db(current(5, 3), inserted_among_numbered={"_id": 1})
+
+    with patch("app.services.trace_ordinals.cache.invalidate", AsyncMock()) as invalidate:
+        await rebalance_ordinals(db)
+
+    invalidate.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_ordinals_from_an_older_scheme_are_renumbered():
+    db = mock_db({"generation": 5, "ordered_generation": 5})
+
+    assert await rebalance_ordinals(db) is True
+
+@pytest.mark.asyncio
+async def test_rebalance_skipped_when_current():
+    db = mock_db(current(5, 5))
+
+    assert await rebalance_ordinals(db) is False
+    db.traces.aggregate.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_position_is_counted_back_from_the_highest_ordinal_when_current():
+    db = mock_db(current(2, 2, max_ordinal=50))
+    trace = {"flow_session": "s1", "turn_number": 2, "trace_id": "t", "ordinal": 7}
+
+    assert await find_position(db, trace) == (44, 50)
+    db.traces.count_documents.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_position_counts_earlier_traces_while_stale():
+    db = mock_db(current(3, 2))
+    trace = {"flow_session": "s1", "turn_number": 2, "trace_id": "t", "ordinal": 7}
+
+    assert await find_position(db, trace) == (42, None)
+    db.traces.count_documents.assert_awaited_once_with(before_key(("s1", 2, "t")))
@@ -0,0 +1,59 @@
+"""
+Tests for the cached trace total
+"""
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.services.cache import KEY_PREFIX
+from app.services.trace_totals import TOTAL_KEY, TraceTotals
+
+@pytest.mark.asyncio
+async def test_memory_fallback_counts_once_then_tracks_inserts():
+    """Without Redis the total is counted once and then adjusted in process"""
+    collection = AsyncMock()
+    collection.count_documents.return_value = 10
+    totals = TraceTotals()
+
+    assert await totals.get(collection) == 10
+    await totals.increment(5)
+    assert await totals.get(collection) == 15
+
+    collection.count_documents.assert_awaited_once_with({})
+
+@pytest.mark.asyncio
+async def test_redis_hit_skips_count(fake_redis):
+    collection = AsyncMock()
+    fake_redis.data[KEY_PREFIX + TOTAL_KEY] = {"value": "42"}
+
+    assert await TraceTotals().get(collection) == 42
+
+    collection.count_documents.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_redis_miss_counts_caches_and_tracks_inserts(fake_redis):
+    collection = AsyncMock()
+    collection.count_documents.return_value = 7
+
+    assert await TraceTotals().get(collection) == 7
+    await TraceTotals().increment(3)
+
+    assert fake_redis.data[KEY_PREFIX + TOTAL_KEY]["value"] == "10"
+    assert await TraceTotals().get(collection) == 10
+    collection.count_documents.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_increment_without_cached_total_leaves_it_to_be_counted(fake_redis):
+    await TraceTotals().increment(3)
+
+    assert KEY_PREFIX + TOTAL_KEY not in fake_redis.data
+
+@pytest.mark.asyncio
+async def test_redis_errors_fall_back_to_counting():
+    collection = AsyncMock()
+    collection.count_documents.return_value = 3
+    redis = AsyncMock()
+    redis.eval.side_effect = ConnectionError("down")
+
+    with patch("app.services.cache.get_redis", return_value=redis):
+        assert await TraceTotals().get(collection) == 3
@@ -0,0 +1,34 @@
+"""
+Tests for trace view profiles
+"""
+import pytest
+
+from app.services.trace_views import InvalidProjectionError, trace_projection
+
+def test_list_view_excludes_raw_row():
+    projection = trace_projection("list")
+
+    assert projection["_id"] == 0
+    assert "metadata" not in projection
+    assert {"trace_id", "flow_session", "turn_number", "user_message", "ai_response"} <= set(projection)
+
+def test_full_view_fetches_whole_document():
+    assert trace_projection("full") is None
+
+def test_fields_override_view_and_keep_sort_key():
+    projection = trace_projection("full", "user_message, metadata.channel,_id")
+
+    assert projection == {
+        "_id": 1, "trace_id": 1, "flow_session": 1, "turn_number": 1, "user_message": 1, "metadata.channel": 1
+    }
+
+@pytest.mark.parametrize("view, fields", [
+    ("everything", None), ("list", "$where"), ("list", "a..b"),
+    ("list", "metadata,metadata.x"), ("list", "flow_session.id")
+])
+def test_invalid_projection_rejected(view, fields):
+    with pytest.raises(InvalidProjectionError):
+        trace_projection(view, fields)
+
+def test_sibling_paths_are_not_overlapping():
+    assert trace_projection("list", "metadata.a,metadata.ab")["metadata.ab"] == 1
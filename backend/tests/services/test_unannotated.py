@@ -0,0 +1,106 @@
+"""
+Tests for the "next unannotated trace" pipeline
+"""
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.trace_order import TRACE_SORT, after_key
+from app.services.unannotated import (
+    advance_frontier, find_next_unannotated, next_unannotated_pipeline, rewind_frontiers
+)
+
+def mock_db(frontier, results):
+    """Database whose frontier lookup returns `frontier` and whose aggregations return `results` in turn"""
+    db = MagicMock()
+    db.annotation_frontiers.find_one = AsyncMock(return_value=frontier)
+    db.annotation_frontiers.update_one = AsyncMock()
+    db.annotation_frontiers.update_many = AsyncMock()
+    db.traces.aggregate = MagicMock(side_effect=[
+        MagicMock(to_list=AsyncMock(return_value=[result] if result else [])) for result in results
+    ])
+    return db
+
+def test_pipeline_walks_sort_order_before_joining():
+    """$sort must come first so it is served by the trace_order index and streams"""
+    pipeline = next_unannotated_pipeline("user_1")
+
+    assert pipeline[0] == {"$sort": dict(TRACE_SORT)}
+    stages = [next(iter(stage)) for stage in pipeline]
+    assert stages.index("$lookup") < stages.index("$limit")
+    assert {"$limit": 1} in pipeline
+
+def test_lookup_is_scoped_to_user():
+    lookup = next(stage["$lookup"] for stage in next_unannotated_pipeline("user_1") if "$lookup" in stage)
+
+    assert (lookup["localField"], lookup["foreignField"]) == ("trace_id", "trace_id")
+    assert lookup["pipeline"][0] == {"$match": {"user_id": "user_1"}}
+
+def test_pipeline_seeks_from_start_key():
+    pipeline = next_unannotated_pipeline("user_1", ("s2", 3, "t"))
+
+    assert pipeline[0] == {"$match": after_key(("s2", 3, "t"), inclusive=True)}
+    assert pipeline[1] == {"$sort": dict(TRACE_SORT)}
+
+@pytest.mark.asyncio
+async def test_lookup_seeks_from_frontier_and_advances_it():
+    frontier = {"user_id": "u", "flow_session": "s2", "turn_number": 1, "trace_id": "a", "version": 4}
+    found = {"flow_session": "s2", "turn_number": 2, "trace_id": "b"}
+    db = mock_db(frontier, [found])
+
+    assert await find_next_unannotated(db, "u") == found
+    assert db.traces.aggregate.call_args.args[0][0] == {"$match": after_key(("s2", 1, "a"), inclusive=True)}
+    update_filter, update = db.annotation_frontiers.update_one.call_args.args
+    assert update_filter == {"user_id": "u", "version": 4}
+    assert update["$set"]["trace_id"] == "b"
+
+@pytest.mark.asyncio
+async def test_exhausted_frontier_answers_without_walking_traces():
+    frontier = {"user_id": "u", "flow_session": None, "turn_number": None, "trace_id": None, "version": 0}
+    db = mock_db(frontier, [])
+
+    assert await find_next_unannotated(db, "u") is None
+    db.traces.aggregate.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_stale_frontier_is_rebuilt_from_the_start():
+    """Nothing after the frontier is double-checked by a walk from the first trace"""
+    frontier = {"user_id": "u", "flow_session": "s1", "turn_number": 1, "trace_id": "z", "version": 2}
+    earlier = {"flow_session": "s3", "turn_number": 1, "trace_id": "a"}
+    db = mock_db(frontier, [None, earlier])
+
+    assert await find_next_unannotated(db, "u") == earlier
+    assert db.traces.aggregate.call_args.args[0][0] == {"$sort": dict(TRACE_SORT)}
+    assert db.annotation_frontiers.update_one.call_args.args[1]["$set"]["trace_id"] == "a"
+
+@pytest.mark.asyncio
+async def test_missing_frontier_is_created():
+    found = {"flow_session": "s3", "turn_number": 1, "trace_id": "a"}
+    db = mock_db(None, [found])
+
+    assert await find_next_unannotated(db, "u") == found
+    assert db.annotation_frontiers.update_one.call_args.kwargs == {"upsert": True}
+
+@pytest.mark.asyncio
+async def test_annotating_elsewhere_leaves_frontier():
+    db = mock_db(None, [])
+
+    await advance_frontier(db, "u", ["not-the-frontier"])
+
+    db.traces.aggregate.assert_not_called()
+    db.annotation_frontiers.update_one.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_import_bumps_versions_before_rewinding():
+    db = mock_db(None, [])
+    traces = [
+        {"flow_session": "s9", "turn_number": 2, "trace_id": "b"},
+        {"flow_session": "s9", "turn_number": 1, "trace_id": "a"},
+    ]
+
+    await rewind_frontiers(db, traces)
+
+    bump, rewind = db.annotation_frontiers.update_many.call_args_list
+    assert bump.args == ({}, {"$inc": {"version": 1}})
+    assert {"trace_id": None} in rewind.args[0]["$or"]
+    assert rewind.args[1]["$set"]["trace_id"] == "a"
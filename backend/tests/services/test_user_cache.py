@@ -0,0 +1,73 @@
+"""
+Tests for the per-process user cache
+"""
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.user_cache import INVALIDATION_CHANNEL, UserCache
+
+CLAIMS = {"sub": "user_1", "email": "a@example.com"}
+
+def mock_db():
+    db = MagicMock()
+    db.users.find_one_and_update = AsyncMock(
+        side_effect=lambda query, update, **kwargs: {"clerk_id": query["clerk_id"], "name": "Ada"}
+    )
+    return db
+
+@pytest.fixture(autouse=True)
+def no_redis():
+    with patch("app.services.user_cache.get_redis", return_value=None):
+        yield
+
+@pytest.mark.asyncio
+async def test_repeat_resolutions_skip_the_database():
+    cache = UserCache()
+    db = mock_db()
+
+    first = await cache.resolve(db, CLAIMS)
+    first["name"] = "changed by caller"
+    second = await cache.resolve(db, CLAIMS)
+
+    assert second == {"clerk_id": "user_1", "name": "Ada"}
+    assert db.users.find_one_and_update.await_count == 1
+    # First sight creates the user in the same round trip
+    assert db.users.find_one_and_update.await_args.kwargs["upsert"] is True
+
+@pytest.mark.asyncio
+async def test_entries_expire_with_ttl():
+    cache = UserCache()
+    db = mock_db()
+
+    with patch("app.core.config.settings.user_cache_ttl_seconds", 0):
+        await cache.resolve(db, CLAIMS)
+        await cache.resolve(db, CLAIMS)
+
+    assert db.users.find_one_and_update.await_count == 2
+
+@pytest.mark.asyncio
+async def test_invalidate_reloads_and_publishes_to_other_workers():
+    cache = UserCache()
+    db = mock_db()
+    redis = AsyncMock()
+    await cache.resolve(db, CLAIMS)
+
+    with patch("app.services.user_cache.get_redis", return_value=redis):
+        await cache.invalidate("user_1")
+    await cache.resolve(db, CLAIMS)
+
+    redis.publish.assert_awaited_once_with(INVALIDATION_CHANNEL, "user_1")
+    assert db.users.find_one_and_update.await_count == 2
+
+@pytest.mark.asyncio
+async def test_invalidation_message_from_another_worker_drops_entry():
+    cache = UserCache()
+    db = mock_db()
+    await cache.resolve(db, CLAIMS)
+
+    cache.handle_message({"type": "subscribe", "data": 1})
+    assert cache.stats()["users_cached"] == 1
+    cache.handle_message({"type": "message", "channel": INVALIDATION_CHANNEL, "data": "user_1"})
+
+    assert cache.stats()["users_cached"] == 0
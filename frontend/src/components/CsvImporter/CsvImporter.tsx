@@ -2,19 +2,19 @@
 import React, { useState } from 'react';
 import { FileUpload, Alert, Button } from '../../sds';
 import { apiService } from '../../services/api';
+import type { ImportJob } from '../../types/api';
 import './CsvImporter.scss';
 
+const JOB_POLL_INTERVAL_MS = 1000;
+// A running job saves progress after every batch; give up if it stops doing so
+const JOB_STALLED_AFTER_MS = 5 * 60 * 1000;
+// Upper bound on waiting for a job, including time queued behind other imports
+const JOB_MAX_WAIT_MS = 60 * 60 * 1000;
+
 interface CsvImporterProps {
   onImportComplete?: () => void;
 }
 
-interface ImportResult {
-  message: string;
-  imported: number;
-  skipped: number;
-  total: number;
-}
-
 interface FileItem {
   id: number;
   file: File;
@@ -27,7 +27,8 @@ interface FileItem {
 
 export const CsvImporter: React.FC<CsvImporterProps> = ({ onImportComplete }) => {
   const [error, setError] = useState<string | null>(null);
-  const [result, setResult] = useState<ImportResult | null>(null);
+  const [result, setResult] = useState<ImportJob | null>(null);
+  const [progress, setProgress] = useState<ImportJob | null>(null);
   const [uploading, setUploading] = useState(false);
   const [selectedFile, setSelectedFile] = useState<File | null>(null);
 
@@ -59,14 +60,44 @@ export const CsvImporter: React.FC<CsvImporterProps> = ({ onImportComplete }) =>
     setResult(null);
 
     try {
-      const response = await apiService.importCSV(selectedFile);
-      setResult(response);
+      const { job_id } = await apiService.importCSV(selectedFile);
       setSelectedFile(null);
+
+      // Import runs in the background; poll until it finishes
+      const startedAt = Date.now();
+      let job = await apiService.getImportJob(job_id);
+      let lastUpdate = { updatedAt: job.updated_at, seenAt: startedAt };
+      let timedOut = false;
+      while (job.status === 'queued' || job.status === 'running') {
+        setProgress(job);
+        const now = Date.now();
+        if (job.updated_at !== lastUpdate.updatedAt) {
+          lastUpdate = { updatedAt: job.updated_at, seenAt: now };
+        }
+        if (
+          (job.status === 'running' && now - lastUpdate.seenAt > JOB_STALLED_AFTER_MS) ||
+          now - startedAt > JOB_MAX_WAIT_MS
+        ) {
+          timedOut = true;
+          break;
+        }
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+        job = await apiService.getImportJob(job_id);
+      }
+
+      if (timedOut) {
+        setError('The import stopped reporting progress. Check the trace list before importing the file again.');
+      } else if (job.status === 'failed') {
+        setError(job.error || 'Failed to import CSV');
+      } else {
+        setResult(job);
+      }
       onImportComplete?.();
     } catch (err: any) {
-      const errorMessage = err.response?.data?.detail || 'Failed to import CSV';
+      const errorMessage = err.response?.data?.detail || err.message || 'Failed to import CSV';
       setError(errorMessage);
     } finally {
+      setProgress(null);
       setUploading(false);
     }
   };
@@ -85,7 +116,7 @@ export const CsvImporter: React.FC<CsvImporterProps> = ({ onImportComplete }) =>
         accept=".csv"
         multiple={false}
         maxFiles={1}
-        maxFileSize={10 * 1024 * 1024}
+        maxFileSize={500 * 1024 * 1024}
         title="Upload CSV"
         dragText="Drag and drop your CSV file here, or"
         browseText="browse files"
@@ -114,7 +145,10 @@ export const CsvImporter: React.FC<CsvImporterProps> = ({ onImportComplete }) =>
 
       {uploading && (
         <div className="csv-importer__uploading">
-          <p>Importing...</p>
+          <p>
+            Importing...
+            {progress && ` ${progress.rows_parsed} rows parsed, ${progress.inserted} imported`}
+          </p>
         </div>
       )}
 
@@ -122,9 +156,9 @@ export const CsvImporter: React.FC<CsvImporterProps> = ({ onImportComplete }) =>
         <Alert variant="success" className="csv-importer__alert" onClose={clearResult}>
           <strong>Import Complete!</strong>
           <br />
-          {result.message}
+          Successfully imported {result.inserted} traces
           <br />
-          Imported: {result.imported} | Skipped: {result.skipped} | Total: {result.total}
+          Imported: {result.inserted} | Skipped: {result.skipped} | Failed: {result.failed} | Total: {result.rows_parsed}
         </Alert>
       )}
     </div>
@@ -5,9 +5,14 @@ import type {
   Trace,
   TracesResponse,
   Annotation,
+  AnnotationBatchResponse,
   AdjacentTraces,
+  AdjacentTracesBatch,
+  TracePosition,
   UserStats,
   User,
+  ImportJob,
+  ImportJobStarted,
 } from '../types/api';
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
@@ -74,16 +79,20 @@ export const apiService = {
   },
 
   // Traces
-  async importCSV(file: File): Promise<{ message: string; count: number }> {
+  async importCSV(file: File): Promise<ImportJobStarted> {
     const formData = new FormData();
     formData.append('file', file);
 
-    return fetchWithAuth('/api/traces/import-csv', {
+    return fetchWithAuth<ImportJobStarted>('/api/traces/import-csv', {
       method: 'POST',
       body: formData,
     });
   },
 
+  async getImportJob(jobId: string): Promise<ImportJob> {
+    return fetchWithAuth<ImportJob>(`/api/traces/import-jobs/${jobId}`);
+  },
+
   async getTraces(page: number = 1, pageSize: number = 50): Promise<TracesResponse> {
     return fetchWithAuth<TracesResponse>(
       `/api/traces?page=${page}&page_size=${pageSize}`
@@ -91,13 +100,24 @@ export const apiService = {
   },
 
   async getTrace(traceId: string): Promise<Trace> {
-    return fetchWithAuth<Trace>(`/api/traces/${traceId}`);
+    return fetchWithAuth<Trace>(`/api/traces/${traceId}?view=detail`);
   },
 
   async getAdjacentTraces(traceId: string): Promise<AdjacentTraces> {
     return fetchWithAuth<AdjacentTraces>(`/api/traces/${traceId}/adjacent`);
   },
 
+  async getTracePosition(traceId: string): Promise<TracePosition> {
+    return fetchWithAuth<TracePosition>(`/api/traces/${traceId}/position`);
+  },
+
+  async getAdjacentTracesBatch(traceIds: string[]): Promise<AdjacentTracesBatch> {
+    return fetchWithAuth<AdjacentTracesBatch>('/api/traces/adjacent', {
+      method: 'POST',
+      body: JSON.stringify({ trace_ids: traceIds }),
+    });
+  },
+
   async getNextUnannotatedTrace(): Promise<Trace> {
     return fetchWithAuth<Trace>('/api/traces/next/unannotated');
   },
@@ -110,6 +130,15 @@ export const apiService = {
     });
   },
 
+  async saveAnnotationsBatch(
+    annotations: Omit<Annotation, 'annotation_id' | 'created_at' | 'updated_at'>[]
+  ): Promise<AnnotationBatchResponse> {
+    return fetchWithAuth<AnnotationBatchResponse>('/api/annotations/batch', {
+      method: 'POST',
+      body: JSON.stringify({ annotations }),
+    });
+  },
+
   async getAnnotationForTrace(traceId: string): Promise<Annotation | null> {
     return fetchWithAuth<Annotation | null>(`/api/annotations/trace/${traceId}`);
   },
@@ -6,6 +6,7 @@ export interface Trace {
   flow_session: string;
   turn_number: number;
   total_turns: number;
+  ordinal?: number;
   user_message: string;
   ai_response: string;
   tool_calls?: ToolCall[];
@@ -38,11 +39,35 @@ export interface Annotation {
   updated_at?: string;
 }
 
+export interface AnnotationBatchResult {
+  trace_id: string;
+  status: 'created' | 'updated' | 'error';
+  version: number | null;
+  error: string | null;
+}
+
+export interface AnnotationBatchResponse {
+  results: AnnotationBatchResult[];
+  created: number;
+  updated: number;
+  failed: number;
+}
+
 export interface AdjacentTraces {
   prev: string | null;
   next: string | null;
 }
 
+export interface TracePosition {
+  trace_id: string;
+  position: number;
+  total: number;
+}
+
+export interface AdjacentTracesBatch {
+  adjacent: Record<string, AdjacentTraces>;
+}
+
 export interface RecentAnnotation {
   trace_id: string;
   holistic_pass_fail: 'Pass' | 'Fail';
@@ -60,8 +85,30 @@ export interface UserStats {
 export interface TracesResponse {
   traces: Trace[];
   total: number;
-  page: number;
+  page: number | null;
   page_size: number;
+  total_pages: number;
+  next_cursor: string | null;
+}
+
+export interface ImportJobStarted {
+  message: string;
+  job_id: string;
+  status: ImportJob['status'];
+}
+
+export interface ImportJob {
+  job_id: string;
+  status: 'queued' | 'running' | 'completed' | 'failed';
+  filename: string;
+  rows_parsed: number;
+  inserted: number;
+  skipped: number;
+  failed: number;
+  error: string | null;
+  created_at: string;
+  updated_at: string;
+  finished_at: string | null;
 }
 
 export interface User {